@@ -13,6 +13,12 @@ import threading
 import multiprocessing
 import json
 import getpass
+from emotion_db_writer import EmotionDBWriter, CREATE_EMOTION_RECORDS_SQL
+from emotion_rollup import ensure_rollup_schema, ensure_users_schema
+from emotion_data_access import get_db_path
+from media_store import MediaStore, get_media_quota_bytes
+from screen_dedup import ScreenBlobStore, get_screen_tolerance
+from media_thumbnails import ThumbnailService
 
 # Set OpenCV log level to suppress debug output
 try:
@@ -37,6 +43,9 @@ def get_system_camera_count():
     """Simplified: assume default internal camera at index 0"""
     return 1, [0]
 
+# Media archive modes: full video, sampled keyframes only, nothing
+MEDIA_ARCHIVE_MODES = ('video', 'frames', 'none')
+
 class EmotionAnalyzerBase:
     def __init__(self, api_key, camera_backend=cv2.CAP_ANY, camera_index=0, model_name="Unknown"):
         """Initialize emotion analyzer base class"""
@@ -44,10 +53,26 @@ class EmotionAnalyzerBase:
         self.camera_backend = camera_backend
         self.camera_index = camera_index
         self.model_name = model_name
-        # Store database in the current working directory
-        self.db_path = os.path.join(os.getcwd(), 'emotion_data.db')
+        # Shared with the dashboards (EMOTION_DB_PATH overrides the default location)
+        self.db_path = get_db_path()
         self.running = True
+        # What each capture keeps on disk; see set_media_archive
+        self.media_archive = {
+            'mode': 'video',        # 'video' | 'frames' (sampled JPEG keyframes) | 'none'
+            'fourcc': 'mp4v',
+            'fps_divisor': 1,       # keep every Nth frame in the archived video
+            'resolution': None,     # (width, height) of the archived video, None = camera native
+        }
         self.init_database()
+        # Inserts are group-committed by a background thread so slow disks don't delay the next capture
+        self.db_writer = EmotionDBWriter(self.db_path)
+        # Saved media is indexed by size; pruned in the background only if EMOTION_MEDIA_QUOTA_MB sets a quota
+        self.media_store = MediaStore(self.db_path, quota_bytes=get_media_quota_bytes())
+        # Identical screenshots reuse the stored PNG (near-identical too with EMOTION_SCREEN_DEDUP_TOLERANCE);
+        # index updates ride on the DB writer's queue
+        self.screen_blobs = ScreenBlobStore(self.db_path, tolerance=get_screen_tolerance(), writer=self.db_writer)
+        # Preview JPEGs for review UIs, made from frames already in memory; index rows also go through the writer
+        self.thumbnails = ThumbnailService(self.db_path, writer=self.db_writer)
         
         # Set signal handlers for graceful shutdown
         signal.signal(signal.SIGINT, self.signal_handler)
@@ -58,10 +83,30 @@ class EmotionAnalyzerBase:
         print(f"🔧 Camera backend: {self.camera_backend}")
         print(f"🗄️ Database: {self.db_path}")
     
+    def set_media_archive(self, mode=None, fourcc=None, fps_divisor=None, resolution=None):
+        """Configure media archiving: full video (fourcc / fps decimation / resolution),
+        sampled keyframes as JPEGs ('frames'), or nothing ('none')"""
+        if mode is not None:
+            if mode not in MEDIA_ARCHIVE_MODES:
+                raise ValueError(f"Unknown media archive mode: {mode} (expected one of {MEDIA_ARCHIVE_MODES})")
+            self.media_archive['mode'] = mode
+        if fourcc is not None:
+            if len(fourcc) != 4:
+                raise ValueError(f"fourcc must be 4 characters: {fourcc}")
+            self.media_archive['fourcc'] = fourcc
+        if fps_divisor is not None:
+            self.media_archive['fps_divisor'] = max(1, int(fps_divisor))
+        if resolution is not None:
+            self.media_archive['resolution'] = tuple(int(v) for v in resolution) if resolution else None
+        print(f"🗃️ Media archive: {self.media_archive}")
+    
     def signal_handler(self, signum, frame):
         """Signal handler for graceful shutdown"""
         print(f"\n🛑 Received exit signal {signum}, stopping...")
         self.running = False
+        # Flush queued DB rows before the process exits
+        self.db_writer.close()
+        self.media_store.close()
     
     def init_database(self):
         """Initialize database"""
@@ -91,23 +136,16 @@ class EmotionAnalyzerBase:
                 cursor.execute('ALTER TABLE emotion_records ADD COLUMN screen_path TEXT')
                 print("✅ Screen content columns added")
         else:
+            # New database: let the retention job return freed pages with incremental VACUUM
+            cursor.execute('PRAGMA auto_vacuum = INCREMENTAL')
             # Create table with all columns
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS emotion_records (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    timestamp TEXT NOT NULL,
-                    emotion TEXT NOT NULL,
-                    confidence REAL NOT NULL,
-                    has_face BOOLEAN NOT NULL,
-                    image_path TEXT,
-                    username TEXT,
-                    emotion_level REAL DEFAULT 0.0,
-                    app_name TEXT DEFAULT "Unknown App",
-                    app_category TEXT DEFAULT "Other",
-                    content_description TEXT DEFAULT "Unrecognized app/content",
-                    screen_path TEXT
-                )
-            ''')
+            cursor.execute(CREATE_EMOTION_RECORDS_SQL)
+        # Day-range queries compare timestamp prefixes
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_emotion_records_timestamp ON emotion_records(timestamp)')
+        # Per-user/day/10-minute rollups kept current by an insert trigger
+        ensure_rollup_schema(conn)
+        # Distinct usernames for the dashboards' user pickers
+        ensure_users_schema(conn)
         conn.commit()
         conn.close()
     
@@ -149,8 +187,8 @@ class EmotionAnalyzerBase:
         img_str = base64.b64encode(buffer.getvalue()).decode()
         return img_str
     
-    def capture_screen(self, timestamp):
-        """Capture screen screenshot"""
+    def capture_screen(self, timestamp, save=True):
+        """Capture screen screenshot (save=False keeps it in memory only)"""
         try:
             import pyautogui
             print(f"🖥️ Capturing screen...")
@@ -161,6 +199,9 @@ class EmotionAnalyzerBase:
             # Convert to OpenCV
             screenshot_cv = cv2.cvtColor(np.array(screenshot), cv2.COLOR_RGB2BGR)
             
+            if not save:
+                return screenshot_cv, None
+            
             # Save screenshot
             saved_screen_path = self.save_screen(screenshot_cv, timestamp)
             
@@ -174,8 +215,24 @@ class EmotionAnalyzerBase:
             print(f"❌ Failed to capture screen: {e}")
             return None, None
     
+    def save_thumbnails(self, source_path, images):
+        """Write preview thumbnails ({variant: image}) for a saved media file; failures are not fatal"""
+        try:
+            for variant, image in images.items():
+                self.thumbnails.put_image(source_path, variant, image)
+        except Exception as e:
+            print(f"⚠️ Failed to save thumbnails for {source_path}: {e}")
+    
     def save_screen(self, screen_image, timestamp):
-        """Save screen to local path, aligned with video path"""
+        """Save screen to local path, aligned with video path.
+        Returns the path of an already stored screenshot instead when the screen has not changed.
+        """
+        existing_path, hashes = self.screen_blobs.lookup(screen_image)
+        if existing_path is not None:
+            self.screen_blobs.add_reference(existing_path, timestamp)
+            print(f"♻️ Screen unchanged, reusing {existing_path}")
+            return existing_path
+        
         dt = datetime.strptime(timestamp, "%Y%m%d-%H%M%S")
         # Get parent of current dir
         parent_dir = os.path.dirname(os.path.abspath('.'))
@@ -193,6 +250,8 @@ class EmotionAnalyzerBase:
         filename = f'{timestamp}_screen.png'
         screen_path = os.path.join(dir_path, filename)
         cv2.imwrite(screen_path, screen_image)
+        self.screen_blobs.add(hashes, screen_path, timestamp)
+        self.save_thumbnails(screen_path, {'screen': screen_image})
         return screen_path
     
     def analyze_emotion(self, images):
@@ -224,23 +283,30 @@ class EmotionAnalyzerBase:
             username = getpass.getuser()
         except Exception:
             username = os.environ.get('USERNAME') or os.environ.get('USER') or 'unknown'
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        cursor.execute('''
-            INSERT INTO emotion_records (timestamp, emotion, confidence, has_face, image_path, username, emotion_level, 
-                                       app_name, app_category, content_description, screen_path)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (timestamp, emotion, confidence, has_face, image_path, username, emotion_level, 
-              app_name, app_category, content_description, screen_path))
-        conn.commit()
-        conn.close()
+        # Queued for the background writer, committed in groups
+        self.db_writer.submit((timestamp, emotion, confidence, has_face, image_path, username, emotion_level,
+                               app_name, app_category, content_description, screen_path))
     
-    def capture_video(self, duration=3.0):
-        """Record video from camera for the specified duration"""
-        import cv2
+    def capture_video(self, duration=3.0, output_path=None):
+        """Record video from camera for the specified duration.
+        output_path: file to record into; pass a staging path on the archive filesystem so
+        save_video can commit it with a rename. Defaults to a new temp file.
+        """
         import tempfile
-        import os
         
+        # Create temp video file
+        if output_path is None:
+            fd, output_path = tempfile.mkstemp(suffix='.mp4')
+            os.close(fd)
+        video_path, _ = self.capture_clip(duration=duration, output_path=output_path)
+        return video_path
+    
+    def capture_clip(self, duration=3.0, output_path=None, num_frames=6):
+        """Record from the camera for the specified duration.
+        Keeps num_frames uniformly sampled frames in memory for analysis and, when output_path
+        is given, writes the archival video there using the media archive settings
+        (fourcc, fps decimation, resolution). Returns (output_path or None, frames).
+        """
         print(f"🎬 Start recording {duration} seconds of video...")
         
         # Open camera
@@ -256,19 +322,28 @@ class EmotionAnalyzerBase:
         width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
         height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
         
-        # Create temp video file
-        temp_video_path = tempfile.mktemp(suffix='.mp4')
-        
-        # Setup video encoder
-        fourcc = cv2.VideoWriter_fourcc(*'mp4v')
-        out = cv2.VideoWriter(temp_video_path, fourcc, fps, (width, height))
-        
-        if not out.isOpened():
-            cap.release()
-            raise Exception("Cannot create video file")
-        
         # Calculate frames to record
         total_frames = int(fps * duration)
+        
+        # Same uniform sampling as extract_frames_from_video, done while recording
+        if total_frames <= num_frames:
+            sample_indices = set(range(total_frames))
+        else:
+            step = total_frames / num_frames
+            sample_indices = {int(i * step) for i in range(num_frames)}
+        
+        # Setup video encoder (only when the video itself is archived)
+        out = None
+        fps_divisor = max(1, int(self.media_archive['fps_divisor']))
+        out_size = tuple(self.media_archive['resolution'] or (width, height))
+        if output_path is not None:
+            fourcc = cv2.VideoWriter_fourcc(*self.media_archive['fourcc'])
+            out = cv2.VideoWriter(output_path, fourcc, max(1.0, fps / fps_divisor), out_size)
+            if not out.isOpened():
+                cap.release()
+                raise Exception("Cannot create video file")
+        
+        frames = []
         frame_count = 0
         
         try:
@@ -278,8 +353,14 @@ class EmotionAnalyzerBase:
                     print(f"⚠️ 第 {frame_count + 1} 帧读取失败")
                     break
                 
-                # Write frame
-                out.write(frame)
+                if frame_count in sample_indices:
+                    frames.append(frame)
+                
+                # Write frame (every fps_divisor-th, resized if configured)
+                if out is not None and frame_count % fps_divisor == 0:
+                    if out_size != (frame.shape[1], frame.shape[0]):
+                        frame = cv2.resize(frame, out_size, interpolation=cv2.INTER_AREA)
+                    out.write(frame)
                 frame_count += 1
                 
                 # Show progress
@@ -290,10 +371,11 @@ class EmotionAnalyzerBase:
         finally:
             # Release resources
             cap.release()
-            out.release()
+            if out is not None:
+                out.release()
         
-        print(f"✅ Video recorded: {frame_count} frames, {frame_count/fps:.2f} seconds")
-        return temp_video_path
+        print(f"✅ Video recorded: {frame_count} frames, {frame_count/fps:.2f} seconds, {len(frames)} frames sampled")
+        return output_path, frames
     
     def video_to_base64(self, video_path):
         """Convert video file to base64 string"""
@@ -361,6 +443,17 @@ class EmotionAnalyzerBase:
             
             print(f"📊 Successfully extracted {len(frames)} frames")
             
+        except Exception as e:
+            print(f"❌ Video analysis failed: {e}")
+            return [self._get_default_result() for _ in range(6)]
+        return self.analyze_frames_emotion(frames)
+    
+    def analyze_frames_emotion(self, frames):
+        """Analyze emotions in sampled frames - send them to the model"""
+        try:
+            if not frames:
+                raise Exception("No frames captured")
+            
             # 将帧图像传给模型进行分析
             analysis_results = self.analyze_emotion(frames)
             
@@ -418,6 +511,7 @@ class EmotionAnalyzerBase:
     
     def process_video_capture(self):
         """Full video capture and analysis pipeline"""
+        video_path = None
         try:
             # Record overall start time
             total_start_time = time.time()
@@ -425,24 +519,29 @@ class EmotionAnalyzerBase:
             # Generate timestamp
             timestamp = datetime.now().strftime("%Y%m%d-%H%M%S")
             
-            # Record video
+            archive_mode = self.media_archive['mode']
+            
+            # Record video straight into a staging file next to its final archive path;
+            # the frames used for analysis are sampled in memory while recording
             print(f"[{timestamp}] Recording video...")
             capture_start = time.time()
-            video_path = self.capture_video(duration=3.0)
+            if archive_mode == 'video':
+                video_path = self.get_video_staging_path(timestamp)
+            video_path, frames = self.capture_clip(duration=3.0, output_path=video_path)
             capture_time = time.time() - capture_start
             print(f"[{timestamp}] Video recording done - elapsed: {capture_time:.2f}s")
             
             # Capture screen
             print(f"[{timestamp}] Capturing screen...")
             screen_start = time.time()
-            screen_image, screen_path = self.capture_screen(timestamp)
+            screen_image, screen_path = self.capture_screen(timestamp, save=(archive_mode != 'none'))
             screen_time = time.time() - screen_start
             print(f"[{timestamp}] Screen capture done - elapsed: {screen_time:.2f}s")
             
             # Analyze video emotion
             print(f"[{timestamp}] Analyzing video emotion...")
             analysis_start = time.time()
-            analysis_results = self.analyze_video_emotion(video_path)
+            analysis_results = self.analyze_frames_emotion(frames)
             analysis_time = time.time() - analysis_start
             print(f"[{timestamp}] Video emotion analysis done - elapsed: {analysis_time:.2f}s")
             
@@ -461,12 +560,36 @@ class EmotionAnalyzerBase:
             else:
                 screen_analysis_result = self._get_default_screen_result()
             
-            # Save video file
-            print(f"[{timestamp}] Saving video...")
+            # Save media according to the archive mode
+            print(f"[{timestamp}] Saving media ({archive_mode})...")
             save_start = time.time()
-            saved_video_path = self.save_video(video_path, timestamp)
+            saved_video_path = None
+            if archive_mode == 'video':
+                saved_video_path = self.save_video(video_path, timestamp)
+                video_path = None
+                image_paths = [saved_video_path] * len(analysis_results)  # use video path instead of image path
+            elif archive_mode == 'frames':
+                image_paths = [self.save_image(frame, timestamp, i) for i, frame in enumerate(frames)]
+            else:
+                image_paths = []
             save_time = time.time() - save_start
-            print(f"[{timestamp}] Video saved to: {saved_video_path} - elapsed: {save_time:.2f}s")
+            
+            # Previews from the in-memory frames (no decode of the saved files)
+            if frames:
+                if archive_mode == 'video':
+                    self.save_thumbnails(saved_video_path, {'first': frames[0], 'middle': frames[len(frames) // 2]})
+                elif archive_mode == 'frames':
+                    self.save_thumbnails(image_paths[0], {'first': frames[0]})
+            
+            # Index saved media for the disk quota
+            n_results = len(analysis_results)
+            if archive_mode == 'video':
+                self.media_store.register(saved_video_path, 'video', timestamp, ref_count=n_results)
+            else:
+                for path in image_paths:
+                    self.media_store.register(path, 'image', timestamp)
+            self.media_store.register(screen_path, 'screen', timestamp, ref_count=n_results)
+            print(f"[{timestamp}] Media saved: {saved_video_path or f'{len(image_paths)} images'} - elapsed: {save_time:.2f}s")
             
             # Save to database - handle 6 analysis results
             db_start = time.time()
@@ -482,7 +605,7 @@ class EmotionAnalyzerBase:
                     emotion=analysis_result['emotion'],
                     confidence=analysis_result['confidence'],
                     has_face=analysis_result['has_face'],
-                    image_path=saved_video_path,  # use video path instead of image path
+                    image_path=image_paths[i] if i < len(image_paths) else None,  # stored video or keyframe
                     emotion_level=analysis_result['emotion_level'],
                     app_name=screen_analysis_result.get('app_name', 'Unknown App'),
                     app_category=screen_analysis_result.get('app_category', 'Other'),
@@ -509,29 +632,33 @@ class EmotionAnalyzerBase:
                       f"desc={screen_analysis_result.get('content_description', 'No description')}")
             
             db_time = time.time() - db_start
-            print(f"[{timestamp}] Data saved - elapsed: {db_time:.2f}s")
+            db_metrics = self.db_writer.get_metrics()
+            media_metrics = self.media_store.get_metrics()
+            print(f"[{timestamp}] Data queued - elapsed: {db_time:.2f}s "
+                  f"(queue depth: {db_metrics['queue_depth']}, last commit: {db_metrics['last_commit_latency']*1000:.1f}ms, "
+                  f"avg commit: {db_metrics['avg_commit_latency']*1000:.1f}ms)")
+            quota = media_metrics['quota_bytes']
+            print(f"[{timestamp}] Media store: {media_metrics['bytes'] / 1024 / 1024:.1f} MB in {media_metrics['files']} files"
+                  f" (quota: {f'{quota / 1024 / 1024:.0f} MB' if quota else 'unlimited'}, pruned: {media_metrics['pruned_files']} files)")
             
             # Compute total time
             total_time = time.time() - total_start_time
             
             print(f"[{timestamp}] Video and screen analysis finished!")
             print(f"[{timestamp}] Total processing time: {total_time:.2f}s")
-            print(f"[{timestamp}] Optimization: analyze video before saving to avoid re-read")
+            print(f"[{timestamp}] Optimization: frames sampled while recording, no video re-read")
             print(f"[{timestamp}] Extract 6 frames and return 6 analysis results")
             print(f"[{timestamp}] Analyze screen content and save with the same record")
             
-            # 清理临时文件
-            try:
-                os.remove(video_path)
-            except:
-                pass
-            
             return {
                 'timestamp': timestamp,
                 'analysis_results': saved_results,
                 'video_path': saved_video_path,
+                'image_paths': image_paths,
                 'screen_path': screen_path,
                 'screen_analysis': screen_analysis_result,
+                'db_writer': db_metrics,
+                'media_store': media_metrics,
                 'timing': {
                     'capture': capture_time,
                     'screen': screen_time,
@@ -544,10 +671,16 @@ class EmotionAnalyzerBase:
             
         except Exception as e:
             print(f"[{datetime.now().strftime('%Y%m%d-%H%M%S')}] Error during video processing: {e}")
+            # 清理未提交的暂存视频
+            if video_path is not None:
+                try:
+                    os.remove(video_path)
+                except OSError:
+                    pass
             return None
     
-    def save_video(self, video_path, timestamp):
-        """Save video locally, directory: year/month/day/hour/"""
+    def get_video_path(self, timestamp):
+        """Archive path of a capture's video, directory: year/month/day/hour/"""
         dt = datetime.strptime(timestamp, "%Y%m%d-%H%M%S")
         # Get parent of current dir
         parent_dir = os.path.dirname(os.path.abspath('.'))
@@ -563,11 +696,25 @@ class EmotionAnalyzerBase:
             os.makedirs(dir_path)
         
         filename = f'{timestamp}_video.mp4'
-        saved_video_path = os.path.join(dir_path, filename)
-        
-        # Copy video file
-        import shutil
-        shutil.copy2(video_path, saved_video_path)
+        return os.path.join(dir_path, filename)
+
+    def get_video_staging_path(self, timestamp):
+        """Staging file in the archive directory (same filesystem as the final path, so commit is a rename)"""
+        final_path = self.get_video_path(timestamp)
+        return os.path.join(os.path.dirname(final_path), f'.{timestamp}_video.part.mp4')
+
+    def save_video(self, video_path, timestamp):
+        """Commit a recorded video to the archive, directory: year/month/day/hour/.
+        The source file is moved, not copied: an atomic rename when it is on the archive filesystem.
+        """
+        saved_video_path = self.get_video_path(timestamp)
+        try:
+            os.replace(video_path, saved_video_path)
+        except OSError:
+            # Different filesystem (e.g. a temp dir): fall back to copy + delete
+            import shutil
+            shutil.copy2(video_path, saved_video_path)
+            os.remove(video_path)
         return saved_video_path
 
     def run_continuous_video(self, interval_minutes=1.0):
@@ -623,6 +770,10 @@ class EmotionAnalyzerBase:
                 print("🔄 Retry in 5 seconds...")
                 time.sleep(5)
         
+        self.db_writer.close()
+        self.media_store.close()
+        self.screen_blobs.close()
+        self.thumbnails.close()
         print("\n👋 Stopped")
         print(f"📊 Completed {cycle_count} analysis loops")
 
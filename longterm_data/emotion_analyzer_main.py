@@ -103,6 +103,19 @@ def get_interval():
         print("⚠️ Using default interval: 1.0 minutes")
         return 1.0
 
+def get_media_archive_mode():
+    """Get media archive mode"""
+    modes = {"1": "video", "2": "frames", "3": "none"}
+    print(f"\n🗃️ Select media archive mode:")
+    print("1. video  - keep the full 3s video (default)")
+    print("2. frames - keep only the 6 analyzed frames as JPEG")
+    print("3. none   - keep no media, only analysis results")
+    choice = input("Enter mode number (default 1): ").strip() or "1"
+    if choice not in modes:
+        print("⚠️ Using default mode: video")
+        choice = "1"
+    return modes[choice]
+
 def main():
     """Main entry"""
     print("😊 Emotion Analysis System")
@@ -139,6 +152,7 @@ def main():
     # 使用默认内置摄像头（索引0，自动选择后端）
     # 获取捕获间隔
     interval = get_interval()
+    media_mode = get_media_archive_mode()
     
     # Create analyzer (using default camera settings)
     try:
@@ -147,6 +161,7 @@ def main():
             camera_backend=cv2.CAP_ANY,
             camera_index=0
         )
+        analyzer.set_media_archive(mode=media_mode)
         print("✅ Analyzer initialized successfully")
     except Exception as e:
         print(f"❌ Failed to initialize analyzer: {e}")
@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Day-partitioned columnar archive of emotion_records
+
+Each completed day is written to <archive_dir>/day=YYYYMMDD/ as Parquet (when pyarrow is
+installed) or compressed numpy .npz. Emotion/app/user columns are categorical-encoded. A
+_manifest.json records exported days and their max id, so later runs only append new days and
+re-export a day that gained rows (backfills) merged with what was archived, and read_archive()
+loads just the partitions and columns a caller asks for.
+"""
+
+import argparse
+import json
+import os
+import sqlite3
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+from emotion_data_access import get_db_path
+
+try:
+    import pyarrow  # noqa: F401
+    PARQUET_AVAILABLE = True
+except ImportError:
+    PARQUET_AVAILABLE = False
+
+ARCHIVE_COLUMNS = [
+    'id', 'timestamp', 'emotion', 'confidence', 'has_face', 'image_path', 'username',
+    'emotion_level', 'app_name', 'app_category', 'content_description', 'screen_path'
+]
+CATEGORICAL_COLUMNS = ['emotion', 'username', 'app_name', 'app_category']
+NUMERIC_COLUMNS = {'id': np.int64, 'confidence': np.float32, 'has_face': np.bool_, 'emotion_level': np.float32}
+
+MANIFEST_NAME = '_manifest.json'
+
+
+def default_archive_dir(db_path):
+    """Archive directory used by the dashboards: emotion_archive/ next to the database"""
+    return os.path.join(os.path.dirname(os.path.abspath(db_path)), 'emotion_archive')
+
+
+def load_manifest(archive_dir):
+    """{day: {'rows', 'max_id', 'format', 'file'}} for every exported partition"""
+    path = os.path.join(archive_dir, MANIFEST_NAME)
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _save_manifest(archive_dir, manifest):
+    path = os.path.join(archive_dir, MANIFEST_NAME)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def _write_npz(df, path):
+    # Text columns become int32 codes plus a categories array, so no pickled objects are needed
+    arrays = {}
+    for col in df.columns:
+        if col in NUMERIC_COLUMNS:
+            arrays[col] = df[col].fillna(0).to_numpy(dtype=NUMERIC_COLUMNS[col])
+        else:
+            cat = pd.Categorical(df[col])
+            arrays[f'{col}__codes'] = cat.codes.astype(np.int32)
+            arrays[f'{col}__categories'] = np.asarray(cat.categories.astype(str), dtype=str)
+    np.savez_compressed(path, **arrays)
+
+
+def _read_npz(path, columns):
+    with np.load(path, allow_pickle=False) as data:
+        out = {}
+        for col in columns:
+            if col in data.files:
+                out[col] = data[col]
+            elif f'{col}__codes' in data.files:
+                categorical = pd.Categorical.from_codes(data[f'{col}__codes'], categories=data[f'{col}__categories'])
+                out[col] = categorical if col in CATEGORICAL_COLUMNS else np.asarray(categorical, dtype=object)
+        return pd.DataFrame(out)
+
+
+def export_day(conn, day, archive_dir, fmt, archived=None):
+    """Write one day's rows to its partition, merged by id with already archived rows; returns the manifest entry"""
+    next_day = (datetime.strptime(day, '%Y%m%d') + timedelta(days=1)).strftime('%Y%m%d')
+    df = pd.read_sql_query(
+        f"SELECT {', '.join(ARCHIVE_COLUMNS)} FROM emotion_records WHERE timestamp >= ? AND timestamp < ? ORDER BY id",
+        conn, params=[day, next_day]
+    )
+    if archived is not None and len(archived):
+        # Rows still in the DB win over their archived copy
+        archived = archived.astype({col: object for col in CATEGORICAL_COLUMNS})
+        df = (pd.concat([archived, df], ignore_index=True)
+              .drop_duplicates('id', keep='last').sort_values('id', ignore_index=True))
+    df['has_face'] = df['has_face'].astype(bool)
+    part_dir = os.path.join(archive_dir, f'day={day}')
+    os.makedirs(part_dir, exist_ok=True)
+    if fmt == 'parquet':
+        for col in CATEGORICAL_COLUMNS:
+            df[col] = df[col].astype('category')
+        filename = 'emotion_records.parquet'
+        tmp_path = os.path.join(part_dir, filename + '.tmp')
+        df.to_parquet(tmp_path, engine='pyarrow', compression='zstd', index=False)
+    else:
+        filename = 'emotion_records.npz'
+        tmp_path = os.path.join(part_dir, 'emotion_records.tmp.npz')
+        _write_npz(df, tmp_path)
+    os.replace(tmp_path, os.path.join(part_dir, filename))
+    return {
+        'rows': int(len(df)),
+        'max_id': int(df['id'].max()) if len(df) else 0,
+        'format': fmt,
+        'file': f'day={day}/{filename}',
+    }
+
+
+def export_archive(db_path, archive_dir=None, through_day=None, fmt=None):
+    """Export every completed day (<= through_day, default yesterday) that is not yet archived or gained rows"""
+    archive_dir = archive_dir or default_archive_dir(db_path)
+    fmt = fmt or ('parquet' if PARQUET_AVAILABLE else 'npz')
+    if fmt == 'parquet' and not PARQUET_AVAILABLE:
+        print("⚠️ pyarrow not installed, falling back to .npz partitions")
+        fmt = 'npz'
+    through_day = through_day or (datetime.now() - timedelta(days=1)).strftime('%Y%m%d')
+    os.makedirs(archive_dir, exist_ok=True)
+
+    manifest = load_manifest(archive_dir)
+    conn = sqlite3.connect(db_path, timeout=30)
+    try:
+        next_day = (datetime.strptime(through_day, '%Y%m%d') + timedelta(days=1)).strftime('%Y%m%d')
+        days = conn.execute(
+            "SELECT substr(timestamp, 1, 8), MAX(id) FROM emotion_records WHERE timestamp < ? GROUP BY 1 ORDER BY 1",
+            (next_day,)
+        ).fetchall()
+        # New days, and archived days whose raw rows now go past the exported max id
+        new_days = [d for d, max_id in days if d.isdigit() and len(d) == 8
+                    and (d not in manifest or max_id > manifest[d]['max_id'])]
+        for day in new_days:
+            old = manifest.get(day)
+            archived = read_archive(archive_dir, days=[day]) if old else None
+            manifest[day] = export_day(conn, day, archive_dir, fmt, archived)
+            if old and old['file'] != manifest[day]['file']:
+                os.remove(os.path.join(archive_dir, old['file']))
+            # Persist after every partition so an interrupted export resumes where it stopped
+            _save_manifest(archive_dir, manifest)
+            print(f"📦 {'Re-archived' if old else 'Archived'} {day}: {manifest[day]['rows']} rows ({fmt})")
+    finally:
+        conn.close()
+    print(f"✅ Archive up to date: {len(new_days)} new day(s), {len(manifest)} total in {archive_dir}")
+    return new_days
+
+
+def archived_days(archive_dir, start_day=None, end_day=None):
+    """Sorted archived days within [start_day, end_day] (YYYYMMDD, inclusive)"""
+    return sorted(
+        d for d in load_manifest(archive_dir)
+        if (start_day is None or d >= start_day) and (end_day is None or d <= end_day)
+    )
+
+
+def read_archive(archive_dir, start_day=None, end_day=None, columns=None, days=None):
+    """Load archived rows, touching only partitions in range (or listed in days) and only the given columns"""
+    manifest = load_manifest(archive_dir)
+    columns = list(columns or ARCHIVE_COLUMNS)
+    if days is None:
+        days = archived_days(archive_dir, start_day, end_day)
+    frames = []
+    for day in days:
+        entry = manifest.get(day)
+        if entry is None or entry['rows'] == 0:
+            continue
+        path = os.path.join(archive_dir, entry['file'])
+        if entry['format'] == 'parquet':
+            frames.append(pd.read_parquet(path, columns=columns))
+        else:
+            frames.append(_read_npz(path, columns))
+    if not frames:
+        return pd.DataFrame(columns=columns)
+    df = pd.concat(frames, ignore_index=True)
+    # Categories differ per partition; re-encode after concatenation
+    for col in CATEGORICAL_COLUMNS:
+        if col in df.columns:
+            df[col] = df[col].astype('category')
+    return df
+
+
+def compacted_rows(db_path, days, columns, archive_dir=None):
+    """Archived rows of the given days that are no longer in the DB (days fully or partly compacted)"""
+    archive_dir = archive_dir or default_archive_dir(db_path)
+    manifest = load_manifest(archive_dir)
+    days = [d for d in days if manifest.get(d, {}).get('rows')]
+    compacted, kept_ids = [], []
+    if days:
+        conn = sqlite3.connect(db_path, timeout=30)
+        try:
+            for day in days:
+                next_day = (datetime.strptime(day, '%Y%m%d') + timedelta(days=1)).strftime('%Y%m%d')
+                # Archived rows have ids <= the partition's max_id; fewer such rows in the DB means some are gone
+                query = "FROM emotion_records WHERE timestamp >= ? AND timestamp < ? AND id <= ?"
+                params = (day, next_day, manifest[day]['max_id'])
+                if conn.execute(f"SELECT COUNT(*) {query}", params).fetchone()[0] < manifest[day]['rows']:
+                    compacted.append(day)
+                    kept_ids += [r[0] for r in conn.execute(f"SELECT id {query}", params)]
+        finally:
+            conn.close()
+    if not compacted:
+        return pd.DataFrame(columns=list(columns))
+    df = read_archive(archive_dir, days=compacted, columns=['id'] + [c for c in columns if c != 'id'])
+    df = df[~df['id'].isin(kept_ids)]
+    return df[list(columns)].reset_index(drop=True)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Export emotion_records into day-partitioned columnar files")
+    parser.add_argument('--db', default=get_db_path(), help='SQLite database path')
+    parser.add_argument('--archive-dir', help='Output directory (default: emotion_archive/ next to the DB)')
+    parser.add_argument('--through', help='Last day to export (YYYYMMDD), default: yesterday')
+    parser.add_argument('--format', choices=['parquet', 'npz'], help='Partition format (default: parquet if pyarrow is installed)')
+    args = parser.parse_args()
+
+    export_archive(args.db, args.archive_dir, args.through, args.format)
@@ -0,0 +1,287 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Shared data access for emotion_data.db
+
+One configured database path for the analyzer and every dashboard tab, a thread-safe pool of
+read-only connections, and typed query helpers. Query text is built once per shape and reused,
+so sqlite3's per-connection statement cache keeps the prepared statements.
+"""
+
+import os
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from functools import lru_cache
+from typing import Dict, List, Optional, Sequence
+from urllib.parse import quote
+
+from emotion_rollup import EMOTION_LABEL_MAP, rollup_tables_exist, users_table_exists
+
+# Default location: next to the analyzer (it is started from longterm_data/), whatever the caller's cwd.
+# EMOTION_DB_PATH / EMOTION_FAKE_DB_PATH override it for both the analyzer and the dashboards.
+# Older versions opened a path relative to the cwd; such a file is still used until it is moved.
+_DATA_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_DB_PATH = os.path.join(_DATA_DIR, 'emotion_data.db')
+DEFAULT_FAKE_DB_PATH = os.path.join(_DATA_DIR, 'emotion_data_fake.db')
+
+RECORD_COLUMNS = (
+    'id', 'timestamp', 'emotion', 'confidence', 'has_face', 'image_path', 'username',
+    'emotion_level', 'app_name', 'app_category', 'content_description', 'screen_path'
+)
+
+
+_legacy_warned = set()
+
+
+def _resolve_db_path(env_var: str, default_path: str) -> str:
+    override = os.environ.get(env_var)
+    if override:
+        return os.path.abspath(override)
+    legacy_path = os.path.abspath(os.path.basename(default_path))
+    if legacy_path != default_path and not os.path.exists(default_path) and os.path.exists(legacy_path):
+        if legacy_path not in _legacy_warned:
+            _legacy_warned.add(legacy_path)
+            print(f"⚠️ Using {legacy_path} (old location). The default is now {default_path}; "
+                  f"move it with: mv \"{legacy_path}\" \"{default_path}\" (or set {env_var})")
+        return legacy_path
+    return default_path
+
+
+def get_db_path() -> str:
+    """Absolute path of the emotion database shared by the analyzer and the dashboards"""
+    return _resolve_db_path('EMOTION_DB_PATH', DEFAULT_DB_PATH)
+
+
+def get_fake_db_path() -> str:
+    """Absolute path of the synthetic test database"""
+    return _resolve_db_path('EMOTION_FAKE_DB_PATH', DEFAULT_FAKE_DB_PATH)
+
+
+def next_day(day: str) -> str:
+    """YYYYMMDD of the following day"""
+    return (datetime.strptime(day, '%Y%m%d') + timedelta(days=1)).strftime('%Y%m%d')
+
+
+class ReadConnectionPool:
+    """Thread-safe pool of read-only SQLite connections for one database file"""
+
+    def __init__(self, db_path: str, max_size: int = 4):
+        self.db_path = db_path
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(max_size)
+
+    def _connect(self):
+        uri = f"file:{quote(self.db_path)}?mode=ro"
+        conn = sqlite3.connect(uri, uri=True, timeout=10, check_same_thread=False, cached_statements=256)
+        conn.execute("PRAGMA query_only = ON")
+        return conn
+
+    @contextmanager
+    def connection(self):
+        """Borrow a connection; blocks while max_size connections are in use"""
+        self._slots.acquire()
+        conn = None
+        try:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                conn = self._connect()
+            yield conn
+        except sqlite3.DatabaseError:
+            # Don't hand a possibly broken connection to the next caller
+            if conn is not None:
+                conn.close()
+                conn = None
+            raise
+        finally:
+            if conn is not None:
+                self._idle.put(conn)
+            self._slots.release()
+
+    def close(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+
+_pools: Dict[str, ReadConnectionPool] = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(db_path: Optional[str] = None) -> ReadConnectionPool:
+    """Shared read pool for db_path (default: the configured database)"""
+    db_path = os.path.abspath(db_path or get_db_path())
+    with _pools_lock:
+        pool = _pools.get(db_path)
+        if pool is None:
+            pool = _pools[db_path] = ReadConnectionPool(db_path)
+        return pool
+
+
+@contextmanager
+def read_connection(db_path: Optional[str] = None):
+    """Pooled read-only connection to db_path (default: the configured database)"""
+    with get_pool(db_path).connection() as conn:
+        yield conn
+
+
+def write_connection(db_path: Optional[str] = None) -> sqlite3.Connection:
+    """Plain read-write connection, for dashboard-side cache tables"""
+    return sqlite3.connect(db_path or get_db_path(), timeout=30)
+
+
+def db_exists(db_path: Optional[str] = None) -> bool:
+    return os.path.exists(db_path or get_db_path())
+
+
+@lru_cache(maxsize=128)
+def _records_query(columns: tuple, n_emotions: int, by_user: bool, has_face: Optional[bool], order: str,
+                   after_id: bool = False) -> str:
+    query = f"SELECT {', '.join(columns)} FROM emotion_records WHERE timestamp >= ? AND timestamp < ?"
+    if after_id:
+        query += " AND id > ?"
+    if has_face is not None:
+        query += f" AND has_face = {1 if has_face else 0}"
+    if n_emotions:
+        query += f" AND emotion IN ({','.join(['?'] * n_emotions)})"
+    if by_user:
+        query += " AND username = ?"
+    if order:
+        query += f" ORDER BY {order}"
+    return query
+
+
+def query_records(start_day: str, end_day: str, username: Optional[str] = None,
+                  columns: Sequence[str] = RECORD_COLUMNS, emotions: Optional[Sequence[str]] = None,
+                  has_face: Optional[bool] = None, order: str = 'timestamp', db_path: Optional[str] = None,
+                  after_id: Optional[int] = None):
+    """DataFrame of emotion_records rows for days [start_day, end_day] (YYYYMMDD, inclusive);
+    after_id restricts it to rows inserted after that id (incremental reads)"""
+    import pandas as pd
+
+    by_user = bool(username) and username != 'All'
+    query = _records_query(tuple(columns), len(emotions or ()), by_user, has_face, order, after_id is not None)
+    params = [start_day, next_day(end_day)]
+    if after_id is not None:
+        params.append(int(after_id))
+    params += list(emotions or ())
+    if by_user:
+        params.append(username)
+    with read_connection(db_path) as conn:
+        return pd.read_sql_query(query, conn, params=params)
+
+
+def count_by_day(start_day: str, end_day: str, has_face: bool = False, db_path: Optional[str] = None) -> Dict[str, int]:
+    """{YYYYMMDD: row count} for days in [start_day, end_day] that have rows (has_face=True counts face rows only)"""
+    with read_connection(db_path) as conn:
+        if rollup_tables_exist(conn):
+            column = 'face_count' if has_face else 'count'
+            rows = conn.execute(
+                f"SELECT day, SUM({column}) FROM emotion_rollup_daily WHERE day >= ? AND day <= ? GROUP BY day",
+                (start_day, end_day)
+            ).fetchall()
+        else:
+            face_clause = " AND has_face = 1" if has_face else ""
+            rows = conn.execute(
+                "SELECT substr(timestamp, 1, 8), COUNT(*) FROM emotion_records "
+                f"WHERE timestamp >= ? AND timestamp < ?{face_clause} GROUP BY 1",
+                (start_day, next_day(end_day))
+            ).fetchall()
+    return {day: cnt for day, cnt in rows if cnt}
+
+
+def day_watermarks(start_day: str, end_day: str, db_path: Optional[str] = None) -> Dict[str, tuple]:
+    """{YYYYMMDD: (row count, max id)} for days in [start_day, end_day] that have raw rows.
+
+    Any insert or delete on a day changes its watermark; the query is answered from the
+    timestamp index alone (the index entries carry the rowid).
+    """
+    with read_connection(db_path) as conn:
+        rows = conn.execute(
+            "SELECT substr(timestamp, 1, 8), COUNT(*), MAX(id) FROM emotion_records "
+            "WHERE timestamp >= ? AND timestamp < ? GROUP BY 1",
+            (start_day, next_day(end_day))
+        ).fetchall()
+    return {day: (cnt, max_id) for day, cnt, max_id in rows}
+
+
+def data_watermark(db_path: Optional[str] = None) -> tuple:
+    """(min id, max id) of emotion_records: inserts raise the max, retention deletes the oldest rows
+    and raises the min. Two rowid lookups, cheap enough to check on every dashboard callback."""
+    with read_connection(db_path) as conn:
+        return conn.execute(
+            "SELECT (SELECT MIN(id) FROM emotion_records), (SELECT MAX(id) FROM emotion_records)"
+        ).fetchone()
+
+
+def daily_emotion_counts(start_day: str, end_day: str, username: Optional[str] = None,
+                         emotions: Optional[Sequence[str]] = None, db_path: Optional[str] = None):
+    """Rows of (day, canonical emotion, count) from the daily rollup; None when the DB has no rollups"""
+    query = "SELECT day, emotion, SUM(count) FROM emotion_rollup_daily WHERE day >= ? AND day <= ?"
+    params = [start_day, end_day]
+    if emotions:
+        query += f" AND emotion IN ({','.join(['?'] * len(emotions))})"
+        params.extend(emotions)
+    if username and username != 'All':
+        query += " AND username = ?"
+        params.append(username)
+    query += " GROUP BY day, emotion ORDER BY day"
+    with read_connection(db_path) as conn:
+        if not rollup_tables_exist(conn):
+            return None
+        return conn.execute(query, params).fetchall()
+
+
+@lru_cache(maxsize=32)
+def _raw_daily_counts_query(n_labels: int, by_user: bool) -> str:
+    # Canonical label applied in SQL, so only (day, emotion, count) rows leave SQLite
+    canonical = "CASE emotion " + " ".join(
+        f"WHEN '{label}' THEN '{name}'" for label, name in EMOTION_LABEL_MAP.items()) + " ELSE emotion END"
+    query = (f"SELECT substr(timestamp, 1, 8), {canonical}, COUNT(*) FROM emotion_records "
+             "WHERE timestamp >= ? AND timestamp < ?")
+    if n_labels:
+        query += f" AND emotion IN ({','.join(['?'] * n_labels)})"
+    if by_user:
+        query += " AND username = ?"
+    return query + " GROUP BY 1, 2 ORDER BY 1"
+
+
+def raw_daily_emotion_counts(start_day: str, end_day: str, username: Optional[str] = None,
+                             emotions: Optional[Sequence[str]] = None, db_path: Optional[str] = None):
+    """Rows of (day, canonical emotion, count) grouped in SQL from raw rows, for DBs without rollups.
+
+    emotions are canonical names; they match every raw label that maps to them.
+    """
+    labels = ()
+    if emotions:
+        labels = tuple(sorted(set(emotions) | {label for label, name in EMOTION_LABEL_MAP.items() if name in emotions}))
+    by_user = bool(username) and username != 'All'
+    params = [start_day, next_day(end_day)] + list(labels)
+    if by_user:
+        params.append(username)
+    with read_connection(db_path) as conn:
+        return conn.execute(_raw_daily_counts_query(len(labels), by_user), params).fetchall()
+
+
+def distinct_users(db_path: Optional[str] = None) -> List[str]:
+    """Sorted non-empty usernames present in the database (emotion_users lookup; full scan on older DBs)"""
+    with read_connection(db_path) as conn:
+        if users_table_exists(conn):
+            rows = conn.execute("SELECT username FROM emotion_users").fetchall()
+        else:
+            rows = conn.execute("SELECT DISTINCT username FROM emotion_records WHERE username IS NOT NULL").fetchall()
+    return sorted(u for (u,) in rows if u)
+
+
+def first_day_with_faces(db_path: Optional[str] = None) -> Optional[str]:
+    """YYYYMMDD of the first day that has face records, if any"""
+    with read_connection(db_path) as conn:
+        row = conn.execute(
+            "SELECT substr(timestamp, 1, 8) FROM emotion_records WHERE has_face = 1 ORDER BY timestamp LIMIT 1"
+        ).fetchone()
+    return row[0] if row else None
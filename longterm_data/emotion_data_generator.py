@@ -0,0 +1,247 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Synthetic emotion_records generator for benchmarks and load tests
+
+Writes analyzer-shaped rows (one capture cycle per interval during work hours, several
+analysis results per cycle with the ``YYYYMMDD-HHMMSS_ii`` timestamps the analyzer uses)
+into a database with the analyzer's schema. Rows are built day by day with numpy and
+bulk-inserted in one transaction with journaling off; the timestamp index and rollups are
+built once after the load instead of per row. The same seed and options give the same rows.
+"""
+
+import argparse
+import bisect
+import os
+import sqlite3
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from emotion_data_access import get_fake_db_path
+from emotion_db_writer import CREATE_EMOTION_RECORDS_SQL, INSERT_EMOTION_RECORD_SQL
+from emotion_rollup import ensure_rollup_schema, ensure_users_schema, rollup_tables_exist
+
+# Raw labels as the model writes them; weights are relative
+DEFAULT_EMOTION_WEIGHTS = {
+    "中立": 55,
+    "快乐": 18,
+    "担忧": 9,
+    "惊讶": 6,
+    "悲伤": 6,
+    "愤怒": 6,
+}
+
+# (app_name, app_category, content_description): weight
+DEFAULT_APP_WEIGHTS = {
+    ("Visual Studio Code", "编程开发", "编写和调试代码"): 28,
+    ("Google Chrome", "网页浏览", "浏览网页和查阅资料"): 20,
+    ("Microsoft Teams", "即时通讯", "团队聊天和在线会议"): 15,
+    ("Microsoft Outlook", "办公软件", "阅读和回复邮件"): 12,
+    ("Microsoft Word", "办公软件", "编辑文档"): 8,
+    ("Bilibili", "视频娱乐", "观看视频"): 5,
+    ("未知应用", "其他", "无法识别当前应用和内容"): 12,
+}
+
+NO_FACE_EMOTION = "无"
+
+# Chance that one result of a capture cycle disagrees with the cycle's emotion
+FRAME_NOISE = 0.15
+
+
+def parse_weights(spec):
+    """'中立=55,快乐=20' -> {'中立': 55.0, '快乐': 20.0}"""
+    weights = {}
+    for item in spec.split(','):
+        if not item.strip():
+            continue
+        key, _, weight = item.rpartition('=')
+        if not key:
+            raise ValueError(f"Expected label=weight, got {item!r}")
+        weights[key.strip()] = float(weight)
+    return weights
+
+
+def parse_app_weights(spec):
+    """'Chrome:网页浏览=20,Word:办公软件=5' -> {(name, category, description): weight}"""
+    apps = {}
+    for key, weight in parse_weights(spec).items():
+        name, _, category = key.partition(':')
+        apps[(name.strip(), category.strip() or "其他", f"使用{name.strip()}")] = weight
+    return apps
+
+
+def _probabilities(weights):
+    p = np.asarray(list(weights.values()), dtype=float)
+    if (p < 0).any() or p.sum() <= 0:
+        raise ValueError(f"Weights must be non-negative and not all zero: {weights}")
+    return p / p.sum()
+
+
+def _seconds(hhmm):
+    hours, minutes = hhmm.split(':')
+    return int(hours) * 3600 + int(minutes) * 60
+
+
+def generate_day_rows(rng, day, users, interval_minutes, results_per_capture, work_start, work_end,
+                      face_rate, emotion_labels, emotion_p, apps, app_p):
+    """emotion_records tuples (INSERT_EMOTION_RECORD_SQL order) for one day, sorted by timestamp"""
+    step = interval_minutes * 60
+    jitter = min(10.0, step / 2)
+    cap_seconds, cap_users = [], []
+    for user_idx in range(len(users)):
+        # Each user arrives and leaves up to half an hour around the work hours
+        start = work_start + rng.uniform(-1800, 1800)
+        end = work_end + rng.uniform(-1800, 1800)
+        n = max(0, int((end - start) // step))
+        seconds = start + np.arange(n) * step + rng.uniform(0, jitter, n)
+        cap_seconds.append(np.clip(seconds, 0, 86399).astype(np.int64))
+        cap_users.append(np.full(n, user_idx))
+    cap_seconds = np.concatenate(cap_seconds)
+    cap_users = np.concatenate(cap_users)
+    order = np.argsort(cap_seconds, kind='stable')
+    cap_seconds, cap_users = cap_seconds[order], cap_users[order]
+    n_caps = len(cap_seconds)
+    if not n_caps:
+        return []
+
+    # Face presence and app are per cycle; the emotion is per cycle with some per-result noise
+    cap_face = rng.random(n_caps) < face_rate
+    cap_emotion = rng.choice(len(emotion_labels), n_caps, p=emotion_p)
+    cap_app = rng.choice(len(apps), n_caps, p=app_p)
+
+    k = results_per_capture
+    n_rows = n_caps * k
+    face = np.repeat(cap_face, k)
+    emotion = np.repeat(cap_emotion, k)
+    noisy = rng.random(n_rows) < FRAME_NOISE
+    emotion[noisy] = rng.choice(len(emotion_labels), int(noisy.sum()), p=emotion_p)
+    neutral = np.asarray([label == "中立" for label in emotion_labels])[emotion]
+    confidence = np.where(face, np.round(rng.uniform(0.6, 0.99, n_rows), 2), 0.0)
+    level = np.where(face, np.round(np.where(neutral, rng.uniform(0.0, 0.3, n_rows), rng.uniform(0.2, 1.0, n_rows)), 2), 0.0)
+
+    cap_stamps = [f"{day}-{s // 3600:02d}{s // 60 % 60:02d}{s % 60:02d}" for s in cap_seconds.tolist()]
+    timestamps = [f"{stamp}_{i:02d}" for stamp in cap_stamps for i in range(k)]
+    emotions = [emotion_labels[e] if f else NO_FACE_EMOTION for e, f in zip(emotion.tolist(), face.tolist())]
+    row_users = [users[u] for u in np.repeat(cap_users, k).tolist()]
+    row_apps = [apps[a] for a in np.repeat(cap_app, k).tolist()]
+    return [
+        (ts, emo, conf, has_face, None, user, lvl, app[0], app[1], app[2], None)
+        for ts, emo, conf, has_face, user, lvl, app in zip(
+            timestamps, emotions, confidence.tolist(), face.tolist(), row_users, level.tolist(), row_apps)
+    ]
+
+
+def generate(db_path=None, users=5, days=30, end_day=None, interval_minutes=1.0, results_per_capture=6,
+             work_hours=("09:00", "18:00"), weekends=False, face_rate=0.85, emotion_weights=None,
+             app_weights=None, seed=0, rollups=True, overwrite=False, append=False):
+    """Write synthetic rows for `users` users over the `days` days ending at end_day (YYYYMMDD,
+    default today; today stops at the current time); returns the number of rows inserted"""
+    db_path = db_path or get_fake_db_path()
+    if os.path.exists(db_path):
+        if overwrite:
+            for suffix in ('', '-wal', '-shm'):
+                if os.path.exists(db_path + suffix):
+                    os.remove(db_path + suffix)
+        elif not append:
+            raise FileExistsError(f"{db_path} exists; pass overwrite=True or append=True")
+    emotion_weights = emotion_weights or DEFAULT_EMOTION_WEIGHTS
+    app_weights = app_weights or DEFAULT_APP_WEIGHTS
+    emotion_labels, emotion_p = list(emotion_weights), _probabilities(emotion_weights)
+    apps, app_p = list(app_weights), _probabilities(app_weights)
+    user_names = [f"user{i + 1:02d}" for i in range(users)] if isinstance(users, int) else list(users)
+    work_start, work_end = (_seconds(t) for t in work_hours)
+    now_stamp = datetime.now().strftime('%Y%m%d-%H%M%S')
+    last = datetime.strptime(end_day or now_stamp[:8], '%Y%m%d')
+    day_keys = [(last - timedelta(days=i)).strftime('%Y%m%d') for i in range(days - 1, -1, -1)]
+    if not weekends:
+        day_keys = [d for d in day_keys if datetime.strptime(d, '%Y%m%d').weekday() < 5]
+
+    rng = np.random.default_rng(seed)
+    conn = sqlite3.connect(db_path)
+    try:
+        is_new = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type='table' AND name='emotion_records'").fetchone() is None
+        had_rollups = rollup_tables_exist(conn)
+        if is_new:
+            conn.execute('PRAGMA auto_vacuum = INCREMENTAL')
+            conn.execute(CREATE_EMOTION_RECORDS_SQL)
+        # Bulk-load settings: no rollback journal or fsync, a large page cache; a crash mid-load
+        # can corrupt the file, which is acceptable for a generated database
+        conn.execute("PRAGMA journal_mode=OFF")
+        conn.execute("PRAGMA synchronous=OFF")
+        conn.execute("PRAGMA cache_size=-262144")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        # The per-row rollup and users triggers dominate insert time; they are recreated (with a full
+        # rebuild) after the load. A new database also gets its timestamp index only afterwards.
+        conn.execute("DROP TRIGGER IF EXISTS trg_emotion_records_rollup")
+        conn.execute("DROP TRIGGER IF EXISTS trg_emotion_records_users")
+
+        start = time.time()
+        total = 0
+        for n, day in enumerate(day_keys, 1):
+            rows = generate_day_rows(rng, day, user_names, interval_minutes, results_per_capture, work_start,
+                                     work_end, face_rate, emotion_labels, emotion_p, apps, app_p)
+            if day >= now_stamp[:8]:
+                # No captures from the future: today ends now (rows are sorted by timestamp)
+                rows = rows[:bisect.bisect_right([r[0][:15] for r in rows], now_stamp)]
+            conn.executemany(INSERT_EMOTION_RECORD_SQL, rows)
+            total += len(rows)
+            if n % 30 == 0 or n == len(day_keys):
+                elapsed = time.time() - start
+                print(f"   {n}/{len(day_keys)} days, {total:,} rows ({total / max(elapsed, 1e-9):,.0f} rows/s)")
+        conn.commit()
+        load_seconds = time.time() - start
+
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_emotion_records_timestamp ON emotion_records(timestamp)')
+        if rollups or had_rollups:
+            # Recreating the trigger rebuilds the rollups from all raw rows in one pass
+            ensure_rollup_schema(conn)
+        ensure_users_schema(conn)
+        conn.commit()
+        conn.execute("PRAGMA journal_mode=WAL")
+    finally:
+        conn.close()
+    print(f"✅ Generated {total:,} rows for {len(user_names)} user(s) over {len(day_keys)} day(s) into {db_path}")
+    print(f"   insert {load_seconds:.1f}s, index and rollups {time.time() - start - load_seconds:.1f}s")
+    return total
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Generate a synthetic emotion database for benchmarks and load tests")
+    parser.add_argument('--db', default=get_fake_db_path(), help='SQLite database path')
+    parser.add_argument('--users', type=int, default=5, help='Number of users (user01, user02, ...)')
+    parser.add_argument('--days', type=int, default=30, help='Number of calendar days')
+    parser.add_argument('--end-day', help='Last day (YYYYMMDD), default: today (rows up to the current time)')
+    parser.add_argument('--interval', type=float, default=1.0, help='Capture cycle interval in minutes')
+    parser.add_argument('--results-per-capture', type=int, default=6, help='Analysis results written per capture cycle')
+    parser.add_argument('--work-hours', default='09:00-18:00', help='Capture window (HH:MM-HH:MM), +-30 min per user and day')
+    parser.add_argument('--weekends', action='store_true', help='Also generate Saturdays and Sundays')
+    parser.add_argument('--face-rate', type=float, default=0.85, help='Share of capture cycles with a face')
+    parser.add_argument('--emotions', help="Emotion weights, e.g. '中立=55,快乐=20,愤怒=5'")
+    parser.add_argument('--apps', help="App weights as name:category=weight, e.g. 'Chrome:网页浏览=20,Word:办公软件=5'")
+    parser.add_argument('--seed', type=int, default=0, help='Random seed')
+    parser.add_argument('--no-rollups', action='store_true', help='Skip rollup tables (raw-query fallback paths)')
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument('--overwrite', action='store_true', help='Replace an existing database')
+    group.add_argument('--append', action='store_true', help='Add rows to an existing database')
+    args = parser.parse_args()
+
+    generate(
+        args.db,
+        users=args.users,
+        days=args.days,
+        end_day=args.end_day,
+        interval_minutes=args.interval,
+        results_per_capture=args.results_per_capture,
+        work_hours=tuple(args.work_hours.split('-')),
+        weekends=args.weekends,
+        face_rate=args.face_rate,
+        emotion_weights=parse_weights(args.emotions) if args.emotions else None,
+        app_weights=parse_app_weights(args.apps) if args.apps else None,
+        seed=args.seed,
+        rollups=not args.no_rollups,
+        overwrite=args.overwrite,
+        append=args.append,
+    )
@@ -0,0 +1,216 @@
+import itertools
+import queue
+import sqlite3
+import threading
+import time
+
+CREATE_EMOTION_RECORDS_SQL = '''
+    CREATE TABLE IF NOT EXISTS emotion_records (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        timestamp TEXT NOT NULL,
+        emotion TEXT NOT NULL,
+        confidence REAL NOT NULL,
+        has_face BOOLEAN NOT NULL,
+        image_path TEXT,
+        username TEXT,
+        emotion_level REAL DEFAULT 0.0,
+        app_name TEXT DEFAULT "Unknown App",
+        app_category TEXT DEFAULT "Other",
+        content_description TEXT DEFAULT "Unrecognized app/content",
+        screen_path TEXT
+    )
+'''
+
+INSERT_EMOTION_RECORD_SQL = '''
+    INSERT INTO emotion_records (timestamp, emotion, confidence, has_face, image_path, username, emotion_level,
+                               app_name, app_category, content_description, screen_path)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+'''
+
+
+class EmotionDBWriter:
+    """Background writer: a bounded queue feeding one thread that group-commits emotion_records rows
+    (and the small bookkeeping writes that go with them, in submission order)"""
+
+    def __init__(self, db_path, max_queue_size=1000, batch_size=60, flush_interval=2.0, put_timeout=5.0):
+        """
+        :param db_path: SQLite database path
+        :param max_queue_size: queue bound; producers block (then fall back to a direct insert) when full
+        :param batch_size: commit as soon as this many rows are pending
+        :param flush_interval: commit pending rows at the latest this many seconds after the first one arrived
+        :param put_timeout: seconds a producer waits for queue space before writing synchronously
+        """
+        self.db_path = db_path
+        self.batch_size = max(1, int(batch_size))
+        self.flush_interval = float(flush_interval)
+        self.put_timeout = put_timeout
+        self._queue = queue.Queue(maxsize=max_queue_size)
+        self._stop_event = threading.Event()
+        self._closed = False
+        self._submit_lock = threading.Lock()
+        self._metrics_lock = threading.Lock()
+        self._metrics = {
+            'rows_written': 0,
+            'batches_committed': 0,
+            'last_batch_size': 0,
+            'last_commit_latency': 0.0,
+            'max_commit_latency': 0.0,
+            'total_commit_latency': 0.0,
+            'sync_fallbacks': 0,
+            'errors': 0,
+            'rows_dropped': 0,
+            'statements_dropped': 0,
+        }
+        self._thread = threading.Thread(target=self._run, name="EmotionDBWriter", daemon=True)
+        self._thread.start()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        # WAL lets the dashboards keep reading while the writer commits
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def submit(self, row):
+        """Queue one emotion_records row (tuple in INSERT_EMOTION_RECORD_SQL column order)"""
+        self._enqueue((INSERT_EMOTION_RECORD_SQL, row))
+
+    def submit_statement(self, sql, params=()):
+        """Queue another write (e.g. screen_blobs bookkeeping), committed in order with the rows"""
+        self._enqueue((sql, tuple(params)))
+
+    def _enqueue(self, item):
+        deadline = time.time() + (self.put_timeout or 0)
+        while True:
+            # Check and enqueue under the lock: close() cannot slip in between and strand the row
+            with self._submit_lock:
+                if self._closed:
+                    break
+                try:
+                    self._queue.put_nowait(item)
+                    return
+                except queue.Full:
+                    pass
+            if time.time() >= deadline:
+                print(f"⚠️ DB writer queue full ({self._queue.maxsize}), writing synchronously")
+                break
+            time.sleep(0.01)
+        # Writer stopped or saturated: never drop a record
+        with self._metrics_lock:
+            self._metrics['sync_fallbacks'] += 1
+        conn = self._connect()
+        try:
+            self._commit_batch(conn, [item])
+        finally:
+            conn.close()
+
+    def _commit_batch(self, conn, batch):
+        start = time.time()
+        with conn:
+            # Consecutive items with the same statement go through one executemany
+            for sql, items in itertools.groupby(batch, key=lambda item: item[0]):
+                conn.executemany(sql, [params for _, params in items])
+        latency = time.time() - start
+        with self._metrics_lock:
+            m = self._metrics
+            m['rows_written'] += sum(1 for sql, _ in batch if sql is INSERT_EMOTION_RECORD_SQL)
+            m['batches_committed'] += 1
+            m['last_batch_size'] = len(batch)
+            m['last_commit_latency'] = latency
+            m['max_commit_latency'] = max(m['max_commit_latency'], latency)
+            m['total_commit_latency'] += latency
+
+    def _write(self, conn, batch):
+        try:
+            self._commit_batch(conn, batch)
+        except sqlite3.Error as e:
+            print(f"❌ DB writer commit failed ({len(batch)} items): {e}, retrying...")
+            time.sleep(0.5)
+            try:
+                self._commit_batch(conn, batch)
+            except sqlite3.Error as e2:
+                with self._metrics_lock:
+                    self._metrics['errors'] += 1
+                print(f"❌ DB writer batch failed again: {e2}, committing its {len(batch)} items one by one")
+                self._write_each(conn, batch)
+        finally:
+            for _ in batch:
+                self._queue.task_done()
+
+    def _write_each(self, conn, batch):
+        # One bad bookkeeping statement must not take the emotion rows of its batch down with it
+        for item in batch:
+            try:
+                self._commit_batch(conn, [item])
+            except sqlite3.Error as e:
+                is_row = item[0] is INSERT_EMOTION_RECORD_SQL
+                with self._metrics_lock:
+                    self._metrics['rows_dropped' if is_row else 'statements_dropped'] += 1
+                print(f"❌ DB writer dropped {'row' if is_row else 'statement'} {item[1]!r}: {e}")
+
+    def _run(self):
+        conn = self._connect()
+        try:
+            while True:
+                # Poll so a stop request is noticed without needing a sentinel in the queue
+                try:
+                    first = self._queue.get(timeout=0.5)
+                except queue.Empty:
+                    if self._stop_event.is_set():
+                        break
+                    continue
+
+                batch = [first]
+                deadline = time.time() + self.flush_interval
+                while len(batch) < self.batch_size:
+                    if self._stop_event.is_set():
+                        # Shutting down: drain without waiting for the deadline
+                        try:
+                            batch.append(self._queue.get_nowait())
+                            continue
+                        except queue.Empty:
+                            break
+                    remaining = deadline - time.time()
+                    if remaining <= 0:
+                        break
+                    try:
+                        batch.append(self._queue.get(timeout=min(remaining, 0.5)))
+                    except queue.Empty:
+                        continue
+                self._write(conn, batch)
+        finally:
+            conn.close()
+
+    def flush(self, timeout=None):
+        """Block until every queued row has been committed (or timeout seconds elapsed)"""
+        if timeout is None:
+            self._queue.join()
+            return True
+        deadline = time.time() + timeout
+        while self._queue.unfinished_tasks and time.time() < deadline:
+            time.sleep(0.05)
+        return self._queue.unfinished_tasks == 0
+
+    def close(self, timeout=10.0):
+        """Commit everything still queued and stop the writer thread; safe to call more than once"""
+        with self._submit_lock:
+            if self._closed:
+                return
+            self._closed = True
+        # Rows enqueued before this point are drained by the thread; later ones are written synchronously
+        self._stop_event.set()
+        self._thread.join(timeout)
+        if self._thread.is_alive():
+            print(f"⚠️ DB writer did not finish within {timeout}s, {self._queue.qsize()} rows still queued")
+        else:
+            print(f"💾 DB writer flushed: {self._metrics['rows_written']} rows in {self._metrics['batches_committed']} commits")
+
+    def get_metrics(self):
+        """Queue depth and commit latency statistics"""
+        with self._metrics_lock:
+            m = dict(self._metrics)
+        m['queue_depth'] = self._queue.qsize()
+        m['max_queue_size'] = self._queue.maxsize
+        m['avg_commit_latency'] = m['total_commit_latency'] / m['batches_committed'] if m['batches_committed'] else 0.0
+        del m['total_commit_latency']
+        return m
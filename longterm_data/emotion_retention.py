@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Retention tiers and compaction for emotion_data.db
+
+Default tiers: raw emotion_records rows for 30 days, 10-minute rollups for a year,
+daily rollups forever. Raw rows are only deleted once their day is covered by the
+rollup tables and exported to the columnar archive (the dashboards read compacted days
+from there), deletes run in short batches so the analyzer writer is not blocked, and
+freed pages are returned to the filesystem with incremental VACUUM.
+"""
+
+import argparse
+import os
+import sqlite3
+from datetime import datetime, timedelta
+
+from emotion_archive import default_archive_dir, export_archive, load_manifest
+from emotion_data_access import get_db_path
+from emotion_rollup import ensure_rollup_schema, rebuild_rollups, rollup_tables_exist
+
+# Days to keep per tier; None keeps the tier forever
+DEFAULT_RETENTION_TIERS = {
+    'raw_days': 30,
+    'bin_days': 365,
+    'daily_days': None,
+}
+
+# Approximate on-disk size of one row (column payload, excluding page overhead)
+_RAW_ROW_BYTES_SQL = """
+    SUM(8 + length(timestamp) + length(emotion) + 8 + 1 + 8
+        + COALESCE(length(image_path), 0) + COALESCE(length(username), 0)
+        + COALESCE(length(CAST(app_name AS BLOB)), 0) + COALESCE(length(CAST(app_category AS BLOB)), 0)
+        + COALESCE(length(CAST(content_description AS BLOB)), 0) + COALESCE(length(screen_path), 0))
+"""
+_ROLLUP_ROW_BYTES_SQL = "SUM(length(day) + length(username) + length(emotion) + 8 * 4 + {extra})"
+
+
+def _cutoff_day(days, today):
+    """First day that is kept for a tier keeping `days` days, or None to keep everything"""
+    if days is None:
+        return None
+    return (today - timedelta(days=int(days))).strftime('%Y%m%d')
+
+
+def _raw_plan(conn, cutoff):
+    rows, size = conn.execute(
+        f"SELECT COUNT(*), COALESCE({_RAW_ROW_BYTES_SQL}, 0) FROM emotion_records WHERE timestamp < ?", (cutoff,)
+    ).fetchone()
+    return {'table': 'emotion_records', 'cutoff': cutoff, 'rows': rows, 'bytes': size}
+
+
+def plan_retention(conn, tiers=None, today=None):
+    """Rows and approximate bytes each tier would delete; nothing is modified"""
+    tiers = dict(DEFAULT_RETENTION_TIERS, **(tiers or {}))
+    today = today or datetime.now()
+    plan = {}
+
+    raw_cutoff = _cutoff_day(tiers['raw_days'], today)
+    if raw_cutoff:
+        plan['raw'] = _raw_plan(conn, raw_cutoff)
+
+    has_rollups = rollup_tables_exist(conn)
+    for tier, table, extra in (('bin_days', 'emotion_rollup_10min', 8), ('daily_days', 'emotion_rollup_daily', 0)):
+        cutoff = _cutoff_day(tiers[tier], today)
+        if cutoff and has_rollups:
+            rows, size = conn.execute(
+                f"SELECT COUNT(*), COALESCE({_ROLLUP_ROW_BYTES_SQL.format(extra=extra)}, 0) FROM {table} WHERE day < ?",
+                (cutoff,)
+            ).fetchone()
+            plan[tier.replace('_days', '')] = {'table': table, 'cutoff': cutoff, 'rows': rows, 'bytes': size}
+
+    page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+    freelist = conn.execute("PRAGMA freelist_count").fetchone()[0]
+    plan['free_pages_bytes'] = page_size * freelist
+    return plan
+
+
+def print_retention_report(plan, dry_run=True):
+    """Print a per-tier summary of rows and bytes reclaimed"""
+    title = "Retention dry run (nothing deleted)" if dry_run else "Retention result"
+    print(f"🧹 {title}")
+    total_rows = 0
+    total_bytes = 0
+    for tier in ('raw', 'bin', 'daily'):
+        info = plan.get(tier)
+        if info is None:
+            print(f"   {tier:<6} kept forever")
+            continue
+        total_rows += info['rows']
+        total_bytes += info['bytes']
+        print(f"   {tier:<6} {info['table']:<22} before {info['cutoff']}: {info['rows']} rows, ~{info['bytes'] / 1024 / 1024:.2f} MB")
+        if info.get('blocked_by'):
+            print(f"   {'':<6} cutoff held at {info['blocked_by']}: day not fully archived")
+    print(f"   total  {total_rows} rows, ~{total_bytes / 1024 / 1024:.2f} MB of row data "
+          f"(+{plan['free_pages_bytes'] / 1024 / 1024:.2f} MB already free in the file)")
+
+
+def _unarchived_days(conn, archive_dir, cutoff):
+    """Days before cutoff with raw rows missing from the archive (no partition, or rows added after export)"""
+    manifest = load_manifest(archive_dir)
+    rows = conn.execute(
+        "SELECT substr(timestamp, 1, 8), MAX(id) FROM emotion_records WHERE timestamp < ? GROUP BY 1 ORDER BY 1",
+        (cutoff,)
+    ).fetchall()
+    return [day for day, max_id in rows if day not in manifest or max_id > manifest[day]['max_id']]
+
+
+def _delete_raw_in_batches(conn, cutoff, batch_size):
+    deleted = 0
+    while True:
+        with conn:
+            cur = conn.execute(
+                "DELETE FROM emotion_records WHERE id IN (SELECT id FROM emotion_records WHERE timestamp < ? LIMIT ?)",
+                (cutoff, batch_size)
+            )
+        deleted += cur.rowcount
+        if cur.rowcount < batch_size:
+            return deleted
+
+
+def _delete_rollup_days(conn, table, cutoff):
+    # Rollup tables are WITHOUT ROWID and keyed by day first: delete one day per transaction
+    days = [r[0] for r in conn.execute(f"SELECT DISTINCT day FROM {table} WHERE day < ?", (cutoff,))]
+    deleted = 0
+    for day in days:
+        with conn:
+            deleted += conn.execute(f"DELETE FROM {table} WHERE day = ?", (day,)).rowcount
+    return deleted
+
+
+def incremental_vacuum(conn, full_vacuum=False):
+    """Return free pages to the filesystem; switching an old DB to incremental mode needs one full VACUUM"""
+    mode = conn.execute("PRAGMA auto_vacuum").fetchone()[0]
+    if mode != 2:
+        if not full_vacuum:
+            print("⚠️ Database is not in incremental auto_vacuum mode; rerun with --full-vacuum once to convert it")
+            return
+        print("🔄 Converting database to incremental auto_vacuum (one-time full VACUUM)...")
+        conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        conn.execute("VACUUM")
+        return
+    # A bare execute() steps the pragma once and frees a single page; executescript runs it to completion
+    freelist = conn.execute("PRAGMA freelist_count").fetchone()[0]
+    conn.executescript("PRAGMA incremental_vacuum;")
+    print(f"🗜️ Incremental vacuum released {freelist - conn.execute('PRAGMA freelist_count').fetchone()[0]} free pages")
+
+
+def run_retention(db_path, tiers=None, batch_size=5000, dry_run=False, full_vacuum=False, today=None, archive_dir=None):
+    """Apply retention tiers to db_path; returns the plan (rows/bytes per tier).
+
+    Days about to lose their raw rows are first exported to the columnar archive (archive_dir,
+    default: the one the dashboards read); days the archive does not fully cover are kept.
+    """
+    tiers = dict(DEFAULT_RETENTION_TIERS, **(tiers or {}))
+    archive_dir = archive_dir or default_archive_dir(db_path)
+    conn = sqlite3.connect(db_path, timeout=30)
+    try:
+        # Raw rows can only go once their days are in the rollups
+        if not dry_run:
+            ensure_rollup_schema(conn)
+            conn.commit()
+        plan = plan_retention(conn, tiers, today)
+        if dry_run:
+            print_retention_report(plan, dry_run=True)
+            return plan
+
+        size_before = os.path.getsize(db_path)
+        raw = plan.get('raw')
+        if raw and raw['rows']:
+            missing = [r[0] for r in conn.execute(
+                "SELECT DISTINCT substr(timestamp, 1, 8) FROM emotion_records WHERE timestamp < ? "
+                "EXCEPT SELECT day FROM emotion_rollup_daily", (raw['cutoff'],)
+            )]
+            for day in missing:
+                rebuild_rollups(conn, day, day)
+            last_day = (datetime.strptime(raw['cutoff'], '%Y%m%d') - timedelta(days=1)).strftime('%Y%m%d')
+            export_archive(db_path, archive_dir, through_day=last_day)
+            unarchived = _unarchived_days(conn, archive_dir, raw['cutoff'])
+            if unarchived:
+                print(f"⚠️ {unarchived[0]} is not fully archived ({len(unarchived)} day(s) before "
+                      f"{raw['cutoff']}): keeping raw rows from {unarchived[0]}")
+                plan['raw'] = raw = dict(_raw_plan(conn, unarchived[0]), blocked_by=unarchived[0])
+            raw['rows'] = _delete_raw_in_batches(conn, raw['cutoff'], batch_size)
+        for tier in ('bin', 'daily'):
+            info = plan.get(tier)
+            if info and info['rows']:
+                info['rows'] = _delete_rollup_days(conn, info['table'], info['cutoff'])
+
+        incremental_vacuum(conn, full_vacuum)
+        print_retention_report(plan, dry_run=False)
+        print(f"   file size {size_before / 1024 / 1024:.2f} MB -> {os.path.getsize(db_path) / 1024 / 1024:.2f} MB")
+        return plan
+    finally:
+        conn.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Apply retention tiers to the emotion database")
+    parser.add_argument('--db', default=get_db_path(), help='SQLite database path')
+    parser.add_argument('--raw-days', type=int, default=DEFAULT_RETENTION_TIERS['raw_days'], help='Days of raw rows to keep')
+    parser.add_argument('--bin-days', type=int, default=DEFAULT_RETENTION_TIERS['bin_days'], help='Days of 10-minute rollups to keep')
+    parser.add_argument('--daily-days', type=int, default=DEFAULT_RETENTION_TIERS['daily_days'], help='Days of daily rollups to keep (default: forever)')
+    parser.add_argument('--batch-size', type=int, default=5000, help='Raw rows deleted per transaction')
+    parser.add_argument('--dry-run', action='store_true', help='Only report rows and bytes that would be reclaimed')
+    parser.add_argument('--full-vacuum', action='store_true', help='Convert an existing DB to incremental auto_vacuum')
+    parser.add_argument('--archive-dir', help='Columnar archive raw rows are exported to before deletion (default: emotion_archive/ next to the DB)')
+    args = parser.parse_args()
+
+    run_retention(
+        args.db,
+        tiers={'raw_days': args.raw_days, 'bin_days': args.bin_days, 'daily_days': args.daily_days},
+        batch_size=args.batch_size,
+        dry_run=args.dry_run,
+        full_vacuum=args.full_vacuum,
+        archive_dir=args.archive_dir,
+    )
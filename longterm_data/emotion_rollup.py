@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Rollup tables for emotion_records
+
+emotion_rollup_10min and emotion_rollup_daily hold per (day, username, [10-minute bin,] canonical emotion)
+counts and confidence/emotion_level sums. They are maintained by an AFTER INSERT trigger, so every insert
+path (analyzer writer, imports, generators) keeps them current, and can be rebuilt from raw rows.
+emotion_users lists every username seen, kept by its own insert trigger, so user pickers don't scan
+the raw table.
+"""
+
+import argparse
+import sqlite3
+from datetime import datetime, timedelta
+
+ROLLUP_BIN_MINUTES = 10
+
+# Raw DB labels (model output is Chinese, older rows may be English) -> canonical English emotion
+EMOTION_LABEL_MAP = {
+    "中立": "Neutral",
+    "中性": "Neutral",
+    "快乐": "Happy",
+    "开心": "Happy",
+    "高兴": "Happy",
+    "愤怒": "Angry",
+    "生气": "Angry",
+    "悲伤": "Sad",
+    "伤心": "Sad",
+    "惊讶": "Surprised",
+    "担忧": "Worried",
+    "忧虑": "Worried",
+    "无": "None",
+    "Neutral": "Neutral",
+    "Happy": "Happy",
+    "Angry": "Angry",
+    "Sad": "Sad",
+    "Surprised": "Surprised",
+    "Worried": "Worried",
+    "None": "None",
+}
+
+# SQL expressions over an emotion_records row (prefix is NEW. inside the trigger)
+_DAY_SQL = "substr({p}timestamp, 1, 8)"
+_BIN_SQL = ("(CAST(substr({p}timestamp, 10, 2) AS INTEGER) * 60 + CAST(substr({p}timestamp, 12, 2) AS INTEGER)) / "
+            + str(ROLLUP_BIN_MINUTES))
+_USER_SQL = "COALESCE({p}username, '')"
+_FACE_SQL = "CASE WHEN {p}has_face = 1 THEN 1 ELSE 0 END"
+
+
+def _upsert_sql(table, with_bin):
+    key_cols = "day, username, bin, emotion" if with_bin else "day, username, emotion"
+    bin_val = (_BIN_SQL.format(p="NEW.") + ", ") if with_bin else ""
+    return f"""
+        INSERT INTO {table} ({key_cols}, count, face_count, sum_confidence, sum_emotion_level)
+        VALUES ({_DAY_SQL.format(p="NEW.")}, {_USER_SQL.format(p="NEW.")}, {bin_val}
+                COALESCE((SELECT canonical FROM emotion_label_map WHERE label = NEW.emotion), NEW.emotion),
+                1, {_FACE_SQL.format(p="NEW.")}, COALESCE(NEW.confidence, 0), COALESCE(NEW.emotion_level, 0))
+        ON CONFLICT({key_cols}) DO UPDATE SET
+            count = count + 1,
+            face_count = face_count + excluded.face_count,
+            sum_confidence = sum_confidence + excluded.sum_confidence,
+            sum_emotion_level = sum_emotion_level + excluded.sum_emotion_level;
+    """
+
+
+def rollup_tables_exist(conn):
+    """True if the rollup tables (and their trigger) are present in this database"""
+    cur = conn.execute(
+        "SELECT COUNT(*) FROM sqlite_master WHERE (type='table' AND name IN ('emotion_rollup_10min', 'emotion_rollup_daily')) "
+        "OR (type='trigger' AND name='trg_emotion_records_rollup')"
+    )
+    return cur.fetchone()[0] == 3
+
+
+def ensure_rollup_schema(conn):
+    """Create label map, rollup tables and insert trigger; backfill from raw rows on first creation"""
+    existed = rollup_tables_exist(conn)
+    cur = conn.cursor()
+    cur.execute('''
+        CREATE TABLE IF NOT EXISTS emotion_label_map (
+            label TEXT PRIMARY KEY,
+            canonical TEXT NOT NULL
+        )
+    ''')
+    cur.executemany("INSERT OR REPLACE INTO emotion_label_map (label, canonical) VALUES (?, ?)",
+                    list(EMOTION_LABEL_MAP.items()))
+    cur.execute('''
+        CREATE TABLE IF NOT EXISTS emotion_rollup_10min (
+            day TEXT NOT NULL,                 -- YYYYMMDD
+            username TEXT NOT NULL,            -- '' when unknown
+            bin INTEGER NOT NULL,              -- minute_of_day / 10
+            emotion TEXT NOT NULL,             -- canonical English label
+            count INTEGER NOT NULL DEFAULT 0,
+            face_count INTEGER NOT NULL DEFAULT 0,
+            sum_confidence REAL NOT NULL DEFAULT 0,
+            sum_emotion_level REAL NOT NULL DEFAULT 0,
+            PRIMARY KEY (day, username, bin, emotion)
+        ) WITHOUT ROWID
+    ''')
+    cur.execute('''
+        CREATE TABLE IF NOT EXISTS emotion_rollup_daily (
+            day TEXT NOT NULL,
+            username TEXT NOT NULL,
+            emotion TEXT NOT NULL,
+            count INTEGER NOT NULL DEFAULT 0,
+            face_count INTEGER NOT NULL DEFAULT 0,
+            sum_confidence REAL NOT NULL DEFAULT 0,
+            sum_emotion_level REAL NOT NULL DEFAULT 0,
+            PRIMARY KEY (day, username, emotion)
+        ) WITHOUT ROWID
+    ''')
+    cur.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_emotion_records_rollup AFTER INSERT ON emotion_records
+        BEGIN
+            {_upsert_sql("emotion_rollup_10min", True)}
+            {_upsert_sql("emotion_rollup_daily", False)}
+        END
+    ''')
+    if not existed:
+        has_rows = cur.execute("SELECT 1 FROM emotion_records LIMIT 1").fetchone() is not None
+        if has_rows:
+            print("🔄 Building emotion rollup tables from existing records...")
+            rebuild_rollups(conn, commit=False)
+            print("✅ Emotion rollup tables built")
+
+
+def users_table_exists(conn):
+    """True if emotion_users and its insert trigger are present in this database"""
+    cur = conn.execute(
+        "SELECT COUNT(*) FROM sqlite_master WHERE (type='table' AND name='emotion_users') "
+        "OR (type='trigger' AND name='trg_emotion_records_users')"
+    )
+    return cur.fetchone()[0] == 2
+
+
+def ensure_users_schema(conn):
+    """Create emotion_users and its insert trigger; backfill from raw rows when the trigger was missing"""
+    existed = users_table_exists(conn)
+    cur = conn.cursor()
+    cur.execute('''
+        CREATE TABLE IF NOT EXISTS emotion_users (
+            username TEXT PRIMARY KEY
+        ) WITHOUT ROWID
+    ''')
+    cur.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_emotion_records_users AFTER INSERT ON emotion_records
+        WHEN NEW.username IS NOT NULL AND NEW.username != ''
+        BEGIN
+            INSERT OR IGNORE INTO emotion_users (username) VALUES (NEW.username);
+        END
+    ''')
+    if not existed:
+        cur.execute(
+            "INSERT OR IGNORE INTO emotion_users (username) "
+            "SELECT DISTINCT username FROM emotion_records WHERE username IS NOT NULL AND username != ''"
+        )
+
+
+def _next_day(day):
+    return (datetime.strptime(day, '%Y%m%d') + timedelta(days=1)).strftime('%Y%m%d')
+
+
+def rebuild_rollups(conn, start_day=None, end_day=None, commit=True):
+    """Recompute rollups from raw rows for days in [start_day, end_day] (YYYYMMDD, inclusive).
+
+    Only days that still have raw rows are replaced, so aggregates kept after raw rows were
+    compacted away are preserved.
+    """
+    where = "WHERE 1=1"
+    params = []
+    if start_day:
+        where += " AND timestamp >= ?"
+        params.append(start_day)
+    if end_day:
+        where += " AND timestamp < ?"
+        params.append(_next_day(end_day))
+
+    cur = conn.cursor()
+    days_subquery = f"SELECT DISTINCT substr(timestamp, 1, 8) FROM emotion_records {where}"
+    for table in ("emotion_rollup_10min", "emotion_rollup_daily"):
+        cur.execute(f"DELETE FROM {table} WHERE day IN ({days_subquery})", params)
+
+    select_cols = f"""
+        {_DAY_SQL.format(p="r.")}, {_USER_SQL.format(p="r.")}, {{bin}}COALESCE(m.canonical, r.emotion),
+        COUNT(*), SUM({_FACE_SQL.format(p="r.")}), SUM(COALESCE(r.confidence, 0)), SUM(COALESCE(r.emotion_level, 0))
+        FROM emotion_records r LEFT JOIN emotion_label_map m ON m.label = r.emotion
+        {where.replace("timestamp", "r.timestamp")}
+    """
+    cur.execute(f"""
+        INSERT INTO emotion_rollup_10min (day, username, bin, emotion, count, face_count, sum_confidence, sum_emotion_level)
+        SELECT {select_cols.format(bin=_BIN_SQL.format(p="r.") + ", ")} GROUP BY 1, 2, 3, 4
+    """, params)
+    cur.execute(f"""
+        INSERT INTO emotion_rollup_daily (day, username, emotion, count, face_count, sum_confidence, sum_emotion_level)
+        SELECT {select_cols.format(bin="")} GROUP BY 1, 2, 3
+    """, params)
+    if commit:
+        conn.commit()
+
+
+if __name__ == '__main__':
+    from emotion_data_access import get_db_path
+
+    parser = argparse.ArgumentParser(description="Rebuild emotion rollup tables from raw emotion_records")
+    parser.add_argument('--db', default=get_db_path(), help='SQLite database path')
+    parser.add_argument('--start', help='First day to rebuild (YYYYMMDD), default: all')
+    parser.add_argument('--end', help='Last day to rebuild (YYYYMMDD), default: all')
+    args = parser.parse_args()
+
+    conn = sqlite3.connect(args.db)
+    ensure_rollup_schema(conn)
+    ensure_users_schema(conn)
+    rebuild_rollups(conn, args.start, args.end)
+    conn.close()
+    print(f"✅ Rollups rebuilt for {args.db}")
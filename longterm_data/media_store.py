@@ -0,0 +1,380 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Disk-quota-aware store for captured media (testimages/, testvideos/)
+
+Every saved video, keyframe and screenshot is registered in the media_files table with its size,
+so the space in use is a running total rather than a directory walk. When the total exceeds the
+quota (opt-in via EMOTION_MEDIA_QUOTA_MB; unlimited by default), a background thread deletes the
+oldest / least recently used / least referenced files first, sets the emotion_records
+image_path/screen_path pointing at them to NULL and removes their thumbnails, so the database never
+refers to a file that is gone.
+"""
+
+import argparse
+import os
+import queue
+import sqlite3
+import threading
+import time
+
+from emotion_data_access import get_db_path
+
+MEDIA_DIRS = ('testimages', 'testvideos')
+
+# emotion_records column that refers to each kind of media
+MEDIA_PATH_COLUMNS = {
+    'video': 'image_path',
+    'image': 'image_path',
+    'screen': 'screen_path',
+}
+
+# Pruning order per policy (first rows go first)
+PRUNE_POLICIES = {
+    'oldest': 'created_at, path',
+    'lru': 'last_access, created_at, path',
+    'least_referenced': 'ref_count, last_access, path',
+}
+
+# No quota unless configured: pruning deletes user media, so it is opt-in
+DEFAULT_QUOTA_MB = 0
+
+
+def default_media_root():
+    """Directory holding testimages/ and testvideos/: the parent of the analyzer's working directory"""
+    return os.path.dirname(os.path.abspath('.'))
+
+
+def get_media_quota_bytes():
+    """Configured quota (EMOTION_MEDIA_QUOTA_MB); None when unset or 0 (unlimited)"""
+    quota_mb = float(os.environ.get('EMOTION_MEDIA_QUOTA_MB') or DEFAULT_QUOTA_MB)
+    return int(quota_mb * 1024 * 1024) if quota_mb > 0 else None
+
+
+def media_kind(path):
+    """'video' / 'screen' / 'image' from the analyzer's file naming, None for anything else"""
+    name = os.path.basename(path)
+    if name.startswith('.'):
+        return None  # staging files
+    if name.endswith('_video.mp4'):
+        return 'video'
+    if name.endswith('_screen.png'):
+        return 'screen'
+    if name.endswith('.jpg'):
+        return 'image'
+    return None
+
+
+def ensure_media_schema(conn):
+    """Create the media_files index table; returns True if it was just created"""
+    existed = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type='table' AND name='media_files'"
+    ).fetchone() is not None
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS media_files (
+            path TEXT PRIMARY KEY,
+            kind TEXT NOT NULL,                -- video | image | screen
+            capture_ts TEXT NOT NULL,          -- YYYYMMDD-HHMMSS, prefix of the emotion_records timestamps
+            last_capture_ts TEXT,              -- last capture referencing a shared file (deduplicated screens)
+            bytes INTEGER NOT NULL,
+            ref_count INTEGER NOT NULL DEFAULT 1,
+            created_at REAL NOT NULL,
+            last_access REAL NOT NULL
+        )
+    ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_media_files_last_access ON media_files(last_access)')
+    return not existed
+
+
+def _clear_references(conn, kind, capture_ts, last_capture_ts, path):
+    # Records referencing a file lie between its first and last capture timestamps,
+    # so the timestamp index narrows the update
+    column = MEDIA_PATH_COLUMNS[kind]
+    return conn.execute(
+        f"UPDATE emotion_records SET {column} = NULL WHERE timestamp >= ? AND timestamp < ? AND {column} = ?",
+        (capture_ts, (last_capture_ts or capture_ts) + '~', path)
+    ).rowcount
+
+
+def prune_media(conn, target_bytes, policy='lru', min_age=600.0, batch_size=200):
+    """Delete media (and their thumbnails) until the indexed total is <= target_bytes; returns (files, bytes) removed.
+
+    Files referenced within the last min_age seconds are kept: rows pointing at them may still be
+    queued. A shared (deduplicated) screen's age is that of its last reference, not of the file.
+    """
+    order = PRUNE_POLICIES[policy]
+    tables = {name for (name,) in conn.execute(
+        "SELECT name FROM sqlite_master WHERE type='table' AND name IN ('screen_blobs', 'media_thumbnails')")}
+    total = conn.execute("SELECT COALESCE(SUM(bytes), 0) FROM media_files").fetchone()[0]
+    cutoff = time.time() - min_age
+    cutoff_ts = time.strftime('%Y%m%d-%H%M%S', time.localtime(cutoff))
+    query = ("SELECT path, kind, capture_ts, last_capture_ts, bytes FROM media_files "
+             "WHERE created_at < ? AND COALESCE(last_capture_ts, capture_ts) < ?")
+    params = [cutoff, cutoff_ts]
+    if 'screen_blobs' in tables:
+        # A reuse can reach screen_blobs (DB writer queue) before media_files (this store's queue)
+        query += " AND NOT EXISTS (SELECT 1 FROM screen_blobs b WHERE b.path = media_files.path AND b.last_ts >= ?)"
+        params.append(cutoff_ts)
+    query += f" ORDER BY {order} LIMIT ?"
+    removed_files = removed_bytes = 0
+    while total > target_bytes:
+        rows = conn.execute(query, params + [batch_size]).fetchall()
+        if not rows:
+            break
+        victims = []
+        for row in rows:
+            if total <= target_bytes:
+                break
+            victims.append(row)
+            total -= row[4]
+        # DB first: a crash afterwards leaves an orphan file (picked up by reindex), never a dangling path
+        thumbs = []
+        with conn:
+            for path, kind, capture_ts, last_capture_ts, size in victims:
+                _clear_references(conn, kind, capture_ts, last_capture_ts, path)
+                conn.execute("DELETE FROM media_files WHERE path = ?", (path,))
+                if 'screen_blobs' in tables and kind == 'screen':
+                    conn.execute("DELETE FROM screen_blobs WHERE path = ?", (path,))
+                if 'media_thumbnails' in tables:
+                    thumbs += [p for (p,) in conn.execute(
+                        "SELECT thumb_path FROM media_thumbnails WHERE source_path = ?", (path,))]
+                    conn.execute("DELETE FROM media_thumbnails WHERE source_path = ?", (path,))
+        for path in [v[0] for v in victims] + thumbs:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                print(f"⚠️ Failed to delete {path}: {e}")
+        removed_files += len(victims)
+        removed_bytes += sum(v[4] for v in victims)
+    return removed_files, removed_bytes
+
+
+def reindex_media(conn, media_root=None):
+    """Bootstrap/repair the index from disk: register unindexed files, drop rows for missing ones"""
+    media_root = media_root or default_media_root()
+    start = time.time()
+    refs = {}
+    for column in ('image_path', 'screen_path'):
+        for path, count, last_ts in conn.execute(
+                f"SELECT {column}, COUNT(*), MAX(substr(timestamp, 1, 15)) FROM emotion_records "
+                f"WHERE {column} IS NOT NULL GROUP BY {column}"):
+            refs[path] = (refs.get(path, (0, None))[0] + count, last_ts)
+
+    indexed = {path for (path,) in conn.execute("SELECT path FROM media_files")}
+    seen = set()
+    added = []
+    for media_dir in MEDIA_DIRS:
+        for dirpath, _, filenames in os.walk(os.path.join(media_root, media_dir)):
+            for filename in filenames:
+                path = os.path.join(dirpath, filename)
+                kind = media_kind(path)
+                if kind is None:
+                    continue
+                seen.add(path)
+                if path in indexed:
+                    continue
+                st = os.stat(path)
+                ref_count, last_ts = refs.get(path, (0, None))
+                added.append((path, kind, filename[:15], last_ts, st.st_size, ref_count, st.st_mtime, st.st_mtime))
+    missing = [(path,) for path in indexed - seen]
+    with conn:
+        conn.executemany(
+            "INSERT OR REPLACE INTO media_files (path, kind, capture_ts, last_capture_ts, bytes, ref_count, created_at, last_access) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)", added
+        )
+        conn.executemany("DELETE FROM media_files WHERE path = ?", missing)
+    print(f"🗂️ Media index: +{len(added)} files, -{len(missing)} missing ({time.time() - start:.1f}s)")
+    return len(added), len(missing)
+
+
+def media_usage(conn):
+    """{kind: (files, bytes)} plus 'total'"""
+    usage = {kind: (files, size) for kind, files, size in conn.execute(
+        "SELECT kind, COUNT(*), SUM(bytes) FROM media_files GROUP BY kind")}
+    usage['total'] = (sum(v[0] for v in usage.values()), sum(v[1] for v in usage.values()))
+    return usage
+
+
+class MediaStore:
+    """Media index plus a background thread that registers new files and prunes over quota"""
+
+    def __init__(self, db_path, media_root=None, quota_bytes=None, policy='lru', low_water=0.9,
+                 min_age=600.0, check_interval=60.0):
+        """
+        :param db_path: SQLite database path (media_files lives next to emotion_records)
+        :param media_root: directory holding testimages/ and testvideos/
+        :param quota_bytes: byte quota for indexed media, None for no limit (sizes are still tracked)
+        :param policy: pruning order, one of PRUNE_POLICIES
+        :param low_water: prune down to this fraction of the quota so every capture doesn't trigger a prune
+        :param min_age: never prune files referenced within this many seconds
+        :param check_interval: seconds between quota checks when nothing new is registered
+        """
+        if policy not in PRUNE_POLICIES:
+            raise ValueError(f"Unknown prune policy: {policy} (expected one of {tuple(PRUNE_POLICIES)})")
+        self.db_path = db_path
+        self.media_root = media_root or default_media_root()
+        self.quota_bytes = quota_bytes
+        self.policy = policy
+        self.low_water = float(low_water)
+        self.min_age = float(min_age)
+        self.check_interval = float(check_interval)
+        self._queue = queue.Queue()
+        self._stop_event = threading.Event()
+        self._closed = False
+        self._metrics_lock = threading.Lock()
+        self._metrics = {
+            'files': 0,
+            'bytes': 0,
+            'pruned_files': 0,
+            'pruned_bytes': 0,
+            'errors': 0,
+        }
+        self._thread = threading.Thread(target=self._run, name="MediaStore", daemon=True)
+        self._thread.start()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def register(self, path, kind, capture_ts, ref_count=1):
+        """Queue a saved media file for indexing (size is read in the background thread).
+        Registering a path that is already indexed (a deduplicated screen) adds a reference to it.
+        """
+        if path is None:
+            return
+        if kind not in MEDIA_PATH_COLUMNS:
+            raise ValueError(f"Unknown media kind: {kind}")
+        self._queue.put(('register', (path, kind, capture_ts, int(ref_count))))
+
+    def touch(self, path):
+        """Mark a file as used (e.g. shown in a UI) so LRU pruning keeps it longer"""
+        self._queue.put(('touch', path))
+
+    def _apply(self, conn, items):
+        now = time.time()
+        added = 0
+        with conn:
+            for op, arg in items:
+                if op == 'register':
+                    path, kind, capture_ts, ref_count = arg
+                    try:
+                        size = os.path.getsize(path)
+                    except OSError:
+                        continue
+                    conn.execute(
+                        "INSERT INTO media_files (path, kind, capture_ts, last_capture_ts, bytes, ref_count, created_at, last_access) "
+                        "VALUES (?, ?, ?, ?, ?, ?, ?, ?) "
+                        "ON CONFLICT(path) DO UPDATE SET ref_count = ref_count + excluded.ref_count, "
+                        "last_capture_ts = excluded.last_capture_ts, last_access = excluded.last_access",
+                        (path, kind, capture_ts, capture_ts, size, ref_count, now, now)
+                    )
+                    added += 1
+                else:
+                    conn.execute("UPDATE media_files SET last_access = ? WHERE path = ?", (now, arg))
+        return added
+
+    def _refresh_totals(self, conn):
+        files, size = conn.execute("SELECT COUNT(*), COALESCE(SUM(bytes), 0) FROM media_files").fetchone()
+        with self._metrics_lock:
+            self._metrics['files'] = files
+            self._metrics['bytes'] = size
+
+    def _prune_if_needed(self, conn):
+        if self.quota_bytes is None or self._metrics['bytes'] <= self.quota_bytes:
+            return
+        files, size = prune_media(conn, int(self.quota_bytes * self.low_water), self.policy, self.min_age)
+        if files:
+            print(f"🧹 Media store pruned {files} files ({size / 1024 / 1024:.1f} MB, policy={self.policy})")
+        with self._metrics_lock:
+            self._metrics['pruned_files'] += files
+            self._metrics['pruned_bytes'] += size
+        self._refresh_totals(conn)
+
+    def _run(self):
+        conn = self._connect()
+        try:
+            if ensure_media_schema(conn):
+                # First run on this DB: index what is already on disk
+                reindex_media(conn, self.media_root)
+            conn.commit()
+            self._refresh_totals(conn)
+            while True:
+                try:
+                    items = [self._queue.get(timeout=self.check_interval if not self._stop_event.is_set() else 0.1)]
+                except queue.Empty:
+                    items = []
+                    if self._stop_event.is_set():
+                        break
+                while True:
+                    try:
+                        items.append(self._queue.get_nowait())
+                    except queue.Empty:
+                        break
+                try:
+                    if items:
+                        self._apply(conn, items)
+                        self._refresh_totals(conn)
+                    self._prune_if_needed(conn)
+                except (sqlite3.Error, OSError) as e:
+                    with self._metrics_lock:
+                        self._metrics['errors'] += 1
+                    print(f"❌ Media store error: {e}")
+                finally:
+                    for _ in items:
+                        self._queue.task_done()
+        finally:
+            conn.close()
+
+    def flush(self, timeout=None):
+        """Block until every queued registration has been indexed (or timeout seconds elapsed)"""
+        deadline = None if timeout is None else time.time() + timeout
+        while self._queue.unfinished_tasks and (deadline is None or time.time() < deadline):
+            time.sleep(0.05)
+        return self._queue.unfinished_tasks == 0
+
+    def close(self, timeout=10.0):
+        """Index everything still queued and stop the background thread; safe to call more than once"""
+        if self._closed:
+            return
+        self._closed = True
+        self._stop_event.set()
+        self._queue.put(('touch', None))  # wake the thread now instead of after check_interval
+        self._thread.join(timeout)
+
+    def get_metrics(self):
+        """Indexed files/bytes, quota and pruning statistics"""
+        with self._metrics_lock:
+            m = dict(self._metrics)
+        m['quota_bytes'] = self.quota_bytes
+        m['pending'] = self._queue.qsize()
+        return m
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Media index, usage report and quota pruning for testimages/ and testvideos/")
+    parser.add_argument('--db', default=get_db_path(), help='SQLite database path')
+    parser.add_argument('--media-root', default=default_media_root(), help='Directory holding testimages/ and testvideos/')
+    parser.add_argument('--reindex', action='store_true', help='Rescan the media directories and repair the index')
+    parser.add_argument('--quota-mb', type=float, help='Prune media down to this many MB')
+    parser.add_argument('--policy', choices=list(PRUNE_POLICIES), default='lru', help='Pruning order')
+    parser.add_argument('--min-age', type=float, default=600.0, help='Never prune files referenced within this many seconds')
+    args = parser.parse_args()
+
+    conn = sqlite3.connect(args.db, timeout=30)
+    try:
+        if ensure_media_schema(conn) or args.reindex:
+            reindex_media(conn, args.media_root)
+        conn.commit()
+        if args.quota_mb is not None:
+            files, size = prune_media(conn, int(args.quota_mb * 1024 * 1024), args.policy, args.min_age)
+            print(f"🧹 Pruned {files} files ({size / 1024 / 1024:.1f} MB)")
+        usage = media_usage(conn)
+        for kind in sorted(k for k in usage if k != 'total') + ['total']:
+            files, size = usage[kind]
+            print(f"   {kind:<7} {files:>7} files  {(size or 0) / 1024 / 1024:10.1f} MB")
+    finally:
+        conn.close()
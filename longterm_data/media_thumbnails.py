@@ -0,0 +1,247 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Thumbnail / preview cache for archived media
+
+Small JPEG previews of each capture (first and middle video frame, downscaled screenshot) are
+written once to <media_root>/thumbnails/ and indexed in the media_thumbnails table. The analyzer
+creates them at save time from the frames it already has in memory; anything missing is generated
+lazily on first request. Recently served previews are kept in a byte-bounded in-memory LRU, so a
+review UI can list hundreds of captures without decoding full MP4s or full-size PNGs.
+"""
+
+import argparse
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+import cv2
+
+from emotion_data_access import get_db_path, next_day, read_connection
+from media_store import default_media_root, media_kind
+
+THUMBNAIL_VARIANTS = ('first', 'middle', 'screen')
+DEFAULT_THUMBNAIL_SIZE = (320, 180)     # max (width, height), aspect ratio kept
+THUMBNAIL_JPEG_QUALITY = 80
+
+
+def default_thumbnail_dir(media_root=None):
+    """thumbnails/ next to testimages/ and testvideos/ (outside the quota-managed media dirs)"""
+    return os.path.join(media_root or default_media_root(), 'thumbnails')
+
+
+def ensure_thumbnail_schema(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS media_thumbnails (
+            source_path TEXT NOT NULL,
+            variant TEXT NOT NULL,             -- first | middle | screen
+            thumb_path TEXT NOT NULL,
+            width INTEGER NOT NULL,
+            height INTEGER NOT NULL,
+            bytes INTEGER NOT NULL,
+            created_at REAL NOT NULL,
+            PRIMARY KEY (source_path, variant)
+        ) WITHOUT ROWID
+    ''')
+
+
+def _downscale(image, max_size):
+    h, w = image.shape[:2]
+    scale = min(max_size[0] / w, max_size[1] / h, 1.0)
+    if scale < 1.0:
+        image = cv2.resize(image, (max(1, int(w * scale)), max(1, int(h * scale))), interpolation=cv2.INTER_AREA)
+    return image
+
+
+def read_source_frame(source_path, variant):
+    """Decode the one frame a variant needs: first/middle video frame, or the image itself"""
+    if media_kind(source_path) == 'video':
+        cap = cv2.VideoCapture(source_path)
+        try:
+            if variant == 'middle':
+                count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+                cap.set(cv2.CAP_PROP_POS_FRAMES, max(0, count // 2))
+            ret, frame = cap.read()
+            return frame if ret else None
+        finally:
+            cap.release()
+    return cv2.imread(source_path)
+
+
+class ThumbnailService:
+    """Lazily generated, disk-cached thumbnails with a bounded in-memory LRU"""
+
+    def __init__(self, db_path, thumb_dir=None, max_size=DEFAULT_THUMBNAIL_SIZE, memory_bytes=16 * 1024 * 1024,
+                 writer=None):
+        """
+        :param db_path: SQLite database path (media_thumbnails index)
+        :param thumb_dir: on-disk cache directory
+        :param max_size: (width, height) bounding box of a thumbnail
+        :param memory_bytes: budget for JPEG bytes kept in memory
+        :param writer: EmotionDBWriter that commits index rows off the caller's thread (None: commit directly)
+        """
+        self.db_path = db_path
+        self.writer = writer
+        self.thumb_dir = thumb_dir or default_thumbnail_dir()
+        self.max_size = tuple(max_size)
+        self.memory_bytes = int(memory_bytes)
+        self._lock = threading.Lock()
+        self._memory = OrderedDict()   # (source_path, variant) -> JPEG bytes
+        self._memory_used = 0
+        self._conn = sqlite3.connect(db_path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        with self._conn:
+            ensure_thumbnail_schema(self._conn)
+        self.stats = {'memory_hits': 0, 'disk_hits': 0, 'generated': 0, 'missing': 0}
+
+    def _thumb_path(self, source_path, variant):
+        key = hashlib.sha1(source_path.encode('utf-8')).hexdigest()
+        return os.path.join(self.thumb_dir, key[:2], f'{key}_{variant}.jpg')
+
+    def _write(self, sql, params):
+        if self.writer is not None:
+            self.writer.submit_statement(sql, params)
+            return
+        with self._lock, self._conn:
+            self._conn.execute(sql, params)
+
+    def _remember(self, key, data):
+        with self._lock:
+            old = self._memory.pop(key, None)
+            if old is not None:
+                self._memory_used -= len(old)
+            self._memory[key] = data
+            self._memory_used += len(data)
+            while self._memory_used > self.memory_bytes and len(self._memory) > 1:
+                _, evicted = self._memory.popitem(last=False)
+                self._memory_used -= len(evicted)
+
+    def put_image(self, source_path, variant, image):
+        """Store a thumbnail from an image already in memory (used at save time); returns its path"""
+        if source_path is None or image is None:
+            return None
+        thumb = _downscale(image, self.max_size)
+        ok, buf = cv2.imencode('.jpg', thumb, [cv2.IMWRITE_JPEG_QUALITY, THUMBNAIL_JPEG_QUALITY])
+        if not ok:
+            return None
+        data = buf.tobytes()
+        thumb_path = self._thumb_path(source_path, variant)
+        os.makedirs(os.path.dirname(thumb_path), exist_ok=True)
+        tmp_path = thumb_path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, thumb_path)
+        self._write(
+            "INSERT OR REPLACE INTO media_thumbnails (source_path, variant, thumb_path, width, height, bytes, created_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (source_path, variant, thumb_path, thumb.shape[1], thumb.shape[0], len(data), time.time())
+        )
+        self._remember((source_path, variant), data)
+        return thumb_path
+
+    def get_path(self, source_path, variant='first'):
+        """Path of the thumbnail file, generating it if needed; None if the source is gone"""
+        if variant not in THUMBNAIL_VARIANTS:
+            raise ValueError(f"Unknown thumbnail variant: {variant} (expected one of {THUMBNAIL_VARIANTS})")
+        if not source_path:
+            return None
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT thumb_path FROM media_thumbnails WHERE source_path = ? AND variant = ?", (source_path, variant)
+            ).fetchone()
+        if row and os.path.exists(row[0]):
+            with self._lock:
+                self.stats['disk_hits'] += 1
+            return row[0]
+        # Keyframe/screen sources are single images: every variant is the image itself
+        frame = read_source_frame(source_path, variant) if os.path.exists(source_path) else None
+        with self._lock:
+            self.stats['missing' if frame is None else 'generated'] += 1
+        if frame is None:
+            return None
+        return self.put_image(source_path, variant, frame)
+
+    def get_bytes(self, source_path, variant='first'):
+        """JPEG bytes of the thumbnail (served from memory when recently used)"""
+        key = (source_path, variant)
+        with self._lock:
+            data = self._memory.get(key)
+            if data is not None:
+                self._memory.move_to_end(key)
+                self.stats['memory_hits'] += 1
+                return data
+        thumb_path = self.get_path(source_path, variant)
+        if thumb_path is None:
+            return None
+        with open(thumb_path, 'rb') as f:
+            data = f.read()
+        self._remember(key, data)
+        return data
+
+    def capture_previews(self, start_day, end_day, username=None, limit=500):
+        """Newest-first list of {'timestamp', 'first', 'middle', 'screen'} thumbnail paths per capture"""
+        query = ("SELECT substr(timestamp, 1, 15) AS ts, MIN(image_path), MIN(screen_path) FROM emotion_records "
+                 "WHERE timestamp >= ? AND timestamp < ?")
+        params = [start_day, next_day(end_day)]
+        if username and username != 'All':
+            query += " AND username = ?"
+            params.append(username)
+        query += " GROUP BY ts ORDER BY ts DESC LIMIT ?"
+        params.append(int(limit))
+        with read_connection(self.db_path) as conn:
+            rows = conn.execute(query, params).fetchall()
+        previews = []
+        for ts, image_path, screen_path in rows:
+            previews.append({
+                'timestamp': ts,
+                'first': self.get_path(image_path, 'first'),
+                'middle': self.get_path(image_path, 'middle') if media_kind(image_path or '') == 'video' else None,
+                'screen': self.get_path(screen_path, 'screen'),
+            })
+        return previews
+
+    def get_metrics(self):
+        with self._lock:
+            return dict(self.stats, memory_items=len(self._memory), memory_bytes=self._memory_used)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def prune_orphan_thumbnails(conn):
+    """Delete thumbnails whose source media no longer exists; returns the number removed"""
+    orphans = [(src, variant, path) for src, variant, path in conn.execute(
+        "SELECT source_path, variant, thumb_path FROM media_thumbnails") if not os.path.exists(src)]
+    with conn:
+        for src, variant, path in orphans:
+            conn.execute("DELETE FROM media_thumbnails WHERE source_path = ? AND variant = ?", (src, variant))
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+    return len(orphans)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Generate / clean the media thumbnail cache")
+    parser.add_argument('--db', default=get_db_path(), help='SQLite database path')
+    parser.add_argument('--thumb-dir', default=default_thumbnail_dir(), help='Thumbnail cache directory')
+    parser.add_argument('--start', help='First day to pre-generate (YYYYMMDD)')
+    parser.add_argument('--end', help='Last day to pre-generate (YYYYMMDD), default: --start')
+    parser.add_argument('--prune-orphans', action='store_true', help='Remove thumbnails of media that no longer exists')
+    args = parser.parse_args()
+
+    service = ThumbnailService(args.db, args.thumb_dir)
+    if args.start:
+        start = time.time()
+        previews = service.capture_previews(args.start, args.end or args.start, limit=1_000_000)
+        print(f"🖼️ {len(previews)} captures previewed in {time.time() - start:.1f}s: {service.get_metrics()}")
+    if args.prune_orphans:
+        conn = sqlite3.connect(args.db, timeout=30)
+        print(f"🧹 Removed {prune_orphan_thumbnails(conn)} orphan thumbnails")
+        conn.close()
+    service.close()
@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Content-addressed screenshot storage
+
+Each stored screenshot is indexed in screen_blobs by a hash of its pixels and a 256-bit
+difference hash (dHash). A new capture with the same pixels as a stored one reuses that
+file: emotion_records.screen_path points at the existing PNG and only its reference count
+grows. Near-duplicate matching (within `tolerance` dHash bits of a recent screen) is opt-in,
+since a few bits can separate text screens with different content. The compaction CLI
+applies the same rule to the existing testvideos/**/*_screen.png history.
+"""
+
+import argparse
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from collections import deque
+
+import cv2
+import numpy as np
+
+from emotion_data_access import get_db_path
+from media_store import default_media_root, ensure_media_schema
+from media_thumbnails import ensure_thumbnail_schema
+
+DHASH_SIZE = 16             # 16x16 gradient bits = 256-bit hash
+DEFAULT_TOLERANCE = None    # exact pixel matches only; near-duplicate matching is opt-in
+RECENT_BLOBS = 64           # blobs kept in memory for perceptual matching
+
+
+def content_hash(image):
+    """Hash of the decoded pixels (so re-encoded PNGs of the same screen match)"""
+    h = hashlib.blake2b(digest_size=16)
+    h.update(str(image.shape).encode())
+    h.update(np.ascontiguousarray(image).tobytes())
+    return h.hexdigest()
+
+
+def dhash(image, hash_size=DHASH_SIZE):
+    """Difference hash: sign of horizontal gradients on a (hash_size+1) x hash_size grayscale thumbnail, as an int"""
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
+    small = cv2.resize(gray, (hash_size + 1, hash_size), interpolation=cv2.INTER_AREA)
+    bits = (small[:, 1:] > small[:, :-1]).flatten()
+    return int(''.join('1' if b else '0' for b in bits), 2)
+
+
+def get_screen_tolerance():
+    """Near-duplicate tolerance from EMOTION_SCREEN_DEDUP_TOLERANCE (dHash bits, e.g. 4); None when unset"""
+    value = os.environ.get('EMOTION_SCREEN_DEDUP_TOLERANCE')
+    return int(value) if value not in (None, '') and int(value) >= 0 else None
+
+
+def hamming(a, b):
+    return bin(a ^ b).count('1')
+
+
+def ensure_screen_blob_schema(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS screen_blobs (
+            content_hash TEXT PRIMARY KEY,
+            dhash TEXT NOT NULL,               -- hex of the 256-bit difference hash
+            path TEXT NOT NULL,
+            ref_count INTEGER NOT NULL DEFAULT 1,
+            first_ts TEXT NOT NULL,            -- YYYYMMDD-HHMMSS of the first capture stored in this file
+            last_ts TEXT NOT NULL              -- last capture that reused it
+        )
+    ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_screen_blobs_last_ts ON screen_blobs(last_ts)')
+
+
+class ScreenBlobStore:
+    """Lookup and reference counting of stored screenshots"""
+
+    def __init__(self, db_path, tolerance=DEFAULT_TOLERANCE, recent=RECENT_BLOBS, writer=None):
+        """
+        :param db_path: SQLite database path
+        :param tolerance: max dHash bit difference to reuse a recent blob; None = exact pixel matches only
+        :param recent: how many recently used blobs are kept in memory (and compared perceptually)
+        :param writer: EmotionDBWriter to queue index updates on; None writes them synchronously
+        """
+        self.db_path = db_path
+        self.tolerance = tolerance
+        self.writer = writer
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        with self._conn:
+            ensure_screen_blob_schema(self._conn)
+        self._recent = deque(maxlen=recent)
+        rows = self._conn.execute(
+            "SELECT content_hash, dhash, path FROM screen_blobs ORDER BY last_ts DESC LIMIT ?", (recent,)
+        ).fetchall()
+        for chash, dh, path in reversed(rows):
+            self._recent.append((chash, int(dh, 16), path))
+        self.stats = {'stored': 0, 'reused_exact': 0, 'reused_similar': 0}
+
+    def _write(self, sql, params):
+        if self.writer is not None:
+            self.writer.submit_statement(sql, params)
+            return
+        with self._lock, self._conn:
+            self._conn.execute(sql, params)
+
+    def lookup(self, image):
+        """(path of a matching stored screenshot or None, (content_hash, dhash)) for a new capture"""
+        chash = content_hash(image)
+        dh = dhash(image)
+        with self._lock:
+            # Recent blobs first: their index rows may still be queued on the writer
+            path = next((r_path for r_chash, _, r_path in self._recent if r_chash == chash), None)
+            if path is None:
+                row = self._conn.execute("SELECT path FROM screen_blobs WHERE content_hash = ?", (chash,)).fetchone()
+                path = row[0] if row else None
+            if path is not None and os.path.exists(path):
+                self.stats['reused_exact'] += 1
+                return path, (chash, dh)
+            if self.tolerance is not None:
+                best = None
+                for r_chash, r_dh, r_path in self._recent:
+                    dist = hamming(dh, r_dh)
+                    if dist <= self.tolerance and (best is None or dist < best[0]):
+                        best = (dist, r_path)
+                if best is not None and os.path.exists(best[1]):
+                    self.stats['reused_similar'] += 1
+                    return best[1], (chash, dh)
+        return None, (chash, dh)
+
+    def add(self, hashes, path, timestamp):
+        """Index a newly written screenshot"""
+        chash, dh = hashes
+        self._write(
+            "INSERT OR REPLACE INTO screen_blobs (content_hash, dhash, path, ref_count, first_ts, last_ts) "
+            "VALUES (?, ?, ?, 1, ?, ?)", (chash, f'{dh:064x}', path, timestamp, timestamp)
+        )
+        with self._lock:
+            self._recent.append((chash, dh, path))
+            self.stats['stored'] += 1
+
+    def add_reference(self, path, timestamp):
+        """Record another capture reusing the stored screenshot at path"""
+        self._write("UPDATE screen_blobs SET ref_count = ref_count + 1, last_ts = ? WHERE path = ?", (timestamp, path))
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def compact_screens(db_path, media_root=None, tolerance=DEFAULT_TOLERANCE, dry_run=False):
+    """Deduplicate the existing *_screen.png history in capture order.
+
+    The first file of each group of identical/similar screens is kept; later duplicates are
+    deleted (with their thumbnails) and their emotion_records.screen_path rows repointed to the kept file.
+    """
+    media_root = media_root or default_media_root()
+    paths = []
+    for dirpath, _, filenames in os.walk(os.path.join(media_root, 'testvideos')):
+        paths.extend(os.path.join(dirpath, f) for f in filenames if f.endswith('_screen.png') and not f.startswith('.'))
+    paths.sort(key=os.path.basename)  # filenames start with the capture timestamp
+
+    conn = sqlite3.connect(db_path, timeout=30)
+    start = time.time()
+    try:
+        ensure_screen_blob_schema(conn)
+        ensure_media_schema(conn)
+        ensure_thumbnail_schema(conn)
+        conn.commit()
+        known = {path for (path,) in conn.execute("SELECT path FROM screen_blobs")}
+        by_hash = {chash: path for chash, path in conn.execute("SELECT content_hash, path FROM screen_blobs")}
+        recent = deque(((int(dh, 16), path) for dh, path in conn.execute(
+            "SELECT dhash, path FROM screen_blobs ORDER BY last_ts DESC LIMIT ?", (RECENT_BLOBS,))), maxlen=RECENT_BLOBS)
+        kept = removed = freed = 0
+        for path in paths:
+            if path in known:
+                continue
+            image = cv2.imread(path)
+            if image is None:
+                print(f"⚠️ Cannot read {path}, skipped")
+                continue
+            ts = os.path.basename(path)[:15]
+            chash, dh = content_hash(image), dhash(image)
+            target = by_hash.get(chash)
+            if target is None and tolerance is not None:
+                matches = [(hamming(dh, r_dh), r_path) for r_dh, r_path in recent]
+                matches = [m for m in matches if m[0] <= tolerance]
+                target = min(matches)[1] if matches else None
+            if target is None:
+                kept += 1
+                by_hash[chash] = path
+                recent.appendleft((dh, path))
+                if not dry_run:
+                    with conn:
+                        conn.execute(
+                            "INSERT OR REPLACE INTO screen_blobs (content_hash, dhash, path, ref_count, first_ts, last_ts) "
+                            "VALUES (?, ?, ?, 1, ?, ?)", (chash, f'{dh:064x}', path, ts, ts)
+                        )
+                continue
+
+            size = os.path.getsize(path)
+            removed += 1
+            freed += size
+            if dry_run:
+                continue
+            with conn:
+                refs = conn.execute(
+                    "UPDATE emotion_records SET screen_path = ? WHERE timestamp >= ? AND timestamp < ? AND screen_path = ?",
+                    (target, ts, ts + '~', path)
+                ).rowcount
+                conn.execute("UPDATE screen_blobs SET ref_count = ref_count + 1, last_ts = ? WHERE path = ?", (ts, target))
+                conn.execute("DELETE FROM media_files WHERE path = ?", (path,))
+                conn.execute(
+                    "UPDATE media_files SET ref_count = ref_count + ?, last_capture_ts = ? WHERE path = ?",
+                    (refs, ts, target)
+                )
+                thumbs = [p for (p,) in conn.execute("SELECT thumb_path FROM media_thumbnails WHERE source_path = ?", (path,))]
+                conn.execute("DELETE FROM media_thumbnails WHERE source_path = ?", (path,))
+            for p in [path] + thumbs:
+                try:
+                    os.remove(p)
+                except FileNotFoundError:
+                    pass
+    finally:
+        conn.close()
+    action = "would remove" if dry_run else "removed"
+    print(f"🖼️ Screens: {len(paths)} files, {kept} unique kept, {removed} duplicates {action} "
+          f"({freed / 1024 / 1024:.1f} MB, {time.time() - start:.1f}s)")
+    return kept, removed, freed
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Deduplicate stored screenshots (testvideos/**/*_screen.png)")
+    parser.add_argument('--db', default=get_db_path(), help='SQLite database path')
+    parser.add_argument('--media-root', default=default_media_root(), help='Directory holding testvideos/')
+    parser.add_argument('--tolerance', type=int, default=-1,
+                        help='Max differing dHash bits (of 256) to treat screens as the same, e.g. 4; default -1 = exact matches only')
+    parser.add_argument('--dry-run', action='store_true', help='Only report how many files would be removed')
+    args = parser.parse_args()
+
+    compact_screens(args.db, args.media_root, None if args.tolerance < 0 else args.tolerance, args.dry_run)
@@ -1,3 +1,8 @@
+import time
+startup_t0 = time.perf_counter()
+# Seconds spent importing / building each tab, printed as the startup timing report
+startup_timings = {}
+
 import gradio as gr
 import os
 import sys
@@ -9,6 +14,7 @@ sys.path.append(os.path.join(os.path.dirname(__file__), 'tab_data_visualization'
 sys.path.append(os.path.join(os.path.dirname(__file__), 'tab_image_processing'))
 sys.path.append(os.path.join(os.path.dirname(__file__), 'tab_audio_processing'))
 sys.path.append(os.path.join(os.path.dirname(__file__), 'tab_emotion_review'))
+sys.path.append(os.path.join(os.path.dirname(__file__), 'longterm_data'))
 
 # Import submodules
 emotion_battery_available = False
@@ -60,13 +66,31 @@ try:
 except ImportError as e:
     print(f"❌ Failed to import emotion review module: {e}")
 
+startup_timings['imports'] = time.perf_counter() - startup_t0
+
+def timed_build(name, build_fn):
+    """Build a tab and record how long it took"""
+    start = time.perf_counter()
+    try:
+        return build_fn()
+    finally:
+        startup_timings[name] = time.perf_counter() - start
+
+def print_startup_report():
+    print("⏱️ Startup timing:")
+    print(f"   imports: {startup_timings.get('imports', 0):.2f}s")
+    for name, seconds in startup_timings.items():
+        if name != 'imports':
+            print(f"   {name}: {seconds:.2f}s")
+    print(f"   total until launch: {time.perf_counter() - startup_t0:.2f}s")
+
 def create_main_interface():
     """Create main interface with multiple tabs"""
     
     # Create interfaces for each subpage
     if emotion_battery_available:
         try:
-            emotion_battery_tab = create_emotion_battery_interface()
+            emotion_battery_tab = timed_build("Emotion Battery", create_emotion_battery_interface)
         except Exception as e:
             print(f"Error creating emotion battery interface: {e}")
             emotion_battery_tab = gr.Interface(
@@ -87,7 +111,7 @@ def create_main_interface():
     
     if realtime_emotion_available:
         try:
-            realtime_emotion_tab = create_realtime_emotion_interface()
+            realtime_emotion_tab = timed_build("Realtime Emotion", create_realtime_emotion_interface)
         except Exception as e:
             print(f"Error creating realtime emotion interface: {e}")
             realtime_emotion_tab = gr.Interface(
@@ -108,7 +132,7 @@ def create_main_interface():
     
     if data_visualization_available:
         try:
-            data_tab = create_data_visualization_interface()
+            data_tab = timed_build("Data Visualization", create_data_visualization_interface)
         except Exception as e:
             print(f"Error creating data visualization interface: {e}")
             data_tab = gr.Interface(
@@ -129,7 +153,7 @@ def create_main_interface():
     
     if image_editor_available:
         try:
-            image_tab = create_image_editor_interface()
+            image_tab = timed_build("Image Processing", create_image_editor_interface)
         except Exception as e:
             print(f"Error creating image processing interface: {e}")
             image_tab = gr.Interface(
@@ -150,7 +174,7 @@ def create_main_interface():
     
     if audio_processor_available:
         try:
-            audio_tab = create_audio_processor_interface()
+            audio_tab = timed_build("Audio Processing", create_audio_processor_interface)
         except Exception as e:
             print(f"Error creating audio processing interface: {e}")
             audio_tab = gr.Interface(
@@ -171,7 +195,7 @@ def create_main_interface():
     
     if emotion_review_available:
         try:
-            emotion_review_tab = create_emotion_review_interface()
+            emotion_review_tab = timed_build("Emotion Review", create_emotion_review_interface)
         except Exception as e:
             print(f"Error creating emotion review interface: {e}")
             emotion_review_tab = gr.Interface(
@@ -280,6 +304,7 @@ def create_main_interface():
 if __name__ == "__main__":
     # Create and launch application
     app = create_main_interface()
+    print_startup_report()
     app.launch(
         server_name="127.0.0.1",
         server_port=7860,  # Use port 7861
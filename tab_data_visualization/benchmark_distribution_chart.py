@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Parity check and benchmark of the daily emotion distribution chart
+
+Builds the chart from synthetic (date, emotion_en, count) rows with the per-emotion loop the
+dashboard used before and with daily_distribution_figure (one day x emotion matrix), checks
+that both give the same traces and prints the build time of each.
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from data_visualization import ALL_EMOTIONS, EMOTION_COLOR_MAP, apply_distribution_layout, daily_distribution_figure
+
+
+def reference_distribution_figure(daily_emotions):
+    """Per-emotion loop the matrix version replaced"""
+    date_min = pd.to_datetime(daily_emotions['date']).min()
+    date_max = pd.to_datetime(daily_emotions['date']).max()
+    all_dates = pd.date_range(date_min, date_max)
+    all_emotions = ALL_EMOTIONS
+
+    idx = pd.MultiIndex.from_product([all_dates, all_emotions], names=['date', 'emotion_en'])
+    daily_emotions = daily_emotions.set_index(['date', 'emotion_en']).reindex(idx, fill_value=0).reset_index()
+
+    # 绘制分组柱状图（基于百分比）
+    fig = go.Figure()
+    min_bar_height = 0.01  # 0数据的柱子最小高度（百分比）
+
+    for emotion in ALL_EMOTIONS:
+        emotion_data = daily_emotions[daily_emotions['emotion_en'] == emotion]
+
+        # 计算每日总数和百分比
+        emotion_data = emotion_data.copy()
+        total_per_day = daily_emotions.groupby('date')['count'].transform('sum')
+        emotion_data['percent'] = emotion_data['count'] / total_per_day[emotion_data.index]
+
+        # 标签：数量和百分比
+        emotion_data['label'] = emotion_data.apply(
+            lambda row: f"{int(row['count'])} ({row['percent']:.0%})" if total_per_day[row.name] > 0 else "0 (0%)",
+            axis=1
+        )
+
+        # 使用百分比作为柱子高度，0数据的柱子显示最小高度
+        y_vals = [v if v > 0 else min_bar_height for v in emotion_data['percent']]
+
+        fig.add_trace(go.Bar(
+            x=emotion_data['date'],
+            y=y_vals,
+            name=emotion,
+            marker_color=EMOTION_COLOR_MAP.get(emotion, None),
+            text=emotion_data['label'],
+            textposition='auto',
+            customdata=emotion_data[['count', 'percent']].values.tolist(),
+            hovertemplate='Date: %{x}<br>Emotion: %{name}<br>Count: %{customdata[0]}<br>Percentage: %{customdata[1]:.1%}<extra></extra>'
+        ))
+
+    apply_distribution_layout(fig)
+    return fig
+
+
+def synthetic_daily_counts(n_days, seed=0):
+    """(date, emotion_en, count) rows like the SQL aggregate, with some days missing"""
+    rng = np.random.default_rng(seed)
+    dates = pd.date_range('2023-01-01', periods=n_days)
+    dates = dates[rng.random(n_days) > 0.1].append(dates[[0, -1]]).unique().sort_values()
+    emotions = ALL_EMOTIONS + ["None"]
+    df = pd.DataFrame({
+        'date': np.repeat(dates, len(emotions)),
+        'emotion_en': np.tile(emotions, len(dates)),
+        'count': rng.integers(0, 400, len(dates) * len(emotions)),
+    })
+    return df[rng.random(len(df)) > 0.2]
+
+
+def check_parity(daily):
+    expected, got = reference_distribution_figure(daily), daily_distribution_figure(daily)
+    for ref, new in zip(expected.data, got.data):
+        assert list(pd.to_datetime(list(ref.x))) == list(pd.to_datetime(list(new.x)))
+        assert list(ref.y) == list(new.y) and list(ref.text) == list(new.text)
+        # Days without any rows: NaN percent in the loop version, 0 in the matrix version
+        assert np.array_equal(np.nan_to_num(np.asarray(ref.customdata, dtype=float)), new.customdata)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Parity check and timing of the daily emotion distribution chart")
+    parser.add_argument('--days', default='30,365,1000', help='Day ranges to benchmark')
+    parser.add_argument('--repeat', type=int, default=3, help='Builds per variant (best time is reported)')
+    args = parser.parse_args()
+
+    for n_days in [int(d) for d in args.days.split(',')]:
+        daily = synthetic_daily_counts(n_days, seed=n_days)
+        check_parity(daily)
+        timings = {}
+        for name, build in (('loop', reference_distribution_figure), ('matrix', daily_distribution_figure)):
+            runs = []
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                build(daily)
+                runs.append(time.perf_counter() - start)
+            timings[name] = min(runs)
+        print(f"✅ {n_days} days: loop {timings['loop'] * 1000:.0f} ms, matrix {timings['matrix'] * 1000:.0f} ms "
+              f"({timings['loop'] / timings['matrix']:.1f}x)")
@@ -3,9 +3,20 @@ import plotly.graph_objects as go
 import plotly.express as px
 import pandas as pd
 import sqlite3
+import os
+import sys
+import threading
+from collections import OrderedDict
 from datetime import datetime, timedelta
 import numpy as np
 
+# Shared DB helpers live with the analyzer
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'longterm_data'))
+from emotion_data_access import (get_db_path, query_records, daily_emotion_counts, raw_daily_emotion_counts,
+                                 distinct_users, data_watermark)
+from emotion_archive import default_archive_dir, archived_days, compacted_rows, read_archive
+from emotion_rollup import EMOTION_LABEL_MAP
+
 # Define all possible emotion types
 ALL_EMOTIONS = ["Neutral", "Happy", "Angry", "Sad", "Surprised", "Worried"]
 
@@ -28,6 +39,11 @@ EMOTION_COLOR_MAP = {
     "Worried": "#9467bd"
 }
 
+# Rendered charts keyed by normalized filters and the DB's (min id, max id) watermark, LRU-evicted
+CHART_CACHE_SIZE = 32
+chart_cache = OrderedDict()
+chart_cache_lock = threading.Lock()
+
 def parse_date_input(date_str):
     """Parse various date input formats and return YYYYMMDD-000000 format"""
     if not date_str:
@@ -70,48 +86,42 @@ def parse_date_input_end(date_str):
     except ValueError:
         return None
 
-def get_all_usernames(db_path='emotion_data.db'):
+def get_all_usernames(db_path=None):
     """Get all unique usernames from database"""
     try:
-        conn = sqlite3.connect(db_path)
-        df = pd.read_sql_query("SELECT DISTINCT username FROM emotion_records WHERE username IS NOT NULL", conn)
-        usernames = df['username'].dropna().unique().tolist()
-        usernames = [u for u in usernames if u]
-        usernames.sort()
-        conn.close()
-        return usernames
+        return distinct_users(db_path)
     except Exception:
         return []
 
-def get_data_with_username(start_date, end_date, emotion_filter, username, db_path='emotion_data.db'):
+def get_data_with_username(start_date, end_date, emotion_filter, username, db_path=None):
     """Get data from database with filters"""
     try:
-        conn = sqlite3.connect(db_path)
-        query = "SELECT * FROM emotion_records WHERE 1=1"
-        params = []
-        
-        if start_date:
-            query += " AND substr(timestamp, 1, 13) >= ?"
-            params.append(start_date[:13])
-        
-        if end_date:
-            query += " AND substr(timestamp, 1, 13) <= ?"
-            params.append(end_date[:13])
+        db_path = db_path or get_db_path()
+        start_day = start_date[:8] if start_date else '19000101'
+        end_day = end_date[:8] if end_date else '99991230'
         
         # 多选情绪过滤
+        emotion_filter_db = None
         if emotion_filter and isinstance(emotion_filter, list) and len(emotion_filter) > 0:
             emotion_filter_db = [emotion_en2zh.get(e, e) for e in emotion_filter]
-            placeholders = ','.join(['?'] * len(emotion_filter_db))
-            query += f" AND emotion IN ({placeholders})"
-            params.extend(emotion_filter_db)
         
-        if username and username != 'All':
-            query += " AND username = ?"
-            params.append(username)
+        df = query_records(start_day, end_day, username, emotions=emotion_filter_db,
+                           order='timestamp DESC', db_path=db_path)
         
-        query += " ORDER BY timestamp DESC"
-        df = pd.read_sql_query(query, conn, params=params)
-        conn.close()
+        # Rows compacted out of the DB are read from the columnar archive (only the columns used here)
+        if start_date and end_date:
+            archive_dir = default_archive_dir(db_path)
+            days = archived_days(archive_dir, start_date[:8], end_date[:8])
+            adf = compacted_rows(db_path, days, ['timestamp', 'emotion', 'username'], archive_dir)
+            if len(adf):
+                adf['emotion'] = adf['emotion'].astype(str)
+                adf['username'] = adf['username'].astype(object)
+                if emotion_filter_db:
+                    adf = adf[adf['emotion'].isin(emotion_filter_db)]
+                if username and username != 'All':
+                    adf = adf[adf['username'] == username]
+                if not adf.empty:
+                    df = pd.concat([df, adf], ignore_index=True).sort_values('timestamp', ascending=False)
         
         # Convert timestamp format and map emotion
         if not df.empty:
@@ -138,6 +148,38 @@ def get_data_with_username(start_date, end_date, emotion_filter, username, db_pa
         print(f"Database query error: {e}")
         return pd.DataFrame()
 
+def archived_daily_emotion_counts(start_day, end_day, skip_days, emotions, username, db_path=None):
+    """(day, canonical emotion, count) rows for archived days not in skip_days"""
+    archive_dir = default_archive_dir(db_path or get_db_path())
+    days = [d for d in archived_days(archive_dir, start_day, end_day) if d not in skip_days]
+    if not days:
+        return []
+    adf = read_archive(archive_dir, days=days, columns=['timestamp', 'emotion', 'username'])
+    adf['emotion'] = adf['emotion'].astype(str).map(EMOTION_LABEL_MAP).fillna(adf['emotion'].astype(str))
+    if emotions:
+        adf = adf[adf['emotion'].isin(emotions)]
+    if username and username != 'All':
+        adf = adf[adf['username'].astype(object) == username]
+    counts = adf.groupby([adf['timestamp'].str[:8], 'emotion']).size()
+    return [(day, emotion, int(n)) for (day, emotion), n in counts.items()]
+
+def get_daily_emotion_counts(start_date, end_date, emotion_filter, username, db_path=None):
+    """Get per-day emotion counts aggregated in SQLite: the rollup table, else GROUP BY over raw rows"""
+    try:
+        emotions = emotion_filter if (emotion_filter and isinstance(emotion_filter, list)) else None
+        start_day, end_day = start_date[:8], end_date[:8]
+        rows = daily_emotion_counts(start_day, end_day, username, emotions, db_path)
+        if rows is None:
+            rows = raw_daily_emotion_counts(start_day, end_day, username, emotions, db_path)
+            # Days compacted out of the DB are counted from the columnar archive
+            rows += archived_daily_emotion_counts(start_day, end_day, {r[0] for r in rows}, emotions, username, db_path)
+        df = pd.DataFrame(rows, columns=['date', 'emotion_en', 'count'])
+        df['date'] = pd.to_datetime(df['date'], format='%Y%m%d', errors='coerce')
+        return df
+    except Exception as e:
+        print(f"Daily count query error: {e}")
+        return None
+
 def create_daily_emotion_distribution_chart(start_date, end_date, emotion_filter, username):
     """Create Daily Emotion Distribution (Percentage) chart"""
     if not start_date or not end_date:
@@ -157,7 +199,38 @@ def create_daily_emotion_distribution_chart(start_date, end_date, emotion_filter
             x=0.5, y=0.5, showarrow=False
         )
     
-    df = get_data_with_username(start_str, end_str, emotion_filter, username)
+    db_path = get_db_path()
+    try:
+        key = chart_cache_key(start_str, end_str, emotion_filter, username, db_path)
+    except sqlite3.Error as e:
+        print(f"Watermark query error: {e}")
+        key = None
+    with chart_cache_lock:
+        fig = chart_cache.get(key)
+        if fig is not None:
+            chart_cache.move_to_end(key)
+            return fig
+    fig = build_daily_emotion_distribution_chart(start_str, end_str, emotion_filter, username)
+    if key is not None:
+        with chart_cache_lock:
+            chart_cache[key] = fig
+            while len(chart_cache) > CHART_CACHE_SIZE:
+                chart_cache.popitem(last=False)
+    return fig
+
+def chart_cache_key(start_str, end_str, emotion_filter, username, db_path):
+    """Filters normalized so equivalent selections share an entry, plus the data watermark"""
+    emotions = tuple(sorted(emotion_filter)) if (emotion_filter and isinstance(emotion_filter, list)) else ()
+    return (db_path, start_str[:8], end_str[:8], emotions, username or 'All', data_watermark(db_path))
+
+def build_daily_emotion_distribution_chart(start_str, end_str, emotion_filter, username):
+    """Query and draw the chart for parsed YYYYMMDD-HHMMSS bounds"""
+    # Counts per (day, emotion) come aggregated from SQLite; raw rows only if that query fails
+    daily_emotions = get_daily_emotion_counts(start_str, end_str, emotion_filter, username)
+    if daily_emotions is not None:
+        df = daily_emotions
+    else:
+        df = get_data_with_username(start_str, end_str, emotion_filter, username)
     
     # 过滤无效日期和1970年及以前的异常数据
     if 'date' in df.columns:
@@ -173,49 +246,48 @@ def create_daily_emotion_distribution_chart(start_date, end_date, emotion_filter
         )
     
     # 统计每天每种情绪的数量
-    daily_emotions = df.groupby(['date', 'emotion_en']).size().reset_index(name='count')
+    if daily_emotions is not None:
+        daily_emotions = df.groupby(['date', 'emotion_en'])['count'].sum().reset_index()
+    else:
+        daily_emotions = df.groupby(['date', 'emotion_en']).size().reset_index(name='count')
     
+    return daily_distribution_figure(daily_emotions)
+
+def daily_distribution_figure(daily_emotions):
+    """Grouped percentage bars from (date, emotion_en, count) rows, built from one day x emotion matrix"""
     # 确保所有日期和所有情绪类型都有数据
-    date_min = pd.to_datetime(df['date']).min()
-    date_max = pd.to_datetime(df['date']).max()
-    all_dates = pd.date_range(date_min, date_max)
-    all_emotions = ALL_EMOTIONS
+    all_dates = pd.date_range(daily_emotions['date'].min(), daily_emotions['date'].max())
+    counts = (daily_emotions.pivot_table(index='date', columns='emotion_en', values='count', aggfunc='sum')
+              .reindex(index=all_dates, columns=ALL_EMOTIONS).fillna(0).to_numpy(dtype=float))
     
-    idx = pd.MultiIndex.from_product([all_dates, all_emotions], names=['date', 'emotion_en'])
-    daily_emotions = daily_emotions.set_index(['date', 'emotion_en']).reindex(idx, fill_value=0).reset_index()
+    # 计算每日总数和百分比（无数据的日期为0）
+    totals = counts.sum(axis=1, keepdims=True)
+    percent = np.divide(counts, totals, out=np.zeros_like(counts), where=totals > 0)
     
-    # 绘制分组柱状图（基于百分比）
-    fig = go.Figure()
+    # 标签：数量和百分比（与 f"{count} ({percent:.0%})" 相同的取整）
+    labels = np.char.add(np.char.add(np.char.add(counts.astype(np.int64).astype(str), " ("),
+                                     np.rint(percent * 100).astype(np.int64).astype(str)), "%)")
+    
+    # 使用百分比作为柱子高度，0数据的柱子显示最小高度
     min_bar_height = 0.01  # 0数据的柱子最小高度（百分比）
+    y_vals = np.where(percent > 0, percent, min_bar_height)
     
-    for emotion in ALL_EMOTIONS:
-        emotion_data = daily_emotions[daily_emotions['emotion_en'] == emotion]
-        
-        # 计算每日总数和百分比
-        emotion_data = emotion_data.copy()
-        total_per_day = daily_emotions.groupby('date')['count'].transform('sum')
-        emotion_data['percent'] = emotion_data['count'] / total_per_day[emotion_data.index]
-        
-        # 标签：数量和百分比
-        emotion_data['label'] = emotion_data.apply(
-            lambda row: f"{int(row['count'])} ({row['percent']:.0%})" if total_per_day[row.name] > 0 else "0 (0%)", 
-            axis=1
-        )
-        
-        # 使用百分比作为柱子高度，0数据的柱子显示最小高度
-        y_vals = [v if v > 0 else min_bar_height for v in emotion_data['percent']]
-        
+    fig = go.Figure()
+    for j, emotion in enumerate(ALL_EMOTIONS):
         fig.add_trace(go.Bar(
-            x=emotion_data['date'],
-            y=y_vals,
+            x=all_dates,
+            y=y_vals[:, j],
             name=emotion,
             marker_color=EMOTION_COLOR_MAP.get(emotion, None),
-            text=emotion_data['label'],
+            text=labels[:, j],
             textposition='auto',
-            customdata=emotion_data[['count', 'percent']].values.tolist(),
+            customdata=np.column_stack([counts[:, j], percent[:, j]]),
             hovertemplate='Date: %{x}<br>Emotion: %{name}<br>Count: %{customdata[0]}<br>Percentage: %{customdata[1]:.1%}<extra></extra>'
         ))
-    
+    apply_distribution_layout(fig)
+    return fig
+
+def apply_distribution_layout(fig):
     fig.update_layout(
         barmode='group',
         title="Daily Emotion Distribution (Percentage)",
@@ -231,8 +303,6 @@ def create_daily_emotion_distribution_chart(start_date, end_date, emotion_filter
         height=500,
         margin=dict(t=100, b=100, l=80, r=80)
     )
-    
-    return fig
 
 def create_data_visualization_interface():
     """Create data visualization interface with Daily Emotion Distribution chart"""
@@ -308,7 +378,7 @@ def create_data_visualization_interface():
             - **Username**: Filter data by specific user or view all users
             - **Emotion Types**: Select which emotions to include in the analysis
             
-            **Data Source:** emotion_data.db
+            **Data Source:** emotion_data.db (shared with the analyzer, override with EMOTION_DB_PATH)
             """)
         
         # Event Handlers
@@ -322,7 +392,8 @@ def create_data_visualization_interface():
         update_btn.click(
             fn=update_chart,
             inputs=[start_date, end_date, emotion_filter, username_filter],
-            outputs=chart_output
+            outputs=chart_output,
+            trigger_mode="always_last"
         )
         
         refresh_users_btn.click(
@@ -330,30 +401,16 @@ def create_data_visualization_interface():
             outputs=username_filter
         )
         
-        # Auto-update on filter changes
-        start_date.change(
-            fn=update_chart,
-            inputs=[start_date, end_date, emotion_filter, username_filter],
-            outputs=chart_output
-        )
-        
-        end_date.change(
-            fn=update_chart,
-            inputs=[start_date, end_date, emotion_filter, username_filter],
-            outputs=chart_output
-        )
-        
-        emotion_filter.change(
-            fn=update_chart,
-            inputs=[start_date, end_date, emotion_filter, username_filter],
-            outputs=chart_output
-        )
-        
-        username_filter.change(
-            fn=update_chart,
-            inputs=[start_date, end_date, emotion_filter, username_filter],
-            outputs=chart_output
-        )
+        # Date textboxes update on Enter or when focus leaves, not on every keystroke;
+        # always_last drops queued runs superseded by a newer selection
+        for trigger in (start_date.submit, start_date.blur, end_date.submit, end_date.blur,
+                        emotion_filter.change, username_filter.change):
+            trigger(
+                fn=update_chart,
+                inputs=[start_date, end_date, emotion_filter, username_filter],
+                outputs=chart_output,
+                trigger_mode="always_last"
+            )
     
     return interface
 
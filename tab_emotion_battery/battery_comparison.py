@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Week-over-week and community comparisons for the battery cards
+
+Completed days are reduced once to one average battery per user (plus 'All', the
+combined battery of everyone) and cached in emotion_battery_user_daily_avg with the
+day's (row count, max id) watermark and the battery settings. Comparisons are then
+averages over a handful of cached rows; a day is recomputed only when its rows change.
+"""
+
+from datetime import datetime, timedelta
+
+from emotion_data_access import write_connection
+from battery_result_store import is_current, params_key
+
+ALL_USERS = 'All'
+
+
+def ensure_user_daily_table(conn):
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS emotion_battery_user_daily_avg (
+            day TEXT NOT NULL,             -- YYYYMMDD (completed days only)
+            username TEXT NOT NULL,        -- user, or 'All' for the combined battery
+            params TEXT NOT NULL,          -- battery settings (JSON)
+            avg_battery REAL NOT NULL,
+            row_count INTEGER NOT NULL,    -- watermark of the day when computed
+            max_id INTEGER,
+            PRIMARY KEY (day, username, params)
+        ) WITHOUT ROWID
+        """
+    )
+
+
+def read_user_daily_avgs(start_day, end_day, params):
+    """({day: {username: avg}}, {day: (row_count, max_id)}) cached for [start_day, end_day]"""
+    conn = write_connection()
+    try:
+        ensure_user_daily_table(conn)
+        rows = conn.execute(
+            "SELECT day, username, avg_battery, row_count, max_id FROM emotion_battery_user_daily_avg "
+            "WHERE day >= ? AND day <= ? AND params = ?",
+            (start_day, end_day, params_key(params))
+        ).fetchall()
+    finally:
+        conn.close()
+    avgs, watermarks = {}, {}
+    for day, username, avg, row_count, max_id in rows:
+        avgs.setdefault(day, {})[username] = avg
+        watermarks[day] = (row_count, max_id)
+    return avgs, watermarks
+
+
+def write_user_daily_avgs(params, entries):
+    """Replace the cached averages of recomputed days: entries = [(day, {username: avg}, (row_count, max_id)), ...]"""
+    if not entries:
+        return
+    key = params_key(params)
+    conn = write_connection()
+    try:
+        ensure_user_daily_table(conn)
+        conn.executemany("DELETE FROM emotion_battery_user_daily_avg WHERE day = ? AND params = ?",
+                         [(day, key) for day, _, _ in entries])
+        conn.executemany(
+            "INSERT INTO emotion_battery_user_daily_avg (day, username, params, avg_battery, row_count, max_id) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            [(day, user, key, float(avg), wm[0], wm[1]) for day, user_avgs, wm in entries for user, avg in user_avgs.items()]
+        )
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def stale_days(days, cached_watermarks, watermarks):
+    """Days whose cached averages are missing or were computed from different rows"""
+    return [day for day in days
+            if day not in cached_watermarks or not is_current(cached_watermarks[day], watermarks.get(day, (0, None)))]
+
+
+def day_range(start_day, end_day):
+    start = datetime.strptime(start_day, '%Y%m%d')
+    return [(start + timedelta(days=i)).strftime('%Y%m%d')
+            for i in range((datetime.strptime(end_day, '%Y%m%d') - start).days + 1)]
+
+
+def period_average(avgs, subject, days):
+    """Mean of a subject's daily averages over days that have data; None without data"""
+    values = [avgs[day][subject] for day in days if subject in avgs.get(day, {})]
+    return sum(values) / len(values) if values else None
+
+
+def community_average(avgs, days):
+    """Mean over days and users of every user's daily average (the combined 'All' entry excluded)"""
+    values = [avg for day in days for user, avg in avgs.get(day, {}).items() if user != ALL_USERS]
+    return sum(values) / len(values) if values else None
+
+
+def comparison_line(level, reference, label):
+    """'8% higher than last week' style text; None when there is nothing to compare with"""
+    if reference is None or reference <= 0 or level is None:
+        return None
+    change = (level - reference) / reference * 100
+    if round(change) == 0:
+        return f"Same as {label}"
+    return f"{abs(change):.0f}% {'higher' if change > 0 else 'lower'} than {label}"
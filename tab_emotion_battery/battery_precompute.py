@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Parallel precompute of the monthly daily-average battery cache
+
+Months of a range whose emotion_monthly_daily_avg rows are missing or stale (row watermark
+or battery settings changed) are computed in a worker pool, one month per task: threads when
+called from the dashboard, spawned processes from this CLI (a spawned worker re-imports the
+caller's main module, which for the UI is the whole app). Each worker reads its month with one range query, runs the vectorized engine and writes its rows in a
+BEGIN IMMEDIATE transaction, so concurrent writers queue on SQLite's write lock instead of
+failing halfway. The calendar heatmap and the monthly bar chart read the same rows.
+"""
+
+import argparse
+import multiprocessing
+import os
+import sqlite3
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'longterm_data'))
+
+import numpy as np
+import pandas as pd
+
+from emotion_data_access import get_db_path, query_records, day_watermarks
+from emotion_archive import default_archive_dir, compacted_rows
+from emotion_battery_engine import DEFAULT_BATTERY_PARAMS, compute_days_battery, day_indices
+from battery_result_store import params_key
+
+
+def ensure_monthly_cache_schema(conn):
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS emotion_monthly_daily_avg (
+            month TEXT NOT NULL,           -- YYYY-MM
+            day   TEXT NOT NULL,           -- YYYY-MM-DD
+            avg_battery REAL,              -- average battery
+            created_at TEXT DEFAULT (datetime('now')),
+            row_count INTEGER,             -- watermark: raw rows of the day when computed
+            max_id INTEGER,                -- watermark: largest emotion_records id of the day
+            params TEXT,                   -- battery settings the average was computed with (JSON)
+            PRIMARY KEY (month, day)
+        )
+        """
+    )
+    # Older caches lack the watermark / settings columns; their rows are recomputed on first use
+    columns = [col[1] for col in conn.execute("PRAGMA table_info(emotion_monthly_daily_avg)").fetchall()]
+    if 'row_count' not in columns:
+        conn.execute("ALTER TABLE emotion_monthly_daily_avg ADD COLUMN row_count INTEGER")
+        conn.execute("ALTER TABLE emotion_monthly_daily_avg ADD COLUMN max_id INTEGER")
+    if 'params' not in columns:
+        conn.execute("ALTER TABLE emotion_monthly_daily_avg ADD COLUMN params TEXT")
+
+
+def month_days(month_str):
+    """Day keys (YYYYMMDD) of a YYYY-MM month"""
+    start = pd.to_datetime(month_str + "-01")
+    return [d.strftime('%Y%m%d') for d in pd.date_range(start, start + pd.offsets.MonthEnd(0), freq='D')]
+
+
+def month_range(start_month, end_month):
+    """YYYY-MM months from start_month to end_month inclusive"""
+    return [p.strftime('%Y-%m') for p in pd.period_range(start_month, end_month, freq='M')]
+
+
+def load_days_face_records(day_keys, db_path):
+    """(timestamp, emotion) face rows of several days from one range query, plus archived rows compacted out of the DB"""
+    df = query_records(min(day_keys), max(day_keys), columns=('timestamp', 'emotion'),
+                       has_face=True, order='', db_path=db_path)
+    adf = compacted_rows(db_path, day_keys, ['timestamp', 'emotion', 'has_face'])
+    if len(adf):
+        adf = adf[adf['has_face']][['timestamp', 'emotion']]
+        print(f"Loaded {len(adf)} compacted records from archive {default_archive_dir(db_path)}")
+        df = pd.concat([df, adf.astype(object)], ignore_index=True)
+    print(f"Range query returned {len(df)} face records for {len(day_keys)} day(s)")
+    return df
+
+
+def read_month_cache_rows(db_path, start_month, end_month):
+    """{YYYY-MM-DD: (avg_battery, (row_count, max_id), params)} cached for the months"""
+    conn = sqlite3.connect(db_path, timeout=30)
+    try:
+        ensure_monthly_cache_schema(conn)
+        conn.commit()
+        rows = conn.execute(
+            "SELECT day, avg_battery, row_count, max_id, params FROM emotion_monthly_daily_avg "
+            "WHERE month >= ? AND month <= ?", (start_month, end_month)
+        ).fetchall()
+    finally:
+        conn.close()
+    return {day: (avg, (row_count, max_id), params) for day, avg, row_count, max_id, params in rows}
+
+
+def stale_months(db_path, start_month, end_month, params=None):
+    """Months with a missing or stale cached day (today always counts as stale)"""
+    params = dict(DEFAULT_BATTERY_PARAMS, **(params or {}))
+    months = month_range(start_month, end_month)
+    cached = read_month_cache_rows(db_path, months[0], months[-1])
+    watermarks = day_watermarks(month_days(months[0])[0], month_days(months[-1])[-1], db_path=db_path)
+    today_key = datetime.now().strftime('%Y%m%d')
+    key = params_key(params)
+    stale = []
+    for month in months:
+        for day_key in month_days(month):
+            entry = cached.get(f"{day_key[:4]}-{day_key[4:6]}-{day_key[6:]}")
+            if (entry is None or day_key == today_key or entry[2] != key
+                    or tuple(entry[1]) != watermarks.get(day_key, (0, None))):
+                stale.append(month)
+                break
+    return stale
+
+
+def precompute_month(month_str, db_path, params=None):
+    """Compute and write one month's daily averages; returns (month, days written, seconds).
+
+    Runs in a worker thread or process. Same values as the dashboard's monthly view: days without face
+    records get the fixed default 80.0, other days the mean of their battery list.
+    """
+    start = time.time()
+    params = dict(DEFAULT_BATTERY_PARAMS, **(params or {}))
+    day_keys = month_days(month_str)
+    watermarks = day_watermarks(day_keys[0], day_keys[-1], db_path=db_path)
+    df = load_days_face_records(day_keys, db_path)
+    idx = day_indices(df['timestamp'], day_keys)
+    face_counts = np.bincount(idx[idx >= 0], minlength=len(day_keys))
+    batteries = compute_days_battery(df['timestamp'], df['emotion'], day_keys, params=params)
+    today_key = datetime.now().strftime('%Y%m%d')
+    rows = []
+    for day_key, n_faces in zip(day_keys, face_counts):
+        avg = round(float(pd.Series(batteries[day_key]).mean()), 1) if n_faces else 80.0
+        # Today is still partial: a NULL watermark makes it stale once the day is over
+        wm = (None, None) if day_key == today_key else watermarks.get(day_key, (0, None))
+        rows.append((month_str, f"{day_key[:4]}-{day_key[4:6]}-{day_key[6:]}", avg, wm[0], wm[1], params_key(params)))
+
+    # Take the write lock up front: concurrent workers wait (busy timeout) instead of deadlocking on upgrade
+    conn = sqlite3.connect(db_path, timeout=60, isolation_level=None)
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        ensure_monthly_cache_schema(conn)
+        conn.executemany(
+            "INSERT OR REPLACE INTO emotion_monthly_daily_avg (month, day, avg_battery, row_count, max_id, params) "
+            "VALUES (?, ?, ?, ?, ?, ?)", rows
+        )
+        conn.execute("COMMIT")
+    except Exception:
+        if conn.in_transaction:
+            conn.execute("ROLLBACK")
+        raise
+    finally:
+        conn.close()
+    return month_str, len(rows), time.time() - start
+
+
+def precompute_months(months, db_path=None, params=None, workers=None, processes=False):
+    """Fill the given months in parallel; returns [(month, days, seconds), ...]
+
+    Threads by default (SQLite reads and the numpy passes release the GIL); processes=True uses
+    spawned processes, meant for the CLI only since each worker re-imports the main module.
+    """
+    db_path = db_path or get_db_path()
+    if not months:
+        return []
+    workers = max(1, min(workers or os.cpu_count() or 1, len(months)))
+    if workers == 1:
+        return [precompute_month(month, db_path, params) for month in months]
+    if not processes:
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='battery-precompute') as pool:
+            futures = [pool.submit(precompute_month, month, db_path, params) for month in months]
+            return [f.result() for f in futures]
+    # spawn: no forked locks
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn')) as pool:
+        futures = [pool.submit(precompute_month, month, db_path, params) for month in months]
+        return [f.result() for f in futures]
+
+
+def precompute_range(start_month, end_month, db_path=None, params=None, workers=None, force=False, processes=False):
+    """Precompute the stale (or, with force, all) months of a range; returns the months computed"""
+    db_path = db_path or get_db_path()
+    months = month_range(start_month, end_month) if force else stale_months(db_path, start_month, end_month, params)
+    start = time.time()
+    results = precompute_months(months, db_path, params, workers, processes)
+    if results:
+        print(f"📆 Precomputed {len(results)} month(s) {start_month}..{end_month} in {time.time() - start:.1f}s")
+    return [month for month, _, _ in results]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Precompute monthly daily-average battery cache in parallel")
+    parser.add_argument('--db', default=get_db_path(), help='SQLite database path')
+    parser.add_argument('--start', required=True, help='First month (YYYY-MM)')
+    parser.add_argument('--end', help='Last month (YYYY-MM), default: --start')
+    parser.add_argument('--workers', type=int, default=None, help='Worker processes (default: CPU count)')
+    parser.add_argument('--force', action='store_true', help='Recompute months even if their cache is current')
+    parser.add_argument('--benchmark', action='store_true', help='Also time a sequential (1 worker) run of the same months')
+    args = parser.parse_args()
+
+    end_month = args.end or args.start
+    if args.benchmark:
+        months = month_range(args.start, end_month)
+        for workers in (1, args.workers or os.cpu_count() or 1):
+            start = time.time()
+            precompute_months(months, args.db, workers=workers, processes=True)
+            print(f"⏱️ {len(months)} month(s) with {workers} worker(s): {time.time() - start:.2f}s")
+    else:
+        precompute_range(args.start, end_month, args.db, workers=args.workers, force=args.force, processes=True)
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Persistent per-day Emotion Battery results
+
+Each computed day (labels, battery series, impact strings) is stored with the
+(row count, max id) watermark of the raw rows it was computed from, keyed by day,
+source DB path and battery parameters. A stored day is reused while its watermark is
+unchanged; once a day's raw rows are compacted into the archive (raw count 0) its stored
+result is kept as final. Today is never stored, since its battery depends on the clock.
+"""
+
+import json
+import os
+
+from emotion_data_access import write_connection
+
+
+def ensure_day_result_table(conn):
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS emotion_battery_day_results (
+            db_path TEXT NOT NULL,         -- source database the day was computed from
+            day TEXT NOT NULL,             -- YYYYMMDD
+            params TEXT NOT NULL,          -- battery parameters (JSON)
+            x_labels TEXT NOT NULL,        -- JSON lists
+            battery TEXT NOT NULL,
+            impacts TEXT NOT NULL,
+            row_count INTEGER NOT NULL,    -- watermark: raw rows of the day when computed
+            max_id INTEGER,                -- watermark: largest emotion_records id of the day
+            created_at TEXT DEFAULT (datetime('now')),
+            PRIMARY KEY (db_path, day, params)
+        ) WITHOUT ROWID
+        """
+    )
+
+
+def params_key(params):
+    return json.dumps(params, sort_keys=True)
+
+
+def is_current(stored_watermark, watermark):
+    """Stored result still valid for the day's current (row count, max id) watermark"""
+    return tuple(stored_watermark) == tuple(watermark) or watermark[0] == 0
+
+
+def read_day_results(db_path, days, params):
+    """{YYYYMMDD: ((x_labels, battery_list, impact_list), (row_count, max_id))} stored for days"""
+    days = list(days)
+    if not days:
+        return {}
+    conn = write_connection()
+    try:
+        ensure_day_result_table(conn)
+        rows = conn.execute(
+            "SELECT day, x_labels, battery, impacts, row_count, max_id FROM emotion_battery_day_results "
+            "WHERE db_path = ? AND params = ? AND day >= ? AND day <= ?",
+            (os.path.abspath(db_path), params_key(params), min(days), max(days))
+        ).fetchall()
+    finally:
+        conn.close()
+    wanted = set(days)
+    return {
+        day: ((json.loads(labels), json.loads(battery), json.loads(impacts)), (row_count, max_id))
+        for day, labels, battery, impacts, row_count, max_id in rows if day in wanted
+    }
+
+
+def write_day_results(db_path, params, entries):
+    """Upsert computed days: entries = [(YYYYMMDD, (x_labels, battery_list, impact_list), (row_count, max_id)), ...]"""
+    if not entries:
+        return
+    conn = write_connection()
+    try:
+        ensure_day_result_table(conn)
+        conn.executemany(
+            "INSERT OR REPLACE INTO emotion_battery_day_results "
+            "(db_path, day, params, x_labels, battery, impacts, row_count, max_id) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            [(os.path.abspath(db_path), day, params_key(params), json.dumps(result[0]), json.dumps(result[1]),
+              json.dumps(result[2], ensure_ascii=False), wm[0], wm[1]) for day, result, wm in entries]
+        )
+        conn.commit()
+    finally:
+        conn.close()
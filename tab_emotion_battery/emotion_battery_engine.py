@@ -0,0 +1,603 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Vectorized Emotion Battery engine
+
+Rows are assigned to time bins with np.searchsorted, counted with one 2D bincount
+(bins x emotions), and turned into per-bin impacts column by column; only the clamped
+battery recurrence remains a loop over the ~60 bins. The arithmetic is done in the same
+order as the original per-bin pandas loop, so results are bit-identical to it.
+A per-day cumulative index at one-minute resolution (minute_indices) lets any bin width,
+window or level setting be derived by differencing, without going back to the rows.
+
+Run this file directly for a parity check against the reference loop and a benchmark.
+"""
+
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+EMOTION_WEIGHT = {
+    "Happy": 500,        # 快乐：+500 分
+    "Surprised": 300,    # 惊讶：+300 分
+    "Sad": -300,         # 悲伤：-300 分
+    "Angry": -400,       # 愤怒：-400 分
+    "Worried": -300,     # 担忧：-300 分
+    "Neutral": 0         # 中性：0 分
+}
+
+# Map Chinese labels from DB to English keys used in EMOTION_WEIGHT
+EMOTION_LABEL_MAP_ZH2EN = {
+    "中立": "Neutral",
+    "开心": "Happy",
+    "高兴": "Happy",
+    "愤怒": "Angry",
+    "生气": "Angry",
+    "悲伤": "Sad",
+    "伤心": "Sad",
+    "惊讶": "Surprised",
+    "担忧": "Worried",
+    "忧虑": "Worried"
+}
+
+# Battery analysis parameters
+DEFAULT_BATTERY_PARAMS = {
+    'startV': 90,      # Starting battery level: 90%
+    'endV': 70,        # Ending battery level: 70%
+    'timeS': "08:00",  # Start time: 08:00
+    'timeE': "17:59",  # End time: 17:59
+    'timeP': 10,       # Time period in minutes
+}
+
+_WEIGHT_EMOTIONS = list(EMOTION_WEIGHT)
+_WEIGHTS = [EMOTION_WEIGHT[e] for e in _WEIGHT_EMOTIONS]
+
+MINUTES_PER_DAY = 24 * 60
+MINUTE_EDGES = np.arange(MINUTES_PER_DAY + 1)   # one-minute bins for the cumulative index
+
+
+def battery_bins(day, params=None):
+    """Bin start datetimes plus the final end time, exactly as the per-bin loop builds them"""
+    p = dict(DEFAULT_BATTERY_PARAMS, **(params or {}))
+    start_dt = datetime.strptime(f"{day}{p['timeS']}", "%Y%m%d%H:%M")
+    end_dt = datetime.strptime(f"{day}{p['timeE']}", "%Y%m%d%H:%M")
+    bins = []
+    cur = start_dt
+    while cur < end_dt:
+        bins.append(cur)
+        cur += timedelta(minutes=p['timeP'])
+    bins.append(end_dt)
+    return bins
+
+
+def parse_minutes(timestamps):
+    """Minute of day for 'YYYYMMDD-HHMM...' timestamps; -1 where pandas would not parse them.
+
+    Well-formed stamps are decoded from their code points; anything else goes through
+    pd.to_datetime with the original format so invalid rows are dropped the same way.
+    """
+    ts = np.asarray(timestamps, dtype=object)
+    n = len(ts)
+    if n == 0:
+        return np.empty(0, dtype=np.int64)
+    # Fixed-width unicode truncates to the 13 chars the loop parses; view as code points
+    chars = np.asarray(ts, dtype='U13').view(np.uint32).reshape(n, 13)
+    digits = chars - ord('0')
+    hhmm_pos = [9, 10, 11, 12]
+    well_formed = (chars[:, 8] == ord('-')) & np.all(digits[:, hhmm_pos] <= 9, axis=1) \
+        & np.all(digits[:, :8] <= 9, axis=1)
+    hour = digits[:, 9] * 10 + digits[:, 10]
+    minute = digits[:, 11] * 10 + digits[:, 12]
+    fast_ok = well_formed & (hour < 24) & (minute < 60)
+    minutes = np.where(fast_ok, hour.astype(np.int64) * 60 + minute, -1)
+    slow = ~fast_ok
+    if slow.any():
+        dt = pd.to_datetime(pd.Series(ts[slow]).astype(str).str[:13], format='%Y%m%d-%H%M', errors='coerce')
+        minutes[slow] = np.where(dt.isna(), -1, dt.dt.hour.fillna(0).astype(np.int64) * 60 + dt.dt.minute.fillna(0).astype(np.int64))
+    return minutes
+
+
+def emotion_indices(emotions):
+    """Index into EMOTION_WEIGHT order for each label (after ZH->EN mapping); -1 for other labels"""
+    codes, uniques = pd.factorize(np.asarray(emotions, dtype=object))
+    names = [EMOTION_LABEL_MAP_ZH2EN.get(str(u), str(u)) for u in uniques]
+    lookup = np.array([_WEIGHT_EMOTIONS.index(n) if n in EMOTION_WEIGHT else -1 for n in names] + [-1], dtype=np.int64)
+    return lookup[codes]  # missing labels are coded -1 -> last entry
+
+
+def bin_edges_minutes(bins):
+    return np.array([b.hour * 60 + b.minute for b in bins], dtype=np.int64)
+
+
+def count_bins(minutes, emo_idx, edges, group=None, n_groups=1):
+    """(n_groups x n_bins x n_emotions) counts of rows per bin and weighted emotion, via one bincount"""
+    n_bins = len(edges) - 1
+    n_emo = len(_WEIGHT_EMOTIONS)
+    b = np.searchsorted(edges, minutes, side='right') - 1
+    ok = (minutes >= 0) & (b >= 0) & (b < n_bins) & (emo_idx >= 0)
+    g = np.zeros(len(minutes), dtype=np.int64) if group is None else np.asarray(group, dtype=np.int64)
+    flat = (g[ok] * n_bins + b[ok]) * n_emo + emo_idx[ok]
+    return np.bincount(flat, minlength=n_groups * n_bins * n_emo).reshape(n_groups, n_bins, n_emo)
+
+
+def bin_impacts(counts, totals):
+    """Per-bin impact: sum of (count / total) * weight, accumulated in EMOTION_WEIGHT order"""
+    totals = np.asarray(totals, dtype=np.int64).reshape(-1, *([1] * (counts.ndim - 2)))
+    impact = np.zeros(counts.shape[:-1], dtype=np.float64)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        for j, weight in enumerate(_WEIGHTS):
+            ratio = np.where(totals > 0, counts[..., j] / np.where(totals > 0, totals, 1), 0.0)
+            impact = impact + ratio * weight
+    return impact
+
+
+def impact_strings(counts_row, total):
+    """Hover text of one bin: 'Emotion:+x.xx' for emotions present, '0.00' otherwise"""
+    detail = []
+    for j, emo in enumerate(_WEIGHT_EMOTIONS):
+        count = int(counts_row[j])
+        if count > 0:
+            detail.append(f"{emo}:{(count / total if total > 0 else 0) * _WEIGHTS[j]:+.2f}")
+    return ', '.join(detail) if detail else '0.00'
+
+
+def battery_recurrence(impacts, n_active, params=None):
+    """Clamped battery levels for (groups x bins) impacts; bins at index >= n_active[g] stay 0"""
+    p = dict(DEFAULT_BATTERY_PARAMS, **(params or {}))
+    n_groups, n_bins = impacts.shape
+    downV = (p['startV'] - p['endV']) / n_bins if n_bins > 0 else 0
+    n_active = np.broadcast_to(np.asarray(n_active), (n_groups,))
+    levels = np.zeros((n_groups, n_bins), dtype=np.int64)
+    curV = np.full(n_groups, float(p['startV']))
+    for i in range(n_bins):
+        active = i < n_active
+        nxt = np.where(curV < 50, curV + downV + impacts[:, i], curV - downV + impacts[:, i])
+        nxt = np.maximum(20, np.minimum(100, nxt))
+        curV = np.where(active, nxt, curV)
+        levels[:, i] = np.where(active, np.rint(nxt), 0)
+    return levels
+
+
+def compute_day_battery(timestamps, emotions, day, params=None, now=None, show_log=False):
+    """Battery for one day's face rows: (x_labels, battery_list, impact_list, current_battery)"""
+    now = now or datetime.now()
+    bins = battery_bins(day, params)
+    edges = bin_edges_minutes(bins)
+    n_bins = len(bins) - 1
+    minutes = parse_minutes(timestamps)
+    valid = minutes >= 0
+    data_total = int(valid.sum())
+    counts = count_bins(minutes[valid], emotion_indices(emotions)[valid], edges)
+    impacts = bin_impacts(counts, [data_total])
+
+    # Today: bins starting after now are not computed (shown as 0)
+    is_today = (day == now.strftime('%Y%m%d'))
+    n_active = n_bins
+    if is_today:
+        n_active = sum(1 for b in bins[:-1] if not b > now)
+    levels = battery_recurrence(impacts, [n_active], params)[0]
+
+    x_labels = [b.strftime('%H:%M') for b in bins[:-1]]
+    battery_list = [int(v) for v in levels]
+    impact_list = [impact_strings(counts[0, i], data_total) if i < n_active else '0.00' for i in range(n_bins)]
+    current_battery = None
+    if is_today:
+        for i in range(n_active):
+            if bins[i] <= now < bins[i + 1]:
+                current_battery = battery_list[i]
+    if show_log:
+        for i in range(n_active):
+            emotion_counts = {e: int(c) for e, c in zip(_WEIGHT_EMOTIONS, counts[0, i]) if c}
+            print(f"\n==== Time Period {bins[i].strftime('%H:%M')} - {bins[i + 1].strftime('%H:%M')} ====")
+            print(f"Emotion counts: {emotion_counts}")
+            print(f"Impact details: {impact_list[i]}")
+            print(f"Battery level: {battery_list[i]}")
+    return x_labels, battery_list, impact_list, current_battery
+
+
+def day_indices(timestamps, days):
+    """Position of each row's YYYYMMDD prefix in days; -1 for rows of other days"""
+    ts = np.asarray(timestamps, dtype=object)
+    if len(ts) == 0:
+        return np.empty(0, dtype=np.int64)
+    prefix = np.asarray(ts, dtype='U8')
+    order = np.argsort(np.asarray(days, dtype='U8'))
+    sorted_days = np.asarray(days, dtype='U8')[order]
+    pos = np.minimum(np.searchsorted(sorted_days, prefix), len(sorted_days) - 1)
+    return np.where(sorted_days[pos] == prefix, order[pos], -1)
+
+
+def compute_days_battery(timestamps, emotions, days, params=None, now=None, detail=False):
+    """Battery lists for many days from one batch of face rows: {day: battery_list}.
+
+    Rows are grouped by their day prefix and all days go through one (days x bins x emotions)
+    bincount and one recurrence, giving the same values as compute_day_battery per day.
+    With detail=True each value is (x_labels, battery_list, impact_list) instead.
+    """
+    now = now or datetime.now()
+    days = list(days)
+    if not days:
+        return {}
+    bins = battery_bins(days[0], params)
+    edges = bin_edges_minutes(bins)
+    n_bins = len(bins) - 1
+    group = day_indices(timestamps, days)
+    minutes = parse_minutes(timestamps)
+    valid = (minutes >= 0) & (group >= 0)
+    totals = np.bincount(group[valid], minlength=len(days))
+    counts = count_bins(minutes[valid], emotion_indices(emotions)[valid], edges, group[valid], len(days))
+    impacts = bin_impacts(counts, totals)
+
+    # Today's bins after now are not computed; other days use every bin
+    today = now.strftime('%Y%m%d')
+    n_active = np.full(len(days), n_bins)
+    for g, day in enumerate(days):
+        if day == today:
+            n_active[g] = sum(1 for b in battery_bins(day, params)[:-1] if not b > now)
+    levels = battery_recurrence(impacts, n_active, params)
+    if not detail:
+        return {day: [int(v) for v in levels[g]] for g, day in enumerate(days)}
+    x_labels = [b.strftime('%H:%M') for b in bins[:-1]]
+    return {
+        day: (list(x_labels), [int(v) for v in levels[g]],
+              [impact_strings(counts[g, i], totals[g]) if i < n_active[g] else '0.00' for i in range(n_bins)])
+        for g, day in enumerate(days)
+    }
+
+
+def compute_users_battery(timestamps, emotions, usernames, day, params=None, now=None):
+    """Battery of every user of one day from one batch of face rows, in one grouped pass:
+    {username: (x_labels, battery_list, impact_list, current_battery)}, each equal to
+    compute_day_battery on that user's rows. Rows without a username are skipped.
+    """
+    now = now or datetime.now()
+    bins = battery_bins(day, params)
+    edges = bin_edges_minutes(bins)
+    n_bins = len(bins) - 1
+    codes, users = pd.factorize(np.asarray(usernames, dtype=object))
+    minutes = parse_minutes(timestamps)
+    valid = (minutes >= 0) & (codes >= 0)
+    totals = np.bincount(codes[valid], minlength=len(users))
+    counts = count_bins(minutes[valid], emotion_indices(emotions)[valid], edges, codes[valid], len(users))
+    impacts = bin_impacts(counts, totals)
+
+    is_today = (day == now.strftime('%Y%m%d'))
+    n_active = sum(1 for b in bins[:-1] if not b > now) if is_today else n_bins
+    levels = battery_recurrence(impacts, [n_active] * len(users), params)
+    current_bin = next((i for i in range(n_active) if bins[i] <= now < bins[i + 1]), None) if is_today else None
+
+    x_labels = [b.strftime('%H:%M') for b in bins[:-1]]
+    results = {}
+    for g, user in enumerate(users):
+        if not user:
+            continue
+        battery_list = [int(v) for v in levels[g]]
+        impact_list = [impact_strings(counts[g, i], totals[g]) if i < n_active else '0.00' for i in range(n_bins)]
+        current = battery_list[current_bin] if current_bin is not None else None
+        results[user] = (list(x_labels), battery_list, impact_list, current)
+    return dict(sorted(results.items()))
+
+
+def team_average_battery(user_results):
+    """Per-bin mean of several users' batteries: (x_labels, battery_list, impact_list, current_battery)"""
+    if not user_results:
+        return [], [], [], None
+    results = list(user_results.values())
+    levels = np.array([r[1] for r in results], dtype=np.float64)
+    battery_list = [round(float(v), 1) for v in levels.mean(axis=0)]
+    impact_list = [f"{len(results)} users" if v else '0.00' for v in battery_list]
+    currents = [r[3] for r in results if r[3] is not None]
+    current = int(round(sum(currents) / len(currents))) if currents else None
+    return list(results[0][0]), battery_list, impact_list, current
+
+
+def cumulative_index(minute_counts):
+    """Prefix sums over minutes: cum[..., m, j] = rows of emotion j before minute m (one extra leading row)"""
+    minute_counts = np.asarray(minute_counts)
+    cum = np.zeros(minute_counts.shape[:-2] + (minute_counts.shape[-2] + 1, minute_counts.shape[-1]), dtype=np.int64)
+    np.cumsum(minute_counts, axis=-2, out=cum[..., 1:, :])
+    return cum
+
+
+def minute_indices(timestamps, emotions, days):
+    """Per-day cumulative emotion-count index at one-minute resolution, from one batch of face rows.
+
+    Returns (cum, totals): cum has shape (days x 1441 x emotions) and the counts of any minute
+    window [a, b) are cum[:, b] - cum[:, a]; totals are each day's parseable rows (the T of the
+    impact formula). Any bin width, window or level setting is then derived without the rows.
+    """
+    days = list(days)
+    group = day_indices(timestamps, days)
+    minutes = parse_minutes(timestamps)
+    valid = (minutes >= 0) & (group >= 0)
+    totals = np.bincount(group[valid], minlength=len(days))
+    counts = count_bins(minutes[valid], emotion_indices(emotions)[valid], MINUTE_EDGES, group[valid], len(days))
+    return cumulative_index(counts), totals
+
+
+def index_bin_counts(cum, edges):
+    """(... x n_bins x emotions) bin counts from a cumulative minute index by differencing"""
+    return cum[..., edges[1:], :] - cum[..., edges[:-1], :]
+
+
+def index_days_battery(cum, totals, days, params=None, now=None):
+    """{day: (x_labels, battery_list, impact_list, current_battery)} from minute indices, for any params"""
+    now = now or datetime.now()
+    days = list(days)
+    if not days:
+        return {}
+    bins = battery_bins(days[0], params)
+    edges = bin_edges_minutes(bins)
+    n_bins = len(bins) - 1
+    counts = index_bin_counts(np.asarray(cum), edges)
+    impacts = bin_impacts(counts, totals)
+    today = now.strftime('%Y%m%d')
+    today_bins = battery_bins(today, params)
+    n_today = sum(1 for b in today_bins[:-1] if not b > now)
+    n_active = [n_today if day == today else n_bins for day in days]
+    levels = battery_recurrence(impacts, n_active, params)
+    current_bin = next((i for i in range(n_today) if today_bins[i] <= now < today_bins[i + 1]), None)
+
+    x_labels = [b.strftime('%H:%M') for b in bins[:-1]]
+    results = {}
+    for g, day in enumerate(days):
+        battery_list = [int(v) for v in levels[g]]
+        impact_list = [impact_strings(counts[g, i], totals[g]) if i < n_active[g] else '0.00' for i in range(n_bins)]
+        current = battery_list[current_bin] if day == today and current_bin is not None else None
+        results[day] = (list(x_labels), battery_list, impact_list, current)
+    return results
+
+
+class DayBatteryTracker:
+    """Incremental battery state for one day (used for today's refreshes).
+
+    New face rows are folded into per-minute counts, so set_params() re-bins without
+    re-reading rows. The recurrence is re-run from bin 0 when the day's total changes
+    (every impact is count / total) and otherwise only over bins that became active since
+    the last call. Results equal compute_day_battery.
+    """
+
+    def __init__(self, day, params=None):
+        self.day = day
+        self.last_id = 0
+        self.data_total = 0
+        self.minute_counts = np.zeros((MINUTES_PER_DAY, len(_WEIGHT_EMOTIONS)), dtype=np.int64)
+        self.set_params(params)
+
+    def set_params(self, params=None):
+        """Switch bin width / window / levels; bin counts are re-derived from the minute counts"""
+        self.params = dict(DEFAULT_BATTERY_PARAMS, **(params or {}))
+        self.bins = battery_bins(self.day, self.params)
+        self.edges = bin_edges_minutes(self.bins)
+        self.n_bins = len(self.bins) - 1
+        self.downV = (self.params['startV'] - self.params['endV']) / self.n_bins if self.n_bins > 0 else 0
+        self._curv = np.zeros(self.n_bins)      # battery level after each computed bin (unrounded)
+        self._levels = [0] * self.n_bins
+        self._rebin()
+
+    def _rebin(self):
+        self.counts = index_bin_counts(cumulative_index(self.minute_counts), self.edges)
+        self._impacts = bin_impacts(self.counts[None], [self.data_total])[0]
+        self._n_done = 0                        # bins whose level is current
+
+    def add_rows(self, ids, timestamps, emotions):
+        """Fold in face rows inserted since the last call"""
+        if len(ids) == 0:
+            return
+        minutes = parse_minutes(timestamps)
+        valid = minutes >= 0
+        self.last_id = max(self.last_id, int(np.max(ids)))
+        n_valid = int(valid.sum())
+        if n_valid == 0:
+            return
+        self.minute_counts += count_bins(minutes[valid], emotion_indices(emotions)[valid], MINUTE_EDGES)[0]
+        self.data_total += n_valid
+        self._rebin()
+
+    def result(self, now=None):
+        """(x_labels, battery_list, impact_list, current_battery), same as compute_day_battery"""
+        now = now or datetime.now()
+        is_today = (self.day == now.strftime('%Y%m%d'))
+        n_active = sum(1 for b in self.bins[:-1] if not b > now) if is_today else self.n_bins
+        curV = self._curv[self._n_done - 1] if self._n_done > 0 else self.params['startV']
+        for i in range(min(self._n_done, n_active), n_active):
+            impact = self._impacts[i]
+            if curV < 50:
+                curV = curV + self.downV + impact
+            else:
+                curV = curV - self.downV + impact
+            curV = max(20, min(100, curV))
+            self._curv[i] = curV
+            self._levels[i] = int(round(curV))
+        self._n_done = max(self._n_done, n_active)
+
+        x_labels = [b.strftime('%H:%M') for b in self.bins[:-1]]
+        battery_list = [self._levels[i] if i < n_active else 0 for i in range(self.n_bins)]
+        impact_list = [impact_strings(self.counts[i], self.data_total) if i < n_active else '0.00'
+                       for i in range(self.n_bins)]
+        current_battery = None
+        if is_today:
+            for i in range(n_active):
+                if self.bins[i] <= now < self.bins[i + 1]:
+                    current_battery = battery_list[i]
+        return x_labels, battery_list, impact_list, current_battery
+
+
+def _reference_day_battery(df, day, params=None, now=None):
+    """The original per-bin pandas loop (boolean mask + value_counts per bin), kept for parity checks"""
+    p = dict(DEFAULT_BATTERY_PARAMS, **(params or {}))
+    bins = battery_bins(day, p)
+    n_bins = len(bins) - 1
+    downV = (p['startV'] - p['endV']) / n_bins if n_bins > 0 else 0
+    df = df.copy()
+    df['dt'] = pd.to_datetime(df['timestamp'].str[:13], format='%Y%m%d-%H%M', errors='coerce')
+    df['emotion_norm'] = df['emotion'].astype(str).map(lambda x: EMOTION_LABEL_MAP_ZH2EN.get(x, x))
+    df = df.dropna(subset=['dt'])
+    dataTotal = len(df)
+    battery_list, impact_list, x_labels = [], [], []
+    curV = p['startV']
+    now = now or datetime.now()
+    is_today = (day == now.strftime('%Y%m%d'))
+    current_battery = None
+    for i in range(n_bins):
+        bin_start, bin_end = bins[i], bins[i + 1]
+        x_labels.append(bin_start.strftime('%H:%M'))
+        if is_today and bin_start > now:
+            battery_list.append(0)
+            impact_list.append('0.00')
+            continue
+        bin_df = df[(df['dt'] >= bin_start) & (df['dt'] < bin_end)]
+        emotion_counts = bin_df['emotion_norm'].value_counts().to_dict() if not bin_df.empty else {}
+        impact = 0
+        impact_detail = []
+        for emo, weight in EMOTION_WEIGHT.items():
+            count = emotion_counts.get(emo, 0)
+            ratio = count / dataTotal if dataTotal > 0 else 0
+            emo_impact = ratio * weight
+            impact += emo_impact
+            if count > 0:
+                impact_detail.append(f"{emo}:{emo_impact:+.2f}")
+        impact_list.append(', '.join(impact_detail) if impact_detail else '0.00')
+        if curV < 50:
+            curV = curV + downV + impact
+        else:
+            curV = curV - downV + impact
+        curV = max(20, min(100, curV))
+        battery_val = int(round(curV))
+        battery_list.append(battery_val)
+        if is_today and bin_start <= now < bin_end:
+            current_battery = battery_val
+    return x_labels, battery_list, impact_list, current_battery
+
+
+def _synthetic_day(day, n_rows, seed=0, skew=None):
+    """Random face rows for one day (06:00-20:00, a few malformed stamps and unmapped labels)"""
+    rng = np.random.default_rng(seed)
+    labels = np.array(["中立", "快乐", "开心", "高兴", "愤怒", "生气", "悲伤", "伤心", "惊讶", "担忧", "忧虑",
+                       "Happy", "Sad", "无", "None"])
+    p = skew if skew is not None else rng.dirichlet(np.ones(len(labels)))
+    secs = np.sort(rng.integers(6 * 3600, 20 * 3600, n_rows))
+    ts = [f"{day}-{s // 3600:02d}{s % 3600 // 60:02d}{s % 60:02d}_{i % 6:02d}" for i, s in enumerate(secs)]
+    for k in rng.integers(0, n_rows, max(1, n_rows // 5000)):
+        ts[k] = f"{day}-9{k % 10}99_00" if k % 2 else f"{day}"
+    return pd.DataFrame({'timestamp': ts, 'emotion': labels[rng.choice(len(labels), n_rows, p=p)]})
+
+
+if __name__ == '__main__':
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(description="Parity check and benchmark of the vectorized battery engine")
+    parser.add_argument('--sizes', default='10000,100000,1000000', help='Rows per day to benchmark')
+    parser.add_argument('--parity-runs', type=int, default=50, help='Random days compared against the reference loop')
+    args = parser.parse_args()
+
+    day = '20250721'
+    print(f"🔍 Parity: {args.parity_runs} random days vs the per-bin pandas loop")
+    for run in range(args.parity_runs):
+        df = _synthetic_day(day, int(np.random.default_rng(run).integers(1, 3000)), seed=run)
+        now = datetime(2025, 7, 21, int(7 + run % 12), (run * 7) % 60, 30) if run % 3 == 0 else None
+        expected = _reference_day_battery(df, day, now=now)
+        got = compute_day_battery(df['timestamp'], df['emotion'], day, now=now)
+        assert got == expected, f"parity mismatch on run {run}"
+    empty = pd.DataFrame({'timestamp': pd.Series([], dtype=object), 'emotion': pd.Series([], dtype=object)})
+    assert compute_day_battery(empty['timestamp'], empty['emotion'], day) == _reference_day_battery(empty, day)
+    print("✅ Parity OK (labels, battery levels, impact text, current level)")
+
+    month_days = [f"202507{d:02d}" for d in range(1, 32)]
+    frames = [_synthetic_day(d, int(np.random.default_rng(i).integers(0, 2000)), seed=i) for i, d in enumerate(month_days)]
+    month_df = pd.concat(frames, ignore_index=True)
+    month_now = datetime(2025, 7, 18, 13, 25)
+    got = compute_days_battery(month_df['timestamp'], month_df['emotion'], month_days, now=month_now)
+    for d, frame in zip(month_days, frames):
+        assert got[d] == _reference_day_battery(frame, d, now=month_now)[1], f"month parity mismatch on {d}"
+    got = compute_days_battery(month_df['timestamp'], month_df['emotion'], month_days, now=month_now, detail=True)
+    for d, frame in zip(month_days, frames):
+        assert got[d] == _reference_day_battery(frame, d, now=month_now)[:3], f"month detail mismatch on {d}"
+    print("✅ Month parity OK (31 days in one pass vs per-day loop)")
+
+    # Per-user batteries in one grouped pass vs one computation per user
+    df = _synthetic_day(day, 20000, seed=11)
+    df['username'] = np.random.default_rng(11).choice(['alice', 'bob', 'carol', 'dave', None], len(df))
+    users_now = datetime(2025, 7, 21, 14, 3)
+    got = compute_users_battery(df['timestamp'], df['emotion'], df['username'], day, now=users_now)
+    assert list(got) == ['alice', 'bob', 'carol', 'dave']
+    for user, result in got.items():
+        part = df[df['username'] == user]
+        assert result == compute_day_battery(part['timestamp'], part['emotion'], day, now=users_now), f"user parity mismatch: {user}"
+    print("✅ User parity OK (4 users in one pass vs per-user computation)")
+
+    # Minute index: any params derived by differencing equal a full recompute from rows
+    frames = [_synthetic_day(d, int(np.random.default_rng(i).integers(0, 3000)), seed=i) for i, d in enumerate(month_days)]
+    month_df = pd.concat(frames, ignore_index=True)
+    cum, totals = minute_indices(month_df['timestamp'], month_df['emotion'], month_days)
+    param_sets = [None, {'timeP': 5}, {'timeP': 15, 'startV': 80, 'endV': 60}, {'timeP': 7, 'timeS': '09:30', 'timeE': '18:45'},
+                  {'timeP': 30, 'timeS': '00:00', 'timeE': '23:59'}, {'timeP': 1, 'timeS': '12:00', 'timeE': '13:00'}]
+    for params in param_sets:
+        got = index_days_battery(cum, totals, month_days, params=params, now=month_now)
+        for d, frame in zip(month_days, frames):
+            assert got[d] == compute_day_battery(frame['timestamp'], frame['emotion'], d, params=params, now=month_now), \
+                f"index parity mismatch on {d} with {params}"
+    start = time.perf_counter()
+    for _ in range(100):
+        index_days_battery(cum[:1], totals[:1], month_days[:1], params={'timeP': 15}, now=month_now)
+    print(f"✅ Index parity OK ({len(param_sets)} parameter sets x 31 days; re-binning one day: "
+          f"{(time.perf_counter() - start) * 10:.2f} ms)")
+
+    # Incremental tracker: rows arrive in chunks while the clock advances
+    df = _synthetic_day(day, 5000, seed=7)
+    df = df.sort_values('timestamp', kind='stable').reset_index(drop=True)
+    ids = np.arange(1, len(df) + 1)
+    tracker = DayBatteryTracker(day)
+    for step, cut in enumerate(np.linspace(0, len(df), 25).astype(int)[1:]):
+        now = datetime(2025, 7, 21, 6, 30) + timedelta(minutes=35 * step)
+        part = df.iloc[tracker.last_id:cut]
+        tracker.add_rows(ids[tracker.last_id:cut], part['timestamp'], part['emotion'])
+        for t in (now, now + timedelta(minutes=12)):
+            assert tracker.result(t) == compute_day_battery(df['timestamp'][:cut], df['emotion'][:cut], day, now=t), \
+                f"tracker mismatch at step {step}"
+    tracker.set_params({'timeP': 15, 'startV': 85})
+    assert tracker.result(now) == compute_day_battery(df['timestamp'], df['emotion'], day, params={'timeP': 15, 'startV': 85}, now=now)
+    print("✅ Tracker parity OK (incremental rows and advancing clock vs full recompute)")
+
+    print(f"\n⏱️ Benchmark (one day, {len(battery_bins(day)) - 1} bins)")
+    print(f"{'rows':>10} {'loop (s)':>10} {'engine (s)':>11} {'speedup':>8}")
+    for n in [int(s) for s in args.sizes.split(',')]:
+        df = _synthetic_day(day, n, seed=n)
+        start = time.perf_counter()
+        expected = _reference_day_battery(df, day)
+        loop_t = time.perf_counter() - start
+        start = time.perf_counter()
+        got = compute_day_battery(df['timestamp'], df['emotion'], day)
+        engine_t = time.perf_counter() - start
+        assert got == expected
+        print(f"{n:>10} {loop_t:>10.3f} {engine_t:>11.3f} {loop_t / engine_t:>7.1f}x")
+
+    print(f"\n⏱️ Benchmark (one day, 20 users)")
+    print(f"{'rows':>10} {'per-user (s)':>13} {'one pass (s)':>13} {'speedup':>8}")
+    for n in [int(s) for s in args.sizes.split(',')][:2]:
+        df = _synthetic_day(day, n, seed=n)
+        df['username'] = np.random.default_rng(n).choice([f'user{i:02d}' for i in range(20)], n)
+        start = time.perf_counter()
+        expected = {u: compute_day_battery(p['timestamp'], p['emotion'], day) for u, p in df.groupby('username')}
+        per_user_t = time.perf_counter() - start
+        start = time.perf_counter()
+        got = compute_users_battery(df['timestamp'], df['emotion'], df['username'], day)
+        one_pass_t = time.perf_counter() - start
+        assert got == expected
+        print(f"{n:>10} {per_user_t:>13.3f} {one_pass_t:>13.3f} {per_user_t / one_pass_t:>7.1f}x")
+
+    print(f"\n⏱️ Benchmark (one month, 31 days)")
+    print(f"{'rows/day':>10} {'loop (s)':>10} {'engine (s)':>11} {'speedup':>8}")
+    for n in [int(s) for s in args.sizes.split(',')][:2]:
+        frames = [_synthetic_day(d, n, seed=i) for i, d in enumerate(month_days)]
+        month_df = pd.concat(frames, ignore_index=True)
+        start = time.perf_counter()
+        expected = {d: _reference_day_battery(f, d)[1] for d, f in zip(month_days, frames)}
+        loop_t = time.perf_counter() - start
+        start = time.perf_counter()
+        got = compute_days_battery(month_df['timestamp'], month_df['emotion'], month_days)
+        engine_t = time.perf_counter() - start
+        assert got == expected
+        print(f"{n:>10} {loop_t:>10.3f} {engine_t:>11.3f} {loop_t / engine_t:>7.1f}x")
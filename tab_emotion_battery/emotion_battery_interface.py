@@ -4,185 +4,174 @@
 Emotion Battery Analysis Interface
 """
 
+import os
+import sys
+
+# Shared DB helpers live with the analyzer; the battery engine sits next to this file
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'longterm_data'))
+
 def create_emotion_battery_interface():
     """Create emotion battery interface with Today's Emotion Battery and Single Day Analysis functionality"""
     
     import gradio as gr
     import plotly.graph_objects as go
-    import sqlite3
     import pandas as pd
+    import numpy as np
+    import threading
+    from collections import OrderedDict
+    from concurrent.futures import ThreadPoolExecutor
     from datetime import datetime, timedelta
+    from emotion_data_access import (
+        get_db_path, get_fake_db_path, db_exists, write_connection,
+        query_records, count_by_day, first_day_with_faces, day_watermarks, distinct_users
+    )
+    from emotion_archive import default_archive_dir, archived_days, compacted_rows
     
     # Emotion constants and mappings
     ALL_EMOTIONS = ["Neutral", "Happy", "Angry", "Sad", "Surprised", "Worried"]
     
-    EMOTION_WEIGHT = {
-        "Happy": 500,        # 快乐：+500 分
-        "Surprised": 300,    # 惊讶：+300 分
-        "Sad": -300,         # 悲伤：-300 分
-        "Angry": -400,       # 愤怒：-400 分
-        "Worried": -300,     # 担忧：-300 分
-        "Neutral": 0         # 中性：0 分
-    }
-
-    # Map Chinese labels from DB to English keys used in EMOTION_WEIGHT
-    EMOTION_LABEL_MAP_ZH2EN = {
-        "中立": "Neutral",
-        "开心": "Happy",
-        "高兴": "Happy",
-        "愤怒": "Angry",
-        "生气": "Angry",
-        "悲伤": "Sad",
-        "伤心": "Sad",
-        "惊讶": "Surprised",
-        "担忧": "Worried",
-        "忧虑": "Worried"
-    }
-
-    # Also accept English passthrough (no-op); unmapped labels remain as-is
+    # Battery weights, label map, parameters and the vectorized per-day computation
+    from emotion_battery_engine import (
+        DEFAULT_BATTERY_PARAMS, DayBatteryTracker, battery_bins,
+        compute_users_battery, team_average_battery, minute_indices, index_days_battery
+    )
+    from battery_result_store import is_current, params_key, read_day_results, write_day_results
+    from battery_precompute import (
+        ensure_monthly_cache_schema, load_days_face_records, month_range, precompute_range, read_month_cache_rows
+    )
+    from battery_comparison import (
+        ALL_USERS, read_user_daily_avgs, write_user_daily_avgs, stale_days, day_range,
+        period_average, community_average, comparison_line
+    )
+    # Current battery settings (editable in the "Battery settings" panel). The dict is replaced,
+    # never changed in place: each callback takes one snapshot and passes it to every compute/write
+    settings = {'params': dict(DEFAULT_BATTERY_PARAMS)}
+    
+    # Per-day cumulative minute indices: new settings re-bin these instead of re-reading raw rows
+    INDEX_CACHE_DAYS = 400
+    index_cache = OrderedDict()   # (db_path, day) -> ((row_count, max_id), cum, total)
+    index_lock = threading.Lock()
+    
+    # Today's battery is kept incrementally: the refresh button only reads rows with id > last seen id
+    today_state = {'key': None, 'tracker': None, 'watermark': None}
+    today_lock = threading.Lock()
+    
+    # User selector: 'All' mixes every user (the original battery), TEAM_AVERAGE is the per-bin mean of users
+    TEAM_AVERAGE = "Team average"
     
-    # Battery analysis parameters
-    startV = 90    # Starting battery level: 90%
-    endV = 70      # Ending battery level: 70%
-    timeS = "08:00"  # Start time: 08:00
-    timeE = "17:59"  # End time: 17:59
-    timeP = 10       # Time period in minutes
+    def load_day_face_records(day, db_path, columns=('timestamp', 'emotion')):
+        """Face rows of one day, plus archived rows of the day that were compacted out of the DB"""
+        df = query_records(day, day, columns=columns, has_face=True, order='', db_path=db_path)
+        adf = compacted_rows(db_path, [day], list(columns) + ['has_face'])
+        if len(adf):
+            adf = adf[adf['has_face']][list(columns)].astype(object)
+            print(f"Loaded {len(adf)} compacted records for {day} from archive")
+            df = pd.concat([df, adf], ignore_index=True)
+        return df
     
-    def analyze_emotion_battery(day, show_log=False, plot=False, db_path='emotion_data.db'):
-        """Analyze emotion battery for a specific day"""
+    def get_minute_indices(day_keys, db_path, watermarks):
+        """(cum, totals) of the days in order; raw rows are read only for days not indexed at their watermark"""
+        found = {}
+        with index_lock:
+            for day in day_keys:
+                entry = index_cache.get((db_path, day))
+                if entry is not None and entry[0] == watermarks.get(day, (0, None)):
+                    index_cache.move_to_end((db_path, day))
+                    found[day] = entry[1:]
+        missing = [day for day in day_keys if day not in found]
+        if missing:
+            df = load_days_face_records(missing, db_path)
+            cum, totals = minute_indices(df['timestamp'], df['emotion'], missing)
+            with index_lock:
+                for g, day in enumerate(missing):
+                    found[day] = (cum[g], int(totals[g]))
+                    index_cache[(db_path, day)] = (watermarks.get(day, (0, None)), cum[g], int(totals[g]))
+                while len(index_cache) > INDEX_CACHE_DAYS:
+                    index_cache.popitem(last=False)
+        return np.stack([found[day][0] for day in day_keys]), [found[day][1] for day in day_keys]
+    
+    def get_day_batteries(day_keys, params, db_path=None, watermarks=None):
+        """{YYYYMMDD: (x_labels, battery_list, impact_list)}, reusing stored results of unchanged past days"""
+        db_path = db_path or get_db_path()
+        day_keys = list(day_keys)
+        today_key = datetime.now().strftime('%Y%m%d')
+        if watermarks is None:
+            watermarks = day_watermarks(min(day_keys), max(day_keys), db_path=db_path)
+        stored = read_day_results(db_path, day_keys, params)
+        results = {}
+        for day in day_keys:
+            entry = stored.get(day)
+            if day != today_key and entry is not None and is_current(entry[1], watermarks.get(day, (0, None))):
+                results[day] = entry[0]
+        stale = [day for day in day_keys if day not in results]
+        if stale:
+            cum, totals = get_minute_indices(stale, db_path, watermarks)
+            computed = index_days_battery(cum, totals, stale, params=params)
+            results.update({day: computed[day][:3] for day in stale})
+            write_day_results(db_path, params, [
+                (day, results[day], watermarks.get(day, (0, None))) for day in stale if day < today_key
+            ])
+        print(f"Day results: {len(day_keys) - len(stale)} stored, {len(stale)} computed ({db_path})")
+        return results
+    
+    def get_user_batteries(day, params, db_path=None):
+        """{username: (x_labels, battery_list, impact_list, current_battery)} for every user of the day,
+        plus TEAM_AVERAGE, from one query and one grouped pass"""
+        db_path = db_path or get_db_path()
+        df = load_day_face_records(day, db_path, columns=('timestamp', 'emotion', 'username'))
+        results = compute_users_battery(df['timestamp'], df['emotion'], df['username'], day, params=params)
+        if results:
+            results[TEAM_AVERAGE] = team_average_battery(results)
+        print(f"User batteries for {day}: {len(results)} entries from {len(df)} face records")
+        return results
+    
+    def get_today_battery(params, db_path=None):
+        """Today's (x_labels, battery_list, impact_list, current_battery), folding in only rows added since the last call"""
         try:
-            print(f"Starting analysis for day: {day}, database: {db_path}")
-            
-            start_dt = datetime.strptime(f"{day}{timeS}", "%Y%m%d%H:%M")
-            end_dt = datetime.strptime(f"{day}{timeE}", "%Y%m%d%H:%M")
-            
-            # Generate time bins
-            bins = []
-            cur = start_dt
-            while cur < end_dt:
-                bins.append(cur)
-                cur += timedelta(minutes=timeP)
-            bins.append(end_dt)
-            n_bins = len(bins) - 1
-            
-            print(f"Generated {n_bins} time bins from {start_dt} to {end_dt}")
-            
-            # Calculate decrement per period
-            if n_bins > 0:
-                downV = (startV - endV) / n_bins
-            else:
-                downV = 0
-            
-            # Read database data
-            conn = sqlite3.connect(db_path)
-            query = f"""
-            SELECT timestamp, emotion FROM emotion_records
-            WHERE substr(timestamp, 1, 8) = ? AND has_face = 1
-            """
-            print(f"Executing query: {query} with day: {day}")
-            
-            df = pd.read_sql_query(query, conn, params=[day])
-            conn.close()
-            
-            print(f"Database query returned {len(df)} records")
-            if not df.empty:
-                print(f"Sample timestamps: {df['timestamp'].head().tolist()}")
-            
-            # Parse timestamps
-            if not df.empty:
-                df['dt'] = pd.to_datetime(df['timestamp'].str[:13], format='%Y%m%d-%H%M', errors='coerce')
-                # Normalize emotion labels to English keys used in EMOTION_WEIGHT
-                df['emotion_norm'] = df['emotion'].astype(str).map(lambda x: EMOTION_LABEL_MAP_ZH2EN.get(x, x))
-                # Remove rows with invalid timestamps
-                df = df.dropna(subset=['dt'])
-                print(f"After timestamp parsing: {len(df)} valid records")
-            else:
-                df['dt'] = []
-                df['emotion_norm'] = []
-            
-            dataTotal = len(df)
-            battery_list = []
-            impact_list = []
-            x_labels = []
-            curV = startV
-            now = datetime.now()
-            is_today = (day == now.strftime('%Y%m%d'))
-            current_battery = None
-            
-            print(f"Processing {n_bins} time bins with {dataTotal} total records")
-            
-            for i in range(n_bins):
-                bin_start = bins[i]
-                bin_end = bins[i+1]
-                x_labels.append(bin_start.strftime('%H:%M'))
-                
-                # If it's today and time period is in the future, battery = 0
-                if is_today and bin_start > now:
-                    battery_list.append(0)
-                    impact_list.append('0.00')
-                    continue
-                
-                # Get data for this time bin
-                bin_df = df[(df['dt'] >= bin_start) & (df['dt'] < bin_end)]
-                if not bin_df.empty and 'emotion_norm' in bin_df.columns:
-                    # Count using normalized labels
-                    emotion_counts = bin_df['emotion_norm'].value_counts().to_dict()
-                else:
-                    emotion_counts = {}
-                
-                # Calculate emotional impact
-                impact = 0
-                impact_detail = []
-                for emo, weight in EMOTION_WEIGHT.items():
-                    count = emotion_counts.get(emo, 0)
-                    ratio = count / dataTotal if dataTotal > 0 else 0
-                    emo_impact = ratio * weight
-                    impact += emo_impact
-                    if count > 0:
-                        impact_detail.append(f"{emo}:{emo_impact:+.2f}")
-                
-                impact_str = ', '.join(impact_detail) if impact_detail else '0.00'
-                impact_list.append(impact_str)
-                
-                # Update battery level
-                if curV < 50:
-                    curV = curV + downV + impact
-                else:
-                    curV = curV - downV + impact
-                
-                curV = max(20, min(100, curV))
-                battery_val = int(round(curV))
-                battery_list.append(battery_val)
-                
-                # Record current battery level if this is the current time period
-                if is_today and bin_start <= now < bin_end:
-                    current_battery = battery_val
-                
-                if show_log:
-                    print(f"\n==== Time Period {bin_start.strftime('%H:%M')} - {bin_end.strftime('%H:%M')} ====")
-                    print(f"Raw data:\n{bin_df[['timestamp','emotion','emotion_norm','dt']] if not bin_df.empty else 'None'}")
-                    print(f"Emotion counts: {emotion_counts}")
-                    print(f"Impact details: {impact_str}")
-                    print(f"Battery level: {battery_val}")
-            
-            print(f"Analysis completed. Generated {len(x_labels)} labels, {len(battery_list)} battery values, {len(impact_list)} impact values")
-            return x_labels, battery_list, impact_list, current_battery
-            
+            db_path = db_path or get_db_path()
+            today = datetime.now().strftime('%Y%m%d')
+            with today_lock:
+                key = (today, db_path)
+                watermark = day_watermarks(today, today, db_path=db_path).get(today, (0, 0))
+                tracker = today_state['tracker']
+                old = today_state['watermark']
+                # New day/DB, rows deleted, or more new rows than new ids (inserted below the
+                # last seen id): start over from the first row of the day
+                if (today_state['key'] != key or old is None or watermark[1] < old[1]
+                        or watermark[0] - old[0] not in range(0, watermark[1] - old[1] + 1)):
+                    tracker = DayBatteryTracker(today, params)
+                    today_state.update(key=key, tracker=tracker, watermark=None)
+                if watermark != today_state['watermark']:
+                    df = query_records(today, today, columns=('id', 'timestamp', 'emotion'), has_face=True,
+                                       order='', after_id=tracker.last_id, db_path=db_path)
+                    tracker.add_rows(df['id'].to_numpy(), df['timestamp'], df['emotion'])
+                    today_state['watermark'] = watermark
+                    print(f"Today's battery: {len(df)} new face records folded in (last id {tracker.last_id})")
+                if tracker.params != dict(DEFAULT_BATTERY_PARAMS, **params):
+                    tracker.set_params(params)   # re-bins the minute counts, no new query
+                return tracker.result()
         except Exception as e:
-            print(f"Error in analyze_emotion_battery: {e}")
+            print(f"Error in get_today_battery: {e}")
             import traceback
             traceback.print_exc()
-            if show_log:
-                print(f"Error in analyze_emotion_battery: {e}")
             return [], [], [], None
     
-    def create_today_battery_chart():
+    def get_today_result(params, user='All'):
+        """Today's battery for the user selector: combined (incremental), one user, or the team average"""
+        if not user or user == 'All':
+            return get_today_battery(params)
+        try:
+            return get_user_batteries(datetime.now().strftime('%Y%m%d'), params).get(user, ([], [], [], None))
+        except Exception as e:
+            print(f"Error in get_user_batteries: {e}")
+            return [], [], [], None
+    
+    def create_today_battery_chart(result, params, user=None):
         """Create Today's Emotion Battery chart"""
+        title = f"Today's Emotion Battery by {params['timeP']}min" + (f" ({user})" if user and user != 'All' else "")
         try:
-            today = datetime.now().strftime('%Y%m%d')
-            x_labels, battery_list, impact_list, current_battery = analyze_emotion_battery(
-                today, show_log=False, plot=False, db_path='emotion_data.db'
-            )
+            x_labels, battery_list, impact_list, current_battery = result
             
             if not battery_list:
                 # Return empty chart with message
@@ -194,7 +183,7 @@ def create_emotion_battery_interface():
                     font=dict(size=16)
                 )
                 fig.update_layout(
-                    title="Today's Emotion Battery by 10min",
+                    title=title,
                     xaxis_title="Time",
                     yaxis_title="Emotion Battery",
                     height=400
@@ -215,7 +204,7 @@ def create_emotion_battery_interface():
             ))
             
             fig.update_layout(
-                title="Today's Emotion Battery by 10min",
+                title=title,
                 xaxis_title="Time",
                 yaxis_title="Emotion Battery",
                 yaxis=dict(range=[20, 100]),
@@ -235,22 +224,22 @@ def create_emotion_battery_interface():
                 font=dict(size=14, color='red')
             )
             fig.update_layout(
-                title="Today's Emotion Battery by 10min",
+                title=title,
                 xaxis_title="Time",
                 yaxis_title="Emotion Battery",
                 height=400
             )
             return fig
     
-    def create_single_day_battery_chart(selected_date, use_fake_db=False):
+    def create_single_day_battery_chart(selected_date, use_fake_db=False, user='All', params=None):
         """Create Single Day Emotion Battery Analysis chart"""
+        params = params or settings['params']
         try:
             # Determine database path
-            db_path = 'emotion_data_fake.db' if use_fake_db else 'emotion_data.db'
+            db_path = get_fake_db_path() if use_fake_db else get_db_path()
             
             # Check if database file exists
-            import os
-            if not os.path.exists(db_path):
+            if not db_exists(db_path):
                 # Return error chart for missing database
                 fig = go.Figure()
                 fig.add_annotation(
@@ -273,13 +262,7 @@ def create_emotion_battery_interface():
                 
                 # Try to find any available date in the fake database
                 try:
-                    conn = sqlite3.connect(db_path)
-                    cursor = conn.cursor()
-                    cursor.execute("SELECT DISTINCT substr(timestamp, 1, 8) FROM emotion_records WHERE has_face = 1 LIMIT 1")
-                    result = cursor.fetchone()
-                    if result:
-                        day = result[0]
-                    conn.close()
+                    day = first_day_with_faces(db_path) or day
                 except Exception as e:
                     print(f"Error finding date in fake database: {e}")
                     day = '20250721'  # Fallback to default
@@ -331,10 +314,15 @@ def create_emotion_battery_interface():
             
             print(f"Analyzing day: {day} with database: {db_path}")
             
-            # Analyze emotion battery for the selected day
-            x_labels, battery_list, impact_list, _ = analyze_emotion_battery(
-                day, show_log=True, plot=False, db_path=db_path  # Enable logging for debugging
-            )
+            # Completed days come from the result store unless their rows changed
+            try:
+                if not user or user == 'All':
+                    x_labels, battery_list, impact_list = get_day_batteries([day], params, db_path)[day]
+                else:
+                    x_labels, battery_list, impact_list, _ = get_user_batteries(day, params, db_path).get(user, ([], [], [], None))
+            except Exception as e:
+                print(f"Error in get_day_batteries: {e}")
+                x_labels, battery_list, impact_list = [], [], []
             
             print(f"Analysis results - x_labels: {len(x_labels)}, battery_list: {len(battery_list)}, impact_list: {len(impact_list)}")
             
@@ -342,7 +330,7 @@ def create_emotion_battery_interface():
                 # Return empty chart with message
                 fig = go.Figure()
                 fig.add_annotation(
-                    text=f"No data for this day ({day}) in {db_path}",
+                    text=f"No data for this day ({day}) in {db_path}" + (f" for {user}" if user and user != 'All' else ""),
                     xref="paper", yref="paper",
                     x=0.5, y=0.5, showarrow=False,
                     font=dict(size=16)
@@ -369,7 +357,7 @@ def create_emotion_battery_interface():
             ))
             
             fig.update_layout(
-                title=f"Emotion Battery by 10min ({day})",
+                title=f"Emotion Battery by {params['timeP']}min ({day})" + (f" - {user}" if user and user != 'All' else ""),
                 xaxis_title="Time",
                 yaxis_title="Emotion Battery",
                 yaxis=dict(range=[20, 100]),
@@ -396,16 +384,15 @@ def create_emotion_battery_interface():
             )
             return fig
     
-    def get_today_battery_level():
-        """Get today's current battery level"""
+    def get_today_battery_level(result, params):
+        """Get today's current battery level; None before the battery window opens (no bin reached yet)"""
         try:
-            today = datetime.now().strftime('%Y%m%d')
-            x_labels, battery_list, impact_list, current_battery = analyze_emotion_battery(
-                today, show_log=False, plot=False, db_path='emotion_data.db'
-            )
+            x_labels, battery_list, impact_list, current_battery = result
             
             if current_battery is not None:
                 return current_battery
+            elif datetime.now().strftime('%H:%M') < params['timeS']:
+                return None
             elif battery_list:
                 return int(round(battery_list[-1]))
             else:
@@ -425,11 +412,12 @@ def create_emotion_battery_interface():
         else:
             return "Low", "🔴", "#ff4444"
     
-    def render_battery_html(level: int, status_text: str = "", status_color: str = "#111", status_emoji: str = "", extra_lines: list | None = None) -> str:
+    def render_battery_html(level: int | None, status_text: str = "", status_color: str = "#111", status_emoji: str = "", extra_lines: list | None = None) -> str:
         """Render a vertical battery icon (left) and the number/status (right) as HTML.
-        Battery level is 0-100. The battery is vertical with fill height matching level.
+        Battery level is 0-100 (None: empty battery, no number). The battery is vertical with fill height matching level.
         """
-        level = max(0, min(100, int(level)))
+        level_text = "--" if level is None else f"{max(0, min(100, int(level)))}%"
+        level = 0 if level is None else max(0, min(100, int(level)))
         # Color by level
         if level <= 20:
             fill_color = "#ff4444"
@@ -463,7 +451,7 @@ def create_emotion_battery_interface():
   <!-- Number and Status -->
   <div style='display:flex; flex-direction:column; justify-content:center;'>
     <div style='font-size:20px; font-weight:700; margin-bottom:6px;'>{status_emoji} Current Battery Level</div>
-    <div style='font-size:64px; font-weight:900; line-height:1; color:{status_color};'>{level}%</div>
+    <div style='font-size:64px; font-weight:900; line-height:1; color:{status_color};'>{level_text}</div>
     <div style='font-size:18px; color:#222; margin-top:8px;'>Status: <span style='font-weight:700;'>{status_text}</span></div>
     {extra_html}
   </div>
@@ -473,25 +461,14 @@ def create_emotion_battery_interface():
     
     # ---- Monthly cache helpers (defined early so they are available during initial render) ----
     def ensure_monthly_cache_table():
-        conn = sqlite3.connect('emotion_data.db')
-        cur = conn.cursor()
-        cur.execute(
-            """
-            CREATE TABLE IF NOT EXISTS emotion_monthly_daily_avg (
-                month TEXT NOT NULL,           -- YYYY-MM
-                day   TEXT NOT NULL,           -- YYYY-MM-DD
-                avg_battery REAL,              -- average battery
-                created_at TEXT DEFAULT (datetime('now')),
-                PRIMARY KEY (month, day)
-            )
-            """
-        )
+        conn = write_connection()
+        ensure_monthly_cache_schema(conn)
         conn.commit()
         conn.close()
 
     def read_month_cache(month_str: str):
         ensure_monthly_cache_table()
-        conn = sqlite3.connect('emotion_data.db')
+        conn = write_connection()
         df = pd.read_sql_query(
             "SELECT day, avg_battery FROM emotion_monthly_daily_avg WHERE month = ? ORDER BY day",
             conn,
@@ -504,24 +481,33 @@ def create_emotion_battery_interface():
         rows = [[row['day'], 80.0 if pd.isna(row['avg_battery']) else float(round(row['avg_battery'], 1))] for _, row in df.iterrows()]
         return rows
 
-    def write_month_cache(month_str: str, rows):
+    def read_month_cache_entries(month_str: str):
+        """{YYYY-MM-DD: (avg_battery, (row_count, max_id), params)} cached for the month"""
         ensure_monthly_cache_table()
-        conn = sqlite3.connect('emotion_data.db')
-        cur = conn.cursor()
-        # Replace cache for this month
-        cur.execute("DELETE FROM emotion_monthly_daily_avg WHERE month = ?", (month_str,))
-        # Insert rows
-        data = [(month_str, r[0], None if r[1] is None else float(r[1])) for r in rows]
-        cur.executemany(
-            "INSERT INTO emotion_monthly_daily_avg (month, day, avg_battery) VALUES (?, ?, ?)",
-            data
+        conn = write_connection()
+        rows = conn.execute(
+            "SELECT day, avg_battery, row_count, max_id, params FROM emotion_monthly_daily_avg WHERE month = ?",
+            (month_str,)
+        ).fetchall()
+        conn.close()
+        return {day: (avg, (row_count, max_id), params) for day, avg, row_count, max_id, params in rows}
+
+    def write_month_cache_days(month_str: str, entries, params):
+        """Upsert recomputed days: entries = [(YYYY-MM-DD, avg, (row_count, max_id)), ...]"""
+        ensure_monthly_cache_table()
+        conn = write_connection()
+        conn.executemany(
+            "INSERT OR REPLACE INTO emotion_monthly_daily_avg (month, day, avg_battery, row_count, max_id, params) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            [(month_str, day, None if avg is None else float(avg), wm[0], wm[1], params_key(params))
+             for day, avg, wm in entries]
         )
         conn.commit()
         conn.close()
 
     def clear_month_cache(month_str: str):
         ensure_monthly_cache_table()
-        conn = sqlite3.connect('emotion_data.db')
+        conn = write_connection()
         cur = conn.cursor()
         cur.execute("DELETE FROM emotion_monthly_daily_avg WHERE month = ?", (month_str,))
         conn.commit()
@@ -558,96 +544,248 @@ def create_emotion_battery_interface():
             fig.add_annotation(text=f"Error: {e}", xref="paper", yref="paper", x=0.5, y=0.5, showarrow=False)
             return fig
 
-    def create_monthly_avg_figure(month_str: str):
+    def count_face_records_by_day(dates):
+        """Return {YYYYMMDD: has_face record count} for the given days (one query; rollup table when available)"""
+        day_keys = [d.strftime('%Y%m%d') for d in dates]
+        try:
+            counts = count_by_day(day_keys[0], day_keys[-1], has_face=True)
+        except Exception:
+            return {}
+        return {k: counts.get(k, 0) for k in day_keys}
+
+    def create_monthly_avg_figure(month_str: str, params=None):
         """Compute each day's average Emotion Battery for the month (YYYY-MM)
-        by looping days and averaging per-day 10-minute battery_list results.
-        Uses cache when available.
+        by averaging per-day 10-minute battery_list results (all days from one query, one vectorized pass).
+        Cached days are reused while their (row count, max id) watermark and the battery settings are unchanged; today is
+        always recomputed since its battery depends on the current time.
         """
+        params = params or settings['params']
         try:
             # Parse month bounds
             if not month_str:
                 month_str = datetime.now().strftime('%Y-%m')
 
-            # Try cache first
-            cached = read_month_cache(month_str)
-            if cached is not None and len(cached) > 0:
-                # Validate cached rows against DB; force 80.0 for days with zero records
-                month_dt_tmp = pd.to_datetime(month_str + "-01")
-                start_day_tmp = month_dt_tmp.replace(day=1)
-                next_month_tmp = (start_day_tmp + pd.offsets.MonthBegin(1))
-                end_day_tmp = next_month_tmp - pd.Timedelta(days=1)
-                dates_tmp = pd.date_range(start=start_day_tmp, end=end_day_tmp, freq='D')
-                # Build quick lookup from cached
-                cached_map = {r[0]: r[1] for r in cached}
-                changed = False
-                conn_v = sqlite3.connect('emotion_data.db')
-                cur_v = conn_v.cursor()
-                rows_v = []
-                for d in dates_tmp:
-                    day_disp = d.strftime('%Y-%m-%d')
-                    day_key = d.strftime('%Y%m%d')
-                    try:
-                        cur_v.execute("SELECT COUNT(*) FROM emotion_records WHERE has_face = 1 AND substr(timestamp,1,8) = ?", (day_key,))
-                        cnt = cur_v.fetchone()[0]
-                    except Exception:
-                        cnt = None
-                    val = cached_map.get(day_disp)
-                    if cnt is None or cnt == 0:
-                        if val != 80.0:
-                            changed = True
-                        rows_v.append([day_disp, 80.0])
-                    else:
-                        rows_v.append([day_disp, val])
-                conn_v.close()
-                if changed:
-                    write_month_cache(month_str, rows_v)
-                    return _rows_to_bar_figure(rows_v, month_str)
-                return _rows_to_bar_figure(cached, month_str)
-
             month_dt = pd.to_datetime(month_str + "-01")
             start_day = month_dt.replace(day=1)
             next_month = (start_day + pd.offsets.MonthBegin(1))
             end_day = next_month - pd.Timedelta(days=1)
-
-            # Loop through days and compute average via analyze_emotion_battery
             dates = pd.date_range(start=start_day, end=end_day, freq='D')
-            rows = []
-            # Open one connection to count per-day rows quickly
-            conn = sqlite3.connect('emotion_data.db')
-            cur = conn.cursor()
-            for d in dates:
-                day_key = d.strftime('%Y%m%d')
-                # Count records for this day
-                try:
-                    cur.execute("SELECT COUNT(*) FROM emotion_records WHERE has_face = 1 AND substr(timestamp,1,8) = ?", (day_key,))
-                    cnt = cur.fetchone()[0]
-                except Exception:
-                    cnt = None
-                if cnt is None or cnt == 0:
-                    # No data for this day: fixed default 80
-                    rows.append([d.strftime('%Y-%m-%d'), 80.0])
-                else:
-                    x_labels, battery_list, impact_list, _ = analyze_emotion_battery(
-                        day_key, show_log=False, plot=False, db_path='emotion_data.db'
-                    )
-                    if battery_list:
-                        avg_battery = float(pd.Series(battery_list).mean())
-                        rows.append([d.strftime('%Y-%m-%d'), round(avg_battery, 1)])
+            day_keys = [d.strftime('%Y%m%d') for d in dates]
+
+            # One index-only query tells which cached days are stale
+            cached = read_month_cache_entries(month_str)
+            watermarks = day_watermarks(day_keys[0], day_keys[-1])
+            today_key = datetime.now().strftime('%Y%m%d')
+            stale = []
+            for d, day_key in zip(dates, day_keys):
+                entry = cached.get(d.strftime('%Y-%m-%d'))
+                if (entry is None or day_key == today_key or tuple(entry[1]) != watermarks.get(day_key, (0, None))
+                        or entry[2] != params_key(params)):
+                    stale.append(day_key)
+
+            if stale:
+                # Count records per day up front (one rollup query when available)
+                counts = count_face_records_by_day(dates)
+                active_days = [k for k in stale if counts.get(k)]
+                month_batteries = get_day_batteries(active_days, params, watermarks=watermarks) if active_days else {}
+                entries = []
+                for day_key in stale:
+                    day_disp = f"{day_key[:4]}-{day_key[4:6]}-{day_key[6:]}"
+                    battery_list = month_batteries[day_key][1] if day_key in month_batteries else None
+                    if not counts.get(day_key) or not battery_list:
+                        # No data for this day: fixed default 80
+                        avg = 80.0
                     else:
-                        rows.append([d.strftime('%Y-%m-%d'), 80.0])
-            conn.close()
+                        avg = round(float(pd.Series(battery_list).mean()), 1)
+                    # Today's average is partial (later bins count as empty): a NULL watermark never
+                    # matches, so the day is recomputed once it is complete
+                    wm = (None, None) if day_key == today_key else watermarks.get(day_key, (0, None))
+                    entries.append((day_disp, avg, wm))
+                    cached[day_disp] = (avg, None)
+                write_month_cache_days(month_str, entries, params)
+                print(f"📆 {month_str}: recomputed {len(stale)} of {len(day_keys)} day(s)")
 
-            # Write cache and return figure
-            write_month_cache(month_str, rows)
+            rows = []
+            for d in dates:
+                avg = cached[d.strftime('%Y-%m-%d')][0]
+                rows.append([d.strftime('%Y-%m-%d'), 80.0 if avg is None else float(round(avg, 1))])
             return _rows_to_bar_figure(rows, month_str)
         except Exception as e:
             fig = go.Figure()
             fig.add_annotation(text=f"Error: {e}", xref="paper", yref="paper", x=0.5, y=0.5, showarrow=False)
             return fig
 
-    # Create plot with default current month figure
-    monthly_initial_fig = create_monthly_avg_figure(datetime.now().strftime('%Y-%m'))
-    monthly_avg_plot = gr.Plot(value=monthly_initial_fig, label="Monthly Daily Averages (Bar Chart)")
+    def create_battery_heatmap(start_month: str, end_month: str, params=None):
+        """Calendar heatmap (weeks x weekdays) of daily average battery for YYYY-MM..YYYY-MM.
+
+        Missing or stale months are first filled by the parallel precompute job; the figure is
+        then drawn from emotion_monthly_daily_avg alone. Days without records are left blank.
+        """
+        params = params or settings['params']
+        try:
+            start_month = (start_month or datetime.now().strftime('%Y-%m')).strip()
+            end_month = (end_month or start_month).strip()
+            months = month_range(start_month, end_month)
+            if not months:
+                raise ValueError(f"empty range {start_month}..{end_month}")
+            precompute_range(months[0], months[-1], db_path=get_db_path(), params=params)
+            cached = read_month_cache_rows(get_db_path(), months[0], months[-1])
+
+            dates = pd.date_range(months[0] + "-01", pd.to_datetime(months[-1] + "-01") + pd.offsets.MonthEnd(0), freq='D')
+            week_starts = pd.date_range(dates[0] - pd.Timedelta(days=dates[0].weekday()), dates[-1], freq='7D')
+            z = [[None] * len(week_starts) for _ in range(7)]
+            text = [[""] * len(week_starts) for _ in range(7)]
+            for d in dates:
+                entry = cached.get(d.strftime('%Y-%m-%d'))
+                col = (d - week_starts[0]).days // 7
+                text[d.weekday()][col] = d.strftime('%Y-%m-%d')
+                # row_count 0 with the default 80 means the day had no records
+                if entry is not None and entry[0] is not None and not (entry[1][0] == 0 and entry[0] == 80.0):
+                    z[d.weekday()][col] = float(entry[0])
+            fig = go.Figure(go.Heatmap(
+                x=[w.strftime('%Y-%m-%d') for w in week_starts],
+                y=["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"],
+                z=z,
+                text=text,
+                zmin=20,
+                zmax=100,
+                colorscale="RdYlGn",
+                xgap=2,
+                ygap=2,
+                hoverongaps=False,
+                hovertemplate='%{text}<br>Avg Battery: %{z:.1f}<extra></extra>',
+                colorbar=dict(title="Battery")
+            ))
+            fig.update_layout(
+                title=f"Daily Avg Emotion Battery ({months[0]} to {months[-1]})",
+                xaxis=dict(title="Week of", type="category", tickangle=-45),
+                yaxis=dict(autorange="reversed"),
+                height=320
+            )
+            return fig
+        except Exception as e:
+            fig = go.Figure()
+            fig.add_annotation(text=f"Error: {e}", xref="paper", yref="paper", x=0.5, y=0.5, showarrow=False)
+            return fig
+
+    def get_current_month_average_battery(month_key: str) -> int:
+        """Average of the month's cached daily averages (fill the cache first via create_monthly_avg_figure)"""
+        rows = read_month_cache(month_key)
+        if not rows:
+            return 80
+        values = [r[1] if r[1] is not None else 80.0 for r in rows]
+        try:
+            avg_val = int(round(float(pd.Series(values).mean())))
+        except Exception:
+            avg_val = 80
+        return max(20, min(100, avg_val))
+
+    def compute_month_panel(month_key: str, params):
+        """(monthly bar figure, month average level): one month computation shared by both widgets"""
+        fig = create_monthly_avg_figure(month_key, params)
+        return fig, get_current_month_average_battery(month_key)
+
+    def loading_figure(title: str, height: int = 400):
+        """Placeholder shown until a chart's load event fills it in"""
+        fig = go.Figure()
+        fig.add_annotation(text="Loading...", xref="paper", yref="paper", x=0.5, y=0.5, showarrow=False, font=dict(size=16))
+        fig.update_layout(title=title, height=height)
+        return fig
+
+    def refresh_user_daily_averages(start_day, end_day, params, db_path=None):
+        """{YYYYMMDD: {username: avg battery}} of completed days in the range ('All' = combined battery).
+
+        Cached per day; only days that are new or whose rows changed are computed (all users of a
+        day in one grouped pass, the combined battery through the day result store).
+        """
+        db_path = db_path or get_db_path()
+        end_day = min(end_day, (datetime.now() - timedelta(days=1)).strftime('%Y%m%d'))
+        if start_day > end_day:
+            return {}
+        days = day_range(start_day, end_day)
+        watermarks = day_watermarks(start_day, end_day, db_path=db_path)
+        avgs, cached_watermarks = read_user_daily_avgs(start_day, end_day, params)
+        archived = set(archived_days(default_archive_dir(db_path), start_day, end_day))
+        stale = [day for day in stale_days(days, cached_watermarks, watermarks)
+                 if day in watermarks or day in archived]
+        if stale:
+            combined = get_day_batteries(stale, params, db_path, watermarks=watermarks)
+            entries = []
+            for day in stale:
+                df = load_day_face_records(day, db_path, columns=('timestamp', 'emotion', 'username'))
+                if df.empty:
+                    continue
+                users = compute_users_battery(df['timestamp'], df['emotion'], df['username'], day, params=params)
+                user_avgs = {user: round(float(np.mean(r[1])), 1) for user, r in users.items()}
+                user_avgs[ALL_USERS] = round(float(np.mean(combined[day][1])), 1)
+                avgs[day] = user_avgs
+                entries.append((day, user_avgs, watermarks.get(day, (0, None))))
+            write_user_daily_avgs(params, entries)
+            print(f"📊 Daily user averages: {len(entries)} of {len(days)} day(s) recomputed")
+        return avgs
+    
+    def comparison_lines(level, params, user='All', scope='week'):
+        """Card text comparing a level with last week / last month and with the community average"""
+        user = user or ALL_USERS
+        now = datetime.now()
+        try:
+            if scope == 'week':
+                period = [(now - timedelta(days=i)).strftime('%Y%m%d') for i in range(7, 0, -1)]
+                avgs = refresh_user_daily_averages(period[0], period[-1], params)
+                community_days, label = period, "last week"
+            else:
+                month_start = now.replace(day=1)
+                prev_start = (month_start - timedelta(days=1)).replace(day=1)
+                avgs = refresh_user_daily_averages(prev_start.strftime('%Y%m%d'), now.strftime('%Y%m%d'), params)
+                period = day_range(prev_start.strftime('%Y%m%d'), (month_start - timedelta(days=1)).strftime('%Y%m%d'))
+                community_days = day_range(month_start.strftime('%Y%m%d'), now.strftime('%Y%m%d'))
+                label = "last month"
+            if user == TEAM_AVERAGE:
+                lines = [comparison_line(level, community_average(avgs, period), label)]
+            else:
+                lines = [comparison_line(level, period_average(avgs, user, period), label),
+                         comparison_line(level, community_average(avgs, community_days), "community average")]
+        except Exception as e:
+            print(f"Error computing battery comparisons: {e}")
+            lines = []
+        return [line for line in lines if line] or ["No comparison data yet"]
+    
+    def render_level_html(level: int | None, params, user='All', scope='week') -> str:
+        if level is None:
+            # Before the battery window opens there is no level to show or compare
+            return render_battery_html(None, "Not started", "#888", "⏳",
+                                       extra_lines=[f"Today's battery starts at {params['timeS']}"])
+        st_text, st_emoji, st_color = get_battery_status(level)
+        return render_battery_html(
+            level,
+            st_text,
+            st_color,
+            st_emoji,
+            extra_lines=comparison_lines(level, params, user, scope)
+        )
+
+    # Start the heavy computations now; the page renders placeholders and the load events
+    # below pick these results up (later page loads compute fresh, mostly from caches)
+    STARTUP_RESULT_MAX_AGE = 60   # seconds; an older startup result is recomputed instead of shown
+    startup_at = datetime.now()
+    startup_month = startup_at.strftime('%Y-%m')
+    startup_params = settings['params']
+    startup_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix='battery-startup')
+    startup_results = {
+        'today': startup_pool.submit(get_today_battery, startup_params),
+        'month': startup_pool.submit(compute_month_panel, startup_month, startup_params),
+    }
+    startup_pool.shutdown(wait=False)
+    
+    def take_startup_result(name, params):
+        """The startup future for the first page load, or None once used or too old to show"""
+        future = startup_results.pop(name, None)
+        now = datetime.now()
+        if future is None or (now - startup_at).total_seconds() > STARTUP_RESULT_MAX_AGE:
+            return None
+        if now.date() != startup_at.date() or params_key(params) != params_key(startup_params):
+            return None
+        return future
 
     # Create Gradio interface
     with gr.Blocks(title="Emotion Battery", theme=gr.themes.Soft()) as interface:
@@ -661,55 +799,27 @@ def create_emotion_battery_interface():
             with gr.Column(scale=1):
                 # Battery level display
                 gr.Markdown("## Today's Emotion Battery")
-                battery_level = get_today_battery_level()
-                status_text, status_emoji, status_color = get_battery_status(battery_level)
                 
-                # Vertical battery on the left, number on the right
-                battery_display = gr.HTML(value=render_battery_html(
-                    battery_level,
-                    status_text,
-                    status_color,
-                    status_emoji,
-                    extra_lines=["8% higher than last week", "9% higher than community average"]
-                ), label="Battery")
+                # Vertical battery on the left, number on the right (filled in by the load event)
+                battery_display = gr.HTML(value=render_battery_html(80, "Loading..."), label="Battery")
                 
-                # Update button
+                # Update button and user selector (users are filled in by the load event)
                 with gr.Row():
                     with gr.Column(scale=1):
                         update_btn = gr.Button("🔄 Refresh Battery Level", variant="primary")
                     with gr.Column(scale=2):
-                        gr.HTML("", visible=True)
+                        user_selector = gr.Dropdown(
+                            label="User",
+                            choices=['All', TEAM_AVERAGE],
+                            value='All',
+                            interactive=True
+                        )
             
             # Right side: This Month's Average Emotion Battery (1/3 width)
             with gr.Column(scale=1):
-                def get_current_month_average_battery() -> int:
-                    """Read current month's daily averages from cache; if missing, compute, then average."""
-                    month_key = datetime.now().strftime('%Y-%m')
-                    rows = read_month_cache(month_key)
-                    if rows is None or len(rows) == 0:
-                        # trigger compute to populate cache
-                        _ = create_monthly_avg_figure(month_key)
-                        rows = read_month_cache(month_key)
-                    if not rows:
-                        return 80
-                    values = [r[1] if r[1] is not None else 80.0 for r in rows]
-                    try:
-                        avg_val = int(round(float(pd.Series(values).mean())))
-                    except Exception:
-                        avg_val = 80
-                    return max(20, min(100, avg_val))
-
-                month_avg_level = get_current_month_average_battery()
-                m_status_text, m_status_emoji, m_status_color = get_battery_status(month_avg_level)
                 gr.Markdown("## Month's Average Emotion Battery")
                 monthly_battery_display = gr.HTML(
-                    value=render_battery_html(
-                        month_avg_level,
-                        m_status_text,
-                        m_status_color,
-                        m_status_emoji,
-                        extra_lines=["8% higher than last week", "9% higher than community average"]
-                    ),
+                    value=render_battery_html(80, "Loading..."),
                     label="Monthly Avg Battery"
                 )
 
@@ -717,10 +827,23 @@ def create_emotion_battery_interface():
             with gr.Column(scale=1):
                 # Battery chart
                 chart_output = gr.Plot(
-                    value=create_today_battery_chart(),
+                    value=loading_figure(f"Today's Emotion Battery by {startup_params['timeP']}min"),
                     label="Today's Emotion Battery Chart"
                 )
         
+        # Battery settings: applied by re-binning the cached per-minute indices (no raw row reads)
+        with gr.Accordion("⚙️ Battery Settings", open=False):
+            with gr.Row():
+                start_v_input = gr.Number(label="Start level (startV)", value=startup_params['startV'])
+                end_v_input = gr.Number(label="End level (endV)", value=startup_params['endV'])
+                time_s_input = gr.Textbox(label="Start time (timeS, HH:MM)", value=startup_params['timeS'])
+                time_e_input = gr.Textbox(label="End time (timeE, HH:MM)", value=startup_params['timeE'])
+                time_p_input = gr.Number(label="Bin width in minutes (timeP)", value=startup_params['timeP'], precision=0)
+            with gr.Row():
+                apply_settings_btn = gr.Button("✅ Apply Settings", variant="primary")
+                reset_settings_btn = gr.Button("↩️ Reset to Defaults", variant="secondary")
+            settings_status = gr.Markdown("")
+        
         gr.Markdown("---")
         
         # Monthly per-day average Emotion Battery (above single-day analysis)
@@ -737,14 +860,11 @@ def create_emotion_battery_interface():
             with gr.Column(scale=2):
                 gr.HTML("", visible=True)
         
-        # Replace table with plot for monthly daily averages (will be created after function definition with initial value)
-
-        # ---- Monthly cache helpers ----
-        # These functions are now defined earlier in the script.
-
-        # Create plot with default current month figure
-        monthly_initial_fig = create_monthly_avg_figure(datetime.now().strftime('%Y-%m'))
-        monthly_avg_plot = gr.Plot(value=monthly_initial_fig, label="Monthly Daily Averages (Bar Chart)")
+        # Monthly daily averages plot (filled in by the load event)
+        monthly_avg_plot = gr.Plot(
+            value=loading_figure(f"Daily Avg Emotion Battery ({startup_month})", height=360),
+            label="Monthly Daily Averages (Bar Chart)"
+        )
 
         month_calc_btn.click(
             fn=create_monthly_avg_figure,
@@ -770,6 +890,30 @@ def create_emotion_battery_interface():
 
         gr.Markdown("---")
 
+        # Long-range calendar heatmap (months filled in parallel by the precompute job)
+        gr.Markdown("## 🗓️ Emotion Battery Calendar")
+        with gr.Row():
+            with gr.Column(scale=1):
+                heatmap_start_input = gr.Textbox(
+                    label="From month (YYYY-MM)",
+                    value=(datetime.now().replace(day=1) - pd.DateOffset(months=11)).strftime('%Y-%m')
+                )
+                heatmap_end_input = gr.Textbox(
+                    label="To month (YYYY-MM)",
+                    value=datetime.now().strftime('%Y-%m')
+                )
+                heatmap_btn = gr.Button("🗓️ Show Calendar", variant="primary")
+            with gr.Column(scale=3):
+                heatmap_plot = gr.Plot(label="Daily Average Battery Calendar")
+
+        heatmap_btn.click(
+            fn=create_battery_heatmap,
+            inputs=[heatmap_start_input, heatmap_end_input],
+            outputs=heatmap_plot
+        )
+
+        gr.Markdown("---")
+
         # Single Day Analysis Section
         gr.Markdown("## 📅 Single Day Emotion Battery Analysis")
         gr.Markdown("Analyze emotion battery for any specific day with detailed 10-minute breakdown.")
@@ -804,31 +948,127 @@ def create_emotion_battery_interface():
         gr.Markdown("---")
         
         # Event handlers
-        def update_battery():
+        def update_battery(user='All', params=None):
             """Update battery level and chart"""
-            new_level = get_today_battery_level()
-            st_text, st_emoji, st_color = get_battery_status(new_level)
-            new_chart = create_today_battery_chart()
-            return render_battery_html(
-                new_level,
-                st_text,
-                st_color,
-                st_emoji,
-                extra_lines=["8% higher than last week", "9% higher than community average"]
-            ), new_chart
+            params = params or settings['params']
+            result = get_today_result(params, user)
+            return (render_level_html(get_today_battery_level(result, params), params, user),
+                    create_today_battery_chart(result, params, user))
+        
+        def load_today_battery():
+            """Page load: today's level and chart from the startup computation (first load) or fresh"""
+            params = settings['params']
+            future = take_startup_result('today', params)
+            if future is None:
+                return update_battery(params=params)
+            result = future.result()
+            return render_level_html(get_today_battery_level(result, params), params), create_today_battery_chart(result, params)
+        
+        def load_month_panel():
+            """Page load: current month's average level and daily bar chart"""
+            params = settings['params']
+            future = take_startup_result('month', params)
+            if future is not None:
+                fig, level = future.result()
+            else:
+                fig, level = compute_month_panel(datetime.now().strftime('%Y-%m'), params)
+            return render_level_html(level, params, scope='month'), fig
+        
+        def apply_settings(start_v, end_v, time_s, time_e, time_p, user, month_str):
+            """Validate and apply new battery settings, then redraw today's and the month's charts"""
+            try:
+                new_params = {
+                    'startV': float(start_v),
+                    'endV': float(end_v),
+                    'timeS': datetime.strptime(str(time_s).strip(), '%H:%M').strftime('%H:%M'),
+                    'timeE': datetime.strptime(str(time_e).strip(), '%H:%M').strftime('%H:%M'),
+                    'timeP': int(time_p),
+                }
+                if not 0 <= new_params['startV'] <= 100 or not 0 <= new_params['endV'] <= 100:
+                    raise ValueError("levels must be between 0 and 100")
+                if new_params['timeS'] >= new_params['timeE']:
+                    raise ValueError("start time must be before end time")
+                if not 1 <= new_params['timeP'] <= 240:
+                    raise ValueError("bin width must be 1-240 minutes")
+                # Keep integral levels as ints so the default settings keep their stored results
+                for key in ('startV', 'endV'):
+                    if new_params[key].is_integer():
+                        new_params[key] = int(new_params[key])
+            except (TypeError, ValueError) as e:
+                return (f"❌ Invalid settings: {e}",) + (gr.update(),) * 4
+            params = settings['params'] = dict(DEFAULT_BATTERY_PARAMS, **new_params)
+            n_bins = len(battery_bins('20000101', params)) - 1
+            print(f"⚙️ Battery settings: {params} ({n_bins} bins)")
+            today_html, today_chart = update_battery(user, params)
+            month_key = datetime.now().strftime('%Y-%m')
+            month_fig, month_level = compute_month_panel(month_key, params)
+            if month_str and month_str != month_key:
+                month_fig = create_monthly_avg_figure(month_str, params)
+            return (f"✅ Applied: {params['timeS']}-{params['timeE']}, {n_bins} bins of "
+                    f"{params['timeP']} min, {params['startV']} → {params['endV']}",
+                    today_html, today_chart, render_level_html(month_level, params, scope='month'), month_fig)
         
-        def analyze_single_day(date_str, use_fake_db):
+        def reset_settings(user, month_str):
+            p = DEFAULT_BATTERY_PARAMS
+            return (p['startV'], p['endV'], p['timeS'], p['timeE'], p['timeP']) + apply_settings(
+                p['startV'], p['endV'], p['timeS'], p['timeE'], p['timeP'], user, month_str)
+        
+        def load_user_choices():
+            """Page load: every user in the database for the selector"""
+            try:
+                users = distinct_users()
+            except Exception as e:
+                print(f"Error loading usernames: {e}")
+                users = []
+            return gr.update(choices=['All', TEAM_AVERAGE] + users)
+        
+        def analyze_single_day(date_str, use_fake_db, user):
             """Analyze single day emotion battery"""
-            return create_single_day_battery_chart(date_str, use_fake_db)
+            return create_single_day_battery_chart(date_str, use_fake_db, user)
         
         update_btn.click(
             fn=update_battery,
+            inputs=[user_selector],
+            outputs=[battery_display, chart_output]
+        )
+        
+        user_selector.change(
+            fn=update_battery,
+            inputs=[user_selector],
+            outputs=[battery_display, chart_output]
+        )
+        
+        interface.load(
+            fn=load_today_battery,
             outputs=[battery_display, chart_output]
         )
         
+        interface.load(
+            fn=load_month_panel,
+            outputs=[monthly_battery_display, monthly_avg_plot]
+        )
+        
+        settings_outputs = [settings_status, battery_display, chart_output, monthly_battery_display, monthly_avg_plot]
+        apply_settings_btn.click(
+            fn=apply_settings,
+            inputs=[start_v_input, end_v_input, time_s_input, time_e_input, time_p_input, user_selector, month_input],
+            outputs=settings_outputs
+        )
+        
+        reset_settings_btn.click(
+            fn=reset_settings,
+            inputs=[user_selector, month_input],
+            outputs=[start_v_input, end_v_input, time_s_input, time_e_input, time_p_input] + settings_outputs
+        )
+        
+        interface.load(
+            fn=load_user_choices,
+            outputs=[user_selector]
+        )
+        
         analyze_btn.click(
             fn=analyze_single_day,
-            inputs=[date_input, fake_db_checkbox],
+            inputs=[date_input, fake_db_checkbox, user_selector],
             outputs=single_day_chart
         )
         